@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compare the legacy JSON storage of entry hashes (hex CRC32) with the packed binary storage (64-bit BLAKE2b).
+
+Synthetic feeds are stored in a temporary SQLite database, then each feed is loaded, diffed against its current entries
+(a few of which are new), and saved back, one by one, as the monitor does.
+The time per feed and the size of the database are reported for each storage.
+Run it from the root of the repository:
+
+    python scripts/benchmark_entry_hashes.py
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from itertools import repeat
+from time import perf_counter
+from zlib import crc32
+
+__arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+__arg_parser.add_argument('--feeds', type=int, default=1000, help='number of feeds')
+__arg_parser.add_argument('--entries', type=int, default=50, help='number of entries per feed')
+__arg_parser.add_argument('--new-entries', type=int, default=2, help='number of new entries per feed')
+args = __arg_parser.parse_args()
+
+# src.env parses the command line and requires some settings, prepare them before importing
+sys.argv = sys.argv[:1]
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('TOKEN', '1234567890:benchmark')
+os.environ.setdefault('MANAGER', '1234567890')
+
+from tortoise import Tortoise, connections  # noqa: E402
+from src.db import models  # noqa: E402
+from src.command.inner.utils import calculate_update, pack_hashes  # noqa: E402
+
+
+def legacy_calculate_update(old_hashes, entries):
+    # calculate_update() before packed hashes were introduced
+    new_hashes_d = {
+        hex(crc32(entry['guid'].encode('utf-8')))[2:]: entry
+        for entry in entries
+    }
+    if old_hashes:
+        new_hashes_d.update(zip(old_hashes, repeat(None)))
+    return new_hashes_d.keys(), filter(None, new_hashes_d.values())
+
+
+def synthetic_entries(feed_id: int, start: int) -> list[dict]:
+    return [
+        {'guid': f'https://example.com/{feed_id}/posts/{i}', 'title': f'Entry {i}'}
+        for i in range(start + args.entries - 1, start - 1, -1)
+    ]
+
+
+async def run(legacy: bool) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'db.sqlite3')
+        await Tortoise.init(db_url=f'sqlite://{db_path}', modules={'models': ['src.db.models']})
+        await Tortoise.generate_schemas()
+        try:
+            # known entries: the previous page of entries plus the current one, as kept by the monitor
+            for feed_id in range(1, args.feeds + 1):
+                known_entries = synthetic_entries(feed_id, 0) + synthetic_entries(feed_id, args.entries)
+                if legacy:
+                    hashes = list(legacy_calculate_update(None, known_entries)[0])
+                    await models.Feed.create(id=feed_id, link=f'{feed_id}', title='', entry_hashes=hashes)
+                else:
+                    hashes = pack_hashes(calculate_update(None, known_entries)[0])
+                    await models.Feed.create(id=feed_id, link=f'{feed_id}', title='', packed_entry_hashes=hashes)
+            current_entries = {
+                feed_id: synthetic_entries(feed_id, args.entries + args.new_entries)
+                for feed_id in range(1, args.feeds + 1)
+            }
+
+            start = perf_counter()
+            for feed_id, entries in current_entries.items():
+                feed = await models.Feed.get(id=feed_id)
+                limit = max(len(entries) * 2, 100)
+                if legacy:
+                    new_hashes, updated_entries = legacy_calculate_update(feed.entry_hashes, entries)
+                    updated_entries = list(updated_entries)
+                    feed.entry_hashes = list(new_hashes)[:limit]
+                    await feed.save(update_fields=['entry_hashes'])
+                else:
+                    new_hashes, updated_entries = calculate_update(feed.packed_entry_hashes, entries)
+                    feed.packed_entry_hashes = pack_hashes(new_hashes[:limit])
+                    await feed.save(update_fields=['packed_entry_hashes'])
+                assert len(updated_entries) == args.new_entries
+            elapsed = perf_counter() - start
+
+            await connections.get('default').execute_script('VACUUM')
+        finally:
+            await Tortoise.close_connections()
+        return elapsed, os.path.getsize(db_path)
+
+
+async def main():
+    print(f'{args.feeds} feeds, {args.entries} entries per feed, {args.new_entries} of them new')
+    for title, legacy in (('Legacy (JSON, CRC32)', True), ('Packed (binary, BLAKE2b)', False)):
+        elapsed, db_size = await run(legacy)
+        print(f'{title}: {elapsed / args.feeds * 1e3:.3f}ms per feed (load + diff + save), '
+              f'database size {db_size / 1024:.1f}KiB')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compare the single-process mode with fetch workers (`FETCH_WORKERS`).
+
+A local HTTP server serves synthetic feeds, which are fetched, parsed and diffed concurrently, while a probe measures
+how late the event loop of the main process wakes up (loop lag).
+Run it once per mode, from the root of the repository:
+
+    python scripts/benchmark_fetch_workers.py --workers 0
+    python scripts/benchmark_fetch_workers.py --workers 2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from statistics import mean, quantiles
+from time import perf_counter
+
+__arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+__arg_parser.add_argument('--workers', type=int, default=0, help='number of fetch workers, 0=single-process mode')
+__arg_parser.add_argument('--feeds', type=int, default=500, help='number of feeds')
+__arg_parser.add_argument('--entries', type=int, default=50, help='number of entries per feed')
+__arg_parser.add_argument('--port', type=int, default=18964, help='port of the local HTTP server')
+args = __arg_parser.parse_args()
+
+# src.env parses the command line and requires some settings, prepare them before importing
+sys.argv = sys.argv[:1]
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('TOKEN', '1234567890:benchmark')
+os.environ.setdefault('MANAGER', '1234567890')
+os.environ['FETCH_WORKERS'] = str(args.workers)
+for proxy_env in ('R_PROXY', 'SOCKS_PROXY', 'HTTP_PROXY', 'HTTPS_PROXY', 'socks_proxy', 'http_proxy', 'https_proxy'):
+    os.environ.pop(proxy_env, None)
+
+from src import env, aio_helper  # noqa: E402
+
+aio_helper.init()
+
+from aiohttp import web as aiohttp_web  # noqa: E402
+from src.monitor._fetcher import FetchWorkerClient, fetch_and_diff  # noqa: E402
+
+PROBE_INTERVAL = 0.01  # seconds
+
+
+def render_feed(feed_id: int, entry_count: int) -> bytes:
+    pub_date = format_datetime(datetime.now(timezone.utc))
+    items = ''.join(
+        f'<item><title>Entry {i} of feed {feed_id}</title>'
+        f'<link>https://example.com/{feed_id}/{i}</link>'
+        f'<guid>https://example.com/{feed_id}/{i}</guid>'
+        f'<pubDate>{pub_date}</pubDate>'
+        f'<description><![CDATA[<p>{"Lorem ipsum dolor sit amet. " * 20}</p>'
+        f'<img src="https://example.com/{feed_id}/{i}.png">]]></description></item>'
+        for i in range(entry_count)
+    )
+    return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Feed {feed_id}</title>'
+            f'<link>https://example.com/{feed_id}</link><description>Feed {feed_id}</description>{items}'
+            f'</channel></rss>').encode()
+
+
+async def start_server() -> aiohttp_web.AppRunner:
+    bodies = {feed_id: render_feed(feed_id, args.entries) for feed_id in range(args.feeds)}
+
+    async def handler(request: aiohttp_web.Request) -> aiohttp_web.Response:
+        return aiohttp_web.Response(body=bodies[int(request.match_info['feed_id'])], content_type='application/rss+xml')
+
+    app = aiohttp_web.Application()
+    app.router.add_get('/{feed_id}.xml', handler)
+    runner = aiohttp_web.AppRunner(app)
+    await runner.setup()
+    await aiohttp_web.TCPSite(runner, '127.0.0.1', args.port).start()
+    return runner
+
+
+async def probe_loop_lag(lags: list[float], stopped: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stopped.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(loop.time() - expected, 0))
+
+
+async def main():
+    runner = await start_server()
+    client = None
+    fetch = fetch_and_diff
+    if args.workers:
+        client = FetchWorkerClient()
+        client.start()
+        fetch = client.fetch_and_diff
+
+    lags: list[float] = []
+    stopped = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(lags, stopped))
+    now = datetime.now(timezone.utc)
+    start = perf_counter()
+    results = await asyncio.gather(
+        *(fetch(f'http://127.0.0.1:{args.port}/{feed_id}.xml', {}, None, now) for feed_id in range(args.feeds)),
+        return_exceptions=True,
+    )
+    elapsed = perf_counter() - start
+    stopped.set()
+    await probe
+
+    failed = sum(isinstance(result, BaseException) or result.error is not None for result in results)
+    print(f'mode: {f"{args.workers} fetch workers" if args.workers else "single process"}')
+    print(f'feeds: {args.feeds} ({args.entries} entries each), failed: {failed}')
+    print(f'throughput: {args.feeds / elapsed:.1f} feeds/s ({elapsed:.2f}s in total)')
+    if len(lags) >= 2:
+        percentiles = quantiles(lags, n=100)
+        print(f'loop lag: avg {mean(lags) * 1000:.1f}ms, p50 {percentiles[49] * 1000:.1f}ms, '
+              f'p99 {percentiles[98] * 1000:.1f}ms, max {max(lags) * 1000:.1f}ms')
+
+    if client is not None:
+        client.stop()
+    await runner.cleanup()
+
+
+if __name__ == '__main__':
+    try:
+        env.loop.run_until_complete(main())
+    finally:
+        aio_helper.shutdown()
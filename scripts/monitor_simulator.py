@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Simulate the monitor at scale, without network access.
+
+Synthetic feeds (with configurable intervals, fetch latencies and failure rates) and their subscriptions are stored in
+an in-memory SQLite database. The real scheduler (`EffectiveTasks`) and monitor (`Monitor`), including its deferring
+logic and periodic task, run on an event loop with a virtual clock, which jumps to the next timer whenever the loop
+would otherwise sleep, so that hours of monitoring take minutes. Fetching is done by a fake `web.feed_get` and sending
+by a fake notifier. DB queries are regarded as taking no virtual time.
+Run it from the root of the repository:
+
+    python scripts/monitor_simulator.py --feeds 100000 --minutes 30
+    MONITOR_CONCURRENCY=256 python scripts/monitor_simulator.py --failure-rate 0.05
+
+The per-second submission rate, deferrals, skipped vs due counts, lateness percentiles and memory usage are reported.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import selectors
+import sys
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from math import log
+from random import Random
+from statistics import mean, quantiles
+from time import perf_counter, time
+
+__arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+__arg_parser.add_argument('--feeds', type=int, default=100000, help='number of feeds')
+__arg_parser.add_argument('--users', type=int, default=1000, help='number of users, each feed has one subscriber')
+__arg_parser.add_argument('--hosts', type=int, default=1000, help='number of hosts the feeds are spread over')
+__arg_parser.add_argument('--intervals', default='5,10,10,10,30,60',
+                          help='comma-separated intervals (in minutes) that feeds are randomly assigned from')
+__arg_parser.add_argument('--minutes', type=int, default=30, help='simulated duration in minutes')
+__arg_parser.add_argument('--latency', type=float, default=0.5, help='median latency of fetches in seconds')
+__arg_parser.add_argument('--latency-sigma', type=float, default=1.0, help='sigma of the log-normal fetch latency')
+__arg_parser.add_argument('--failure-rate', type=float, default=0.02, help='probability of a fetch failing')
+__arg_parser.add_argument('--not-modified-rate', type=float, default=0.3, help='probability of a fetch getting 304')
+__arg_parser.add_argument('--update-rate', type=float, default=0.05, help='probability of a fetch getting new entries')
+__arg_parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic feeds and fetches')
+__arg_parser.add_argument('--tracemalloc', action='store_true', help='trace Python memory allocations (slow)')
+__arg_parser.add_argument('--verbose', action='store_true', help='show logs of the bot')
+args = __arg_parser.parse_args()
+
+# src.env parses the command line and requires some settings, prepare them before importing
+sys.argv = sys.argv[:1]
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('TOKEN', '1234567890:simulator')
+os.environ.setdefault('MANAGER', '1234567890')
+os.environ['NO_UVLOOP'] = '1'  # a virtual clock cannot be installed into uvloop
+os.environ['LAZY_MEDIA_VALIDATION'] = '1'  # never pre-validate media, which would go online
+os.environ['FETCH_WORKERS'] = '0'  # fetch in the main process so that web.feed_get can be faked
+os.environ['MONITOR_ROLE'] = 'all'
+
+if args.tracemalloc:
+    tracemalloc.start()
+
+from src import env  # noqa: E402
+
+START_TIME = float(int(time()))
+HTTP_TIMEOUT = float(env.HTTP_TIMEOUT)
+ENTRIES_PER_FEED = 20
+
+
+class _VirtualSelector(selectors.BaseSelector):
+    def __init__(self, loop: 'VirtualClockEventLoop'):
+        self._loop = loop
+        self._selector = selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+    def select(self, timeout=None):
+        loop = self._loop
+        if loop.virtual and not loop.pending_jobs:
+            ready = self._selector.select(0)
+            if ready or not timeout:
+                return ready or self._selector.select(timeout)
+            loop.advance(timeout)  # idle, jump to the next timer
+            return []
+        # Real time mode, or waiting for a DB query or an executor job, which are regarded as taking no virtual time.
+        start = perf_counter()
+        ready = self._selector.select(timeout)
+        if not loop.virtual:
+            loop.advance(perf_counter() - start)
+        return ready
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    def __init__(self, start: float):
+        self._virtual_time = start
+        self.virtual = False  # real time mode until the simulation starts
+        self.pending_jobs = 0  # jobs done by other threads, the clock never jumps while waiting for them
+        super().__init__(selector=_VirtualSelector(self))
+        # The virtual clock starts at the wall time, where a nanosecond is below the precision of a float, so that a
+        # timer due now would never be considered ready and the loop would spin forever.
+        self._clock_resolution = 1e-6
+
+    def time(self) -> float:
+        return self._virtual_time
+
+    def advance(self, seconds: float):
+        self._virtual_time += seconds
+
+    def track_job(self, future: asyncio.Future) -> asyncio.Future:
+        self.pending_jobs += 1
+        future.add_done_callback(self._untrack_job)
+        return future
+
+    def _untrack_job(self, _):
+        self.pending_jobs -= 1
+
+    def run_in_executor(self, executor, func, *args):
+        return self.track_job(super().run_in_executor(executor, func, *args))
+
+
+# Install the virtual clock before anything captures env.loop.
+env.loop.close()
+loop = env.loop = VirtualClockEventLoop(START_TIME)
+asyncio.set_event_loop(loop)
+
+import aiosqlite  # noqa: E402
+import feedparser  # noqa: E402
+from multidict import CIMultiDict, CIMultiDictProxy  # noqa: E402
+from tortoise import Tortoise  # noqa: E402
+
+from src import db, web  # noqa: E402
+from src.command import inner  # noqa: E402
+from src.helpers.bg import bg  # noqa: E402
+from src.monitor import _monitor  # noqa: E402
+
+_aiosqlite_execute = aiosqlite.Connection._execute
+
+
+async def _tracked_aiosqlite_execute(self, fn, *args, **kwargs):
+    # DB queries are done in the thread of the connection, make the clock wait for them.
+    loop.pending_jobs += 1
+    try:
+        return await _aiosqlite_execute(self, fn, *args, **kwargs)
+    finally:
+        loop.pending_jobs -= 1
+
+
+aiosqlite.Connection._execute = _tracked_aiosqlite_execute
+
+
+class VirtualDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.fromtimestamp(loop.time(), tz)
+
+
+# Modules reading the wall clock directly.
+_monitor.time = loop.time
+_monitor.datetime = VirtualDatetime
+db.effective_utils.time = loop.time
+
+rng = Random(args.seed)
+feed_entries: dict[int, list[feedparser.FeedParserDict]] = {}
+feed_entry_seq: Counter[int] = Counter()
+due_at: dict[int, float] = {}  # key: feed id, value: when it became due
+lateness: list[float] = []
+due_per_second: Counter[int] = Counter()
+submitted_per_second: Counter[int] = Counter()
+results: Counter[str] = Counter()
+
+
+def new_entry(feed_id: int) -> feedparser.FeedParserDict:
+    seq = feed_entry_seq[feed_id]
+    feed_entry_seq[feed_id] = seq + 1
+    link = f'https://host{feed_id % args.hosts}.example.com/{feed_id}/posts/{seq}'
+    return feedparser.FeedParserDict(guid=link, link=link, title=f'Entry {seq} of feed {feed_id}')
+
+
+async def fake_feed_get(url: str, *_, **__) -> web.WebFeed:
+    feed_id = int(url.rsplit('/', 1)[1])
+    if (became_due_at := due_at.pop(feed_id, None)) is not None:
+        lateness.append(loop.time() - became_due_at)
+    results['fetched'] += 1
+
+    latency = rng.lognormvariate(log(args.latency), args.latency_sigma)
+    ret = web.WebFeed(url=url, ori_url=url)
+    if latency >= HTTP_TIMEOUT or rng.random() < args.failure_rate:
+        await asyncio.sleep(min(latency, HTTP_TIMEOUT))
+        ret.error = web.WebError(error_name='network error', url=url)
+        return ret
+    await asyncio.sleep(latency)
+
+    status = 304 if rng.random() < args.not_modified_rate else 200
+    headers = CIMultiDictProxy(CIMultiDict())
+    ret.status = status
+    ret.headers = headers
+    ret.web_response = web.WebResponse(url=url, ori_url=url, content=None, headers=headers, status=status, reason=None)
+    if status == 304:
+        return ret
+
+    entries = feed_entries.get(feed_id)
+    if entries is None:
+        entries = feed_entries[feed_id] = [new_entry(feed_id) for _ in range(ENTRIES_PER_FEED)]
+        entries.reverse()
+    if rng.random() < args.update_rate:
+        entries.insert(0, new_entry(feed_id))
+        del entries[ENTRIES_PER_FEED:]
+    ret.rss_d = feedparser.FeedParserDict(
+        feed=feedparser.FeedParserDict(title=f'Feed {feed_id}'),
+        entries=list(entries),
+    )
+    return ret
+
+
+class FakeNotifier:
+    def __init__(self, feed: db.Feed, subs: list[db.Sub], entries: list = None, reason=None, overflow: list = None,
+                 mass_update: bool = False, **_):
+        self._feed = feed
+        self._sub_count = len(subs)
+        self._entry_count = len(entries) if entries else 0
+        self._reason = reason
+        self._overflow = overflow
+
+    @staticmethod
+    def on_periodic_task():
+        pass
+
+    @staticmethod
+    def in_progress_count() -> int:
+        return 0
+
+    @staticmethod
+    def latency_histograms() -> dict:
+        return {}
+
+    @staticmethod
+    def map_sizes() -> dict[str, int]:
+        return {}
+
+    async def notify_all(self):
+        if self._reason is not None:
+            results['deactivated'] += 1
+            await inner.utils.deactivate_feed(self._feed)
+            return
+        results['notified_updates'] += 1
+        results['notified_messages'] += (self._entry_count + bool(self._overflow)) * self._sub_count
+
+
+web.feed_get = fake_feed_get
+_monitor.Notifier = FakeNotifier
+
+_get_tasks = db.EffectiveTasks.get_tasks
+
+
+def _recorded_get_tasks(now: int = None) -> list[int]:
+    feed_ids = _get_tasks(now)
+    if feed_ids:
+        now = int(loop.time()) if now is None else now
+        due_per_second[now] += len(feed_ids)
+        for feed_id in feed_ids:
+            due_at.setdefault(feed_id, now)  # keep the earliest one if it has not been fetched yet
+    return feed_ids
+
+
+db.EffectiveTasks.get_tasks = staticmethod(_recorded_get_tasks)
+
+STAT_EVENTS = ('deferred', 'resubmitted', 'skipped', 'adaptively_deferred', 'updated', 'not_updated', 'failed')
+
+
+def record_monitor(monitor: _monitor.Monitor):
+    submit_feeds = monitor.submit_feeds
+
+    def _recorded_submit_feeds(feeds, *args_, **kwargs):
+        feeds = list(feeds)
+        submitted_per_second[int(loop.time())] += len(feeds)
+        return submit_feeds(feeds, *args_, **kwargs)
+
+    monitor.submit_feeds = _recorded_submit_feeds
+
+    stat = monitor._stat
+    for event in STAT_EVENTS:
+        def _recorded(*args_, _event=event, _method=getattr(stat, event), **kwargs):
+            results[_event] += 1
+            return _method(*args_, **kwargs)
+
+        setattr(stat, event, _recorded)
+
+
+async def populate():
+    intervals = [int(interval) for interval in args.intervals.split(',')]
+    await db.User.bulk_create((db.User(id=user_id) for user_id in range(1, args.users + 1)), batch_size=1000)
+    feed_intervals = [rng.choice(intervals) for _ in range(args.feeds)]
+    await db.Feed.bulk_create(
+        (
+            db.Feed(
+                id=feed_id,
+                link=f'https://host{feed_id % args.hosts}.example.com/feed/{feed_id}',
+                title=f'Feed {feed_id}',
+                interval=interval,
+            )
+            for feed_id, interval in enumerate(feed_intervals, start=1)
+        ),
+        batch_size=1000,
+    )
+    await db.Sub.bulk_create(
+        (
+            db.Sub(feed_id=feed_id, user_id=rng.randint(1, args.users), interval=interval)
+            for feed_id, interval in enumerate(feed_intervals, start=1)
+        ),
+        batch_size=1000,
+    )
+
+
+async def run_periodic_task(monitor: _monitor.Monitor):
+    # in place of the cron job of the bot, at the beginning of each minute
+    while True:
+        await asyncio.sleep(60 - loop.time() % 60)
+        await monitor.run_periodic_task()
+
+
+async def report_progress(real_start: float):
+    while True:
+        await asyncio.sleep(5 * 60)
+        simulated = loop.time() - START_TIME
+        print(f'... {simulated / 60:.0f} of {args.minutes} minutes simulated, '
+              f'{perf_counter() - real_start:.0f}s elapsed, {results["fetched"]} fetched', file=sys.stderr)
+
+
+def describe_rate(per_second: Counter[int], seconds: int) -> str:
+    counts = [per_second.get(int(START_TIME) + i, 0) for i in range(seconds)]
+    percentiles = quantiles(counts, n=100) if len(counts) >= 2 else counts * 99
+    return f'avg {mean(counts):.1f}/s, p99 {percentiles[98]:.0f}/s, max {max(counts)}/s'
+
+
+def describe_lateness() -> str:
+    if len(lateness) < 2:
+        return 'not enough samples'
+    percentiles = quantiles(lateness, n=100)
+    return (f'p50 {percentiles[49]:.2f}s, p90 {percentiles[89]:.2f}s, p99 {percentiles[98]:.2f}s, '
+            f'max {max(lateness):.2f}s')
+
+
+async def main():
+    await Tortoise.init(db_url='sqlite://:memory:', modules={'models': ['src.db.models']})
+    await Tortoise.generate_schemas()
+    await bg.init(loop=loop)
+    monitor = _monitor.Monitor()
+    record_monitor(monitor)
+    try:
+        print(f'Populating {args.feeds} feeds and {args.users} users...', file=sys.stderr)
+        await populate()
+        await db.effective_utils.init()
+
+        print(f'Simulating {args.minutes} minutes (MONITOR_CONCURRENCY={env.MONITOR_CONCURRENCY})...', file=sys.stderr)
+        real_start = perf_counter()
+        loop.virtual = True
+        monitor.start()
+        background = [
+            loop.create_task(run_periodic_task(monitor)),
+            loop.create_task(report_progress(real_start)),
+        ]
+        await asyncio.sleep(args.minutes * 60)
+        monitor.stop()
+        for task in background:
+            task.cancel()
+        loop.virtual = False
+        real_elapsed = perf_counter() - real_start
+        await db.FeedWriteBehind.close()
+
+        seconds = args.minutes * 60
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+        print(f'{args.feeds} feeds on {args.hosts} hosts, intervals {args.intervals} minutes, '
+              f'simulated for {args.minutes} minutes in {real_elapsed:.1f}s')
+        print(f'due: {sum(due_per_second.values())} ({describe_rate(due_per_second, seconds)})')
+        print(f'submitted: {sum(submitted_per_second.values())} ({describe_rate(submitted_per_second, seconds)})')
+        print(f'fetched: {results["fetched"]} (updated {results["updated"]}, not updated {results["not_updated"]}, '
+              f'failed {results["failed"]}), due but not fetched yet: {len(due_at)}')
+        print(f'deferred: {results["deferred"]}, resubmitted: {results["resubmitted"]}, '
+              f'skipped: {results["skipped"]}, adaptively deferred: {results["adaptively_deferred"]}')
+        print(f'lateness: {describe_lateness()}')
+        print(f'notified: {results["notified_updates"]} updates ({results["notified_messages"]} messages), '
+              f'deactivated: {results["deactivated"]}')
+        map_sizes = ', '.join(f'{name} {size}' for name, size in monitor.map_sizes().items())
+        print(f'memory: max RSS {max_rss / 1024:.1f}MiB, map sizes: {map_sizes}', end='')
+        if args.tracemalloc:
+            current, peak = tracemalloc.get_traced_memory()
+            print(f', traced {current / 1024 ** 2:.1f}MiB (peak {peak / 1024 ** 2:.1f}MiB)', end='')
+        print()
+    finally:
+        await monitor.close()
+        await bg.close()
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    if not args.verbose:
+        logging.getLogger('RSStT').setLevel(logging.WARNING)
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
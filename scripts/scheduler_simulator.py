@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Simulate the scheduler to see how polls of feeds on the same host are spread.
+
+Synthetic feeds (a big RSSHub instance with hundreds of routes, plus many small hosts) are stored in an in-memory
+SQLite database and scheduled by `EffectiveTasks` on a virtual clock, once with random placement (as if links were
+unknown, which is how feeds were scheduled before) and once with host-aware placement.
+For each mode, the peak number of polls per host in the same second and the peak number of concurrent fetches per host
+(assuming each fetch lasts `--fetch-duration` seconds) are reported.
+Run it from the root of the repository:
+
+    python scripts/scheduler_simulator.py
+    python scripts/scheduler_simulator.py --rate 1
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from collections import Counter, defaultdict
+from random import Random
+from typing import NoReturn
+
+__arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+__arg_parser.add_argument('--rsshub-feeds', type=int, default=600, help='number of feeds on the big RSSHub instance')
+__arg_parser.add_argument('--small-hosts', type=int, default=400, help='number of small hosts, 1-3 feeds each')
+__arg_parser.add_argument('--rate', type=int, default=0, help='MONITOR_RATE_PER_HOST, 0=unlimited')
+__arg_parser.add_argument('--fetch-duration', type=int, default=3, help='duration of each fetch in seconds')
+__arg_parser.add_argument('--minutes', type=int, default=120, help='simulated duration in minutes')
+__arg_parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic feeds')
+args = __arg_parser.parse_args()
+
+# src.env parses the command line and requires some settings, prepare them before importing
+sys.argv = sys.argv[:1]
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('TOKEN', '1234567890:simulator')
+os.environ.setdefault('MANAGER', '1234567890')
+os.environ['MONITOR_RATE_PER_HOST'] = str(args.rate)
+
+from tortoise import Tortoise  # noqa: E402
+from src.db import models  # noqa: E402
+from src.db.effective_utils import EffectiveOptions, EffectiveTasks  # noqa: E402
+
+START_TIME = 1_700_000_000
+RSSHUB_HOST = 'rsshub.example.com'
+
+
+class VirtualClock:
+    def __init__(self, now: int):
+        self.now = now
+
+    def __call__(self) -> int:
+        return self.now
+
+
+def synthetic_feeds(rng: Random) -> list[tuple[str, int]]:
+    intervals = (5, 10, 10, 10, 10, 30, 60)
+    feeds = [
+        (f'https://{RSSHUB_HOST}/route/{i}', rng.choice(intervals))
+        for i in range(args.rsshub_feeds)
+    ]
+    for host_id in range(args.small_hosts):
+        feeds.extend(
+            (f'https://blog{host_id}.example.net/feed/{i}', rng.choice(intervals))
+            for i in range(rng.randint(1, 3))
+        )
+    return feeds
+
+
+async def place(clock: VirtualClock, host_aware: bool) -> NoReturn:
+    clock.now = START_TIME
+    await EffectiveTasks.init(flush=True)
+    if not host_aware:
+        # reschedule as if links were unknown, falling back to random placement
+        for feed_id, interval in await models.Feed.all().values_list('id', 'interval'):
+            EffectiveTasks.delete(feed_id)
+            EffectiveTasks.update(feed_id, interval)
+
+
+def peak_window_sum(counts: Counter[int], window: int) -> int:
+    peak = 0
+    for second in counts:
+        peak = max(peak, sum(counts.get(second - i, 0) for i in range(window)))
+    return peak
+
+
+async def simulate(clock: VirtualClock, hosts: dict[int, str], host_aware: bool) -> dict[str, tuple[int, int]]:
+    await place(clock, host_aware)
+    polls: defaultdict[str, Counter[int]] = defaultdict(Counter)  # key: host, value: {second: polls}
+    for now in range(START_TIME, START_TIME + args.minutes * 60):
+        clock.now = now
+        for feed_id in EffectiveTasks.get_tasks(now):
+            polls[hosts[feed_id]][now] += 1
+    return {
+        host: (max(counts.values()), peak_window_sum(counts, args.fetch_duration))
+        for host, counts in polls.items()
+    }
+
+
+def report(title: str, result: dict[str, tuple[int, int]]) -> NoReturn:
+    small_hosts = [peaks for host, peaks in result.items() if host != RSSHUB_HOST]
+    print(f'{title}:')
+    print(f'    {RSSHUB_HOST}: peak {result[RSSHUB_HOST][0]} polls/s, '
+          f'peak {result[RSSHUB_HOST][1]} concurrent fetches')
+    print(f'    small hosts (worst): peak {max(p[0] for p in small_hosts)} polls/s, '
+          f'peak {max(p[1] for p in small_hosts)} concurrent fetches')
+
+
+async def main():
+    await Tortoise.init(db_url='sqlite://:memory:', modules={'models': ['src.db.models']})
+    await Tortoise.generate_schemas()
+    try:
+        await EffectiveOptions.cache()
+        feeds = synthetic_feeds(Random(args.seed))
+        await models.Feed.bulk_create(
+            models.Feed(link=link, title=link, interval=interval)
+            for link, interval in feeds
+        )
+        hosts = {
+            feed_id: link.split('/')[2]
+            for feed_id, link in await models.Feed.all().values_list('id', 'link')
+        }
+        print(f'{len(feeds)} feeds, {args.rsshub_feeds} of them on {RSSHUB_HOST}, '
+              f'simulated for {args.minutes} minutes, MONITOR_RATE_PER_HOST={args.rate}')
+
+        clock = VirtualClock(START_TIME)
+        EffectiveTasks.now = staticmethod(clock)
+        report('Before (random placement)', await simulate(clock, hosts, host_aware=False))
+        report('After (host-aware placement)', await simulate(clock, hosts, host_aware=True))
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
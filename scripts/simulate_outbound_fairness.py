@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Simulate the outbound scheduler with a noisy chat and many quiet chats, asserting that the noisy chat does not delay
+quiet ones.
+
+The noisy chat queues lots of posts at once, then quiet chats queue one post each. Each post is a message (or an album
+counting as several messages) acquired from the same kind of token buckets as the bot uses, with rates scaled up so that
+the simulation finishes quickly. No Telegram connection is needed. Run it from the root of the repository:
+
+    python scripts/simulate_outbound_fairness.py --noisy-posts 1000 --quiet-chats 50
+
+It exits with a non-zero status if any quiet chat waits longer than a few turns of the round-robin.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from time import monotonic
+
+__arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+__arg_parser.add_argument('--noisy-posts', type=int, default=1000, help='number of posts queued by the noisy chat')
+__arg_parser.add_argument('--album-size', type=int, default=1, help='number of messages per post of the noisy chat')
+__arg_parser.add_argument('--quiet-chats', type=int, default=50, help='number of quiet chats, one post each')
+__arg_parser.add_argument('--overall-rate', type=float, default=100, help='overall messages per second')
+__arg_parser.add_argument('--chat-rate', type=float, default=1000, help='messages per second per chat')
+__arg_parser.add_argument('--chat-burst', type=float, default=5, help='burst of messages per chat')
+args = __arg_parser.parse_args()
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.helpers.ratelimit import TokenBucket, TokenBucketMap, FairScheduler  # noqa: E402
+
+NOISY_CHAT = -1
+
+
+async def send_post(scheduler: FairScheduler[int], chat: int, messages: int) -> float:
+    start = monotonic()
+    async with scheduler.queue(chat):
+        for _ in range(messages):
+            await scheduler.acquire(chat)
+    return monotonic() - start
+
+
+async def main() -> int:
+    chat_buckets: TokenBucketMap[int] = TokenBucketMap(args.chat_rate, args.chat_burst)
+    scheduler: FairScheduler[int] = FairScheduler(
+        TokenBucket(args.overall_rate, args.overall_rate),
+        chat_buckets.__getitem__,
+    )
+    noisy = [
+        asyncio.create_task(send_post(scheduler, NOISY_CHAT, args.album_size))
+        for _ in range(args.noisy_posts)
+    ]
+    # Let the noisy chat drain the burst of the overall bucket.
+    await asyncio.sleep(2 * args.overall_rate / min(args.chat_rate, args.overall_rate * 2) + 0.01)
+    print(f'noisy chat queue depth: {scheduler.queue_depth(NOISY_CHAT)}')
+    quiet = [asyncio.create_task(send_post(scheduler, chat, 1)) for chat in range(1, args.quiet_chats + 1)]
+    quiet_delays = await asyncio.gather(*quiet)
+    print(f'noisy chat queue depth when quiet chats are done: {scheduler.queue_depth(NOISY_CHAT)}, '
+          f'oldest {scheduler.oldest_age(NOISY_CHAT):.2f}s')
+    noisy_delays = await asyncio.gather(*noisy)
+
+    # Each quiet chat waits for at most one turn of every other chat, plus its share of the overall rate.
+    bound = (args.quiet_chats + 1) * max(args.album_size, 1) / args.overall_rate + 1 / args.chat_rate + 0.1
+    print(f'quiet chats: max delay {max(quiet_delays):.3f}s (bound {bound:.3f}s), '
+          f'avg {sum(quiet_delays) / len(quiet_delays):.3f}s')
+    print(f'noisy chat: last post after {max(noisy_delays):.3f}s')
+    if max(quiet_delays) > bound:
+        print('FAILED: the noisy chat delayed quiet chats')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Soak test of long-lived maps keyed by feeds or users, asserting that memory stays flat.
+
+Round after round, a fresh range of feed ids goes through the task states of the monitor (queued, in progress, locked
+up and deferred), has its activity (including the weekly profile) learned and is then deleted, and a fresh range of
+user ids takes user locks, flood locks, media upload semaphores, pending callbacks and unsub locks. No DB or network is
+needed. Between rounds, the sizes of the maps and the traced memory are recorded.
+Run it from the root of the repository:
+
+    python scripts/soak_map_sizes.py --rounds 50 --ids 100000
+
+It exits with a non-zero status if any map is left non-empty after a round, or if the traced memory grows by more than
+the tolerance between the first round after warm-up and the last round.
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+from time import perf_counter, time
+
+__arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+__arg_parser.add_argument('--rounds', type=int, default=50, help='number of rounds')
+__arg_parser.add_argument('--ids', type=int, default=100000, help='number of fresh feed ids and user ids per round')
+__arg_parser.add_argument('--warm-up', type=int, default=2, help='number of rounds before taking the baseline')
+__arg_parser.add_argument('--tolerance', type=float, default=256, help='tolerated memory growth in KiB')
+__arg_parser.add_argument('--verbose', action='store_true', help='show logs of the bot')
+args = __arg_parser.parse_args()
+
+# src.env parses the command line and requires some settings, prepare them before importing
+sys.argv = sys.argv[:1]
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('TOKEN', '1234567890:soak')
+os.environ.setdefault('MANAGER', '1234567890')
+os.environ['FETCH_WORKERS'] = '0'
+os.environ['MONITOR_ROLE'] = 'all'
+
+from src import env, locks, db  # noqa: E402
+from src.monitor import _monitor  # noqa: E402
+from src.monitor._monitor import TaskState  # noqa: E402
+from src.monitor._notifier import Notifier  # noqa: E402
+
+loop = env.loop
+
+
+async def soak_feed_ids(monitor: _monitor.Monitor, first_id: int):
+    submitted: list[int] = []
+    monitor.submit_feed = lambda feed_id, *_, **__: submitted.append(feed_id)  # resubmission is out of scope
+    for feed_id in range(first_id, first_id + args.ids):
+        monitor._defer_feed_id(feed_id)  # a read, which used to insert an entry
+        monitor._lock_feed_id(feed_id)
+        monitor._set_state_for_feed_id(feed_id, monitor._get_state_for_feed_id(feed_id) | TaskState.QUEUED)
+        monitor._set_state_for_feed_id(
+            feed_id, monitor._get_state_for_feed_id(feed_id) & ~TaskState.QUEUED | TaskState.IN_PROGRESS
+        )
+        if feed_id % 2:
+            monitor._defer_feed_id(feed_id)  # submitted again while in progress
+        monitor._erase_state_for_feed_id(feed_id, TaskState.IN_PROGRESS)
+    now = time()
+    entry_timestamps = [int(now) - hours * 3600 for hours in range(0, 168 * 2, 3)]
+    for feed_id in range(first_id, first_id + args.ids):
+        monitor._activity.on_checked(feed_id, now, 1, entry_timestamps)
+        db.effective_utils.EffectiveTasks.delete(feed_id)  # unsubscribed or deactivated
+    await asyncio.sleep(monitor._lock_up_period * 2)  # wait for the lock-up period to end
+    expected = len(range(first_id | 1, first_id + args.ids, 2))  # odd ids
+    assert len(submitted) == expected, f'{len(submitted)} deferred subtasks resubmitted, expected {expected}'
+
+
+async def soak_user_ids(first_id: int):
+    unsub_all_lock_bucket = Notifier._user_unsub_all_lock_bucket
+    for user_id in range(first_id, first_id + args.ids):
+        locks.user_flood_lock(user_id).locked()  # a read, which used to insert an entry
+        async with locks.user_msg_lock(user_id), locks.user_media_upload_semaphore(user_id):
+            pending_callbacks = locks.user_pending_callbacks(user_id)
+            pending_callbacks.add(user_id)
+            pending_callbacks.remove(user_id)
+        async with unsub_all_lock_bucket[user_id]:
+            pass
+
+
+async def main():
+    monitor = _monitor.Monitor()
+    monitor._lock_up_period = 0.01  # in seconds, short enough to soak quickly
+    tracemalloc.start()
+    baseline = None
+    start = perf_counter()
+    failed = False
+    for soak_round in range(args.rounds):
+        first_id = soak_round * args.ids + 1
+        await soak_feed_ids(monitor, first_id)
+        await soak_user_ids(-first_id - args.ids + 1 if soak_round % 2 else first_id)  # channels and groups as well
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        map_sizes = monitor.map_sizes()
+        print(f'round {soak_round + 1}/{args.rounds}: traced {current / 1024:.1f}KiB, '
+              f'map sizes: {", ".join(f"{name} {size}" for name, size in map_sizes.items())}')
+        if any(map_sizes.values()):
+            print('FAILED: maps are left non-empty', file=sys.stderr)
+            failed = True
+            break
+        if soak_round + 1 == args.warm_up:
+            baseline = current
+    else:
+        if baseline is not None and (growth := (current - baseline) / 1024) > args.tolerance:
+            print(f'FAILED: memory grew by {growth:.1f}KiB since warm-up', file=sys.stderr)
+            failed = True
+    tracemalloc.stop()
+    print(f'{args.rounds * args.ids} feed ids and user ids soaked in {perf_counter() - start:.1f}s')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    if not args.verbose:
+        logging.getLogger('RSStT').setLevel(logging.WARNING)
+    try:
+        exit_code = loop.run_until_complete(main())
+    finally:
+        loop.close()
+    sys.exit(exit_code)
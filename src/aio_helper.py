@@ -18,7 +18,7 @@ Asyncio helper functions.
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
-from typing import Callable, Optional
+from typing import Callable, Optional, Any
 from typing_extensions import Literal
 
 import os
@@ -31,6 +31,10 @@ from multiprocessing import get_context, current_process
 
 from . import env, log
 
+# The default start method of the platform: fork on Linux (forkserver since Python 3.14), spawn on macOS and Windows.
+# All of them are supported. Subprocesses must not rely on states inherited from the main process: under spawn and
+# forkserver, modules are imported afresh, and `env` is re-evaluated from the same command line and environment
+# variables, so only the settings are shared.
 MP_CTX = get_context()
 
 CPU_COUNT = os.cpu_count()
@@ -43,6 +47,9 @@ PROCESS_COUNT = min(AVAIL_CPU_COUNT, 3) if env.MULTIPROCESSING else 1
 THREAD_POOL_WEIGHT = 2
 PROCESS_POOL_WEIGHT = PROCESS_COUNT - 1
 
+# Dedicated processes fetching and parsing feeds for the monitor, see also monitor._fetcher.
+FETCH_WORKER_COUNT = env.FETCH_WORKERS
+
 POOL_TYPE = Literal['thread', 'process']
 
 assert min(CPU_COUNT, AVAIL_CPU_COUNT, PROCESS_COUNT) > 0
@@ -51,6 +58,9 @@ assert min(THREAD_POOL_WEIGHT, PROCESS_POOL_WEIGHT) >= 0
 aioThreadExecutor: Optional[ThreadPoolExecutor] = None
 aioProcessExecutor: Optional[ProcessPoolExecutor] = None
 __aioExecutorsDeque: Optional[deque] = None
+fetchRequestQueue: Optional[Any] = None
+fetchResponseQueue: Optional[Any] = None
+__fetchWorkers: list = []
 
 logger = log.getLogger('RSStT.aio_helper')
 
@@ -78,12 +88,33 @@ def _process_initializer():
     _common_initializer()
 
 
+def _fetch_worker_main(requests, responses):
+    _process_initializer()
+    from .monitor._fetcher import serve  # heavy modules are only imported in the worker
+
+    serve(requests, responses)
+
+
 def init():
-    global aioThreadExecutor, aioProcessExecutor, __aioExecutorsDeque
+    global aioThreadExecutor, aioProcessExecutor, __aioExecutorsDeque, fetchRequestQueue, fetchResponseQueue
 
     if current_process().name != 'MainProcess':
         return  # avoid re-initialization in subprocesses
 
+    # fetch workers are started first, so that (under fork) they are forked before any thread is started
+    if FETCH_WORKER_COUNT:
+        fetchRequestQueue = MP_CTX.Queue()
+        fetchResponseQueue = MP_CTX.Queue()
+        for i in range(FETCH_WORKER_COUNT):
+            worker = MP_CTX.Process(
+                target=_fetch_worker_main,
+                args=(fetchRequestQueue, fetchResponseQueue),
+                name=f'rsstt_fetch_worker_{i}',
+                daemon=True,
+            )
+            worker.start()
+            __fetchWorkers.append(worker)
+
     # asyncio executors
     aioThreadExecutor = ThreadPoolExecutor(
         max_workers=THREAD_POOL_WEIGHT,
@@ -150,6 +181,14 @@ async def run_async(func: Callable, *args, prefer_pool: POOL_TYPE = None, **kwar
 
 
 def shutdown():
+    if __fetchWorkers:
+        for _ in __fetchWorkers:
+            fetchRequestQueue.put(None)
+        for worker in __fetchWorkers:
+            worker.join(timeout=3)
+            if worker.is_alive():
+                worker.terminate()
+        __fetchWorkers.clear()
     if aioProcessExecutor:
         aioProcessExecutor.shutdown(wait=True)
     if aioProcessExecutor:
@@ -83,6 +83,7 @@ async def callback_set(
     display_title: -1=disable, 0=auto, 1=force display
     display_entry_tags: -1=disable, 1=force display
     style: 0=RSStT, 1=flowerss
+    digest: -1=disable, 1=coalesce posts into a digest when too many are waiting to be sent
     """
     chat_id = chat_id or event.chat_id
     callback_tail = get_callback_tail(event, chat_id)
@@ -211,9 +212,10 @@ async def callback_reset(
         sub.interval = None
         update_interval_flag = True
     sub.length_limit = sub.notify = sub.send_mode = sub.link_preview = sub.display_author = sub.display_media = \
-        sub.display_title = sub.display_entry_tags = sub.display_via = sub.style = -100
+        sub.display_title = sub.display_entry_tags = sub.display_via = sub.style = sub.digest = -100
     await sub.save()
     if update_interval_flag:
+        db.effective_utils.EffectiveTasks.update_sub(sub)
         await inner.utils.update_interval(sub)
     info = await inner.customization.get_sub_info(sub, lang, additional_guide=True)
     buttons = await inner.customization.get_customization_buttons(sub, lang=lang, page=page, tail=callback_tail)
@@ -259,14 +261,16 @@ async def callback_reset_all(
             tasks.append(inner.utils.update_interval(sub))
         sub.interval = None
         sub.length_limit = sub.notify = sub.send_mode = sub.link_preview = sub.display_author = sub.display_media = \
-            sub.display_title = sub.display_entry_tags = sub.display_via = sub.style = -100
+            sub.display_title = sub.display_entry_tags = sub.display_via = sub.style = sub.digest = -100
     await db.Sub.bulk_update(
         subs,
         (
             'interval', 'length_limit', 'notify', 'send_mode', 'link_preview', 'display_author', 'display_media',
-            'display_title', 'display_entry_tags', 'display_via', 'style',
+            'display_title', 'display_entry_tags', 'display_via', 'style', 'digest',
         )
     )
+    for sub in subs:
+        db.effective_utils.EffectiveTasks.update_sub(sub)
     for task in tasks:
         env.loop.create_task(task)
     await event.edit(i18n[lang]['reset_all_successful'])
@@ -37,7 +37,8 @@ SUB_OPTIONS_EXHAUSTIVE_VALUES = {
     "display_via": (0, 1, -3, -1, -4, -2),
     "display_title": (0, 1, -1),
     "display_entry_tags": (1, -1),
-    "style": (0, 1)
+    "style": (0, 1),
+    "digest": (-1, 1)
 }
 
 FALLBACK_TO_USER_DEFAULT_EMOJI = "↩️"
@@ -76,7 +77,7 @@ async def get_customization_buttons(sub_or_user: Union[db.Sub, db.User],
     is_user = isinstance(sub_or_user, db.User)
     if is_user:
         interval_d = length_limit_d = notify_d = send_mode_d = link_preview_d = display_media_d = display_author_d = \
-            display_via_d = display_title_d = display_entry_tags_d = style_d = False
+            display_via_d = display_title_d = display_entry_tags_d = style_d = digest_d = False
         all_default = None
     else:
         if not isinstance(sub_or_user.user, db.User):
@@ -92,8 +93,10 @@ async def get_customization_buttons(sub_or_user: Union[db.Sub, db.User],
         display_title_d = sub_or_user.display_title == -100
         display_entry_tags_d = sub_or_user.display_entry_tags == -100
         style_d = sub_or_user.style == -100
+        digest_d = sub_or_user.digest == -100
         all_default = all((interval_d, length_limit_d, notify_d, send_mode_d, link_preview_d, display_media_d,
-                           display_author_d, display_via_d, display_title_d, display_entry_tags_d, style_d))
+                           display_author_d, display_via_d, display_title_d, display_entry_tags_d, style_d,
+                           digest_d))
     interval = sub_or_user.user.interval if interval_d else sub_or_user.interval
     length_limit = sub_or_user.user.length_limit if length_limit_d else sub_or_user.length_limit
     notify = sub_or_user.user.notify if notify_d else sub_or_user.notify
@@ -105,6 +108,7 @@ async def get_customization_buttons(sub_or_user: Union[db.Sub, db.User],
     display_title = sub_or_user.user.display_title if display_title_d else sub_or_user.display_title
     display_entry_tags = sub_or_user.user.display_entry_tags if display_entry_tags_d else sub_or_user.display_entry_tags
     style = sub_or_user.user.style if style_d else sub_or_user.style
+    digest = sub_or_user.user.digest if digest_d else sub_or_user.digest
     buttons = (
         (
             Button.inline(
@@ -152,6 +156,18 @@ async def get_customization_buttons(sub_or_user: Union[db.Sub, db.User],
                 ),
             ),
         ),
+        (
+            Button.inline(
+                f"{i18n[lang]['digest']}: "
+                + (FALLBACK_TO_USER_DEFAULT_EMOJI if digest_d else '')
+                + i18n[lang][f'digest_{digest}'],
+                data=(
+                    f'set_default=digest{tail}'
+                    if is_user
+                    else f'set={sub_or_user.id},digest|{page}{tail}'
+                ),
+            ),
+        ),
         (
             Button.inline(
                 f"{i18n[lang]['send_mode']}: "
@@ -423,10 +439,12 @@ async def set_interval(sub_or_user: Union[db.Sub, db.User], interval: int) -> Un
     await sub_or_user.save()
 
     if is_user:
+        db.effective_utils.EffectiveTasks.update_user_interval(sub_or_user.id, interval)
         subs = await db.Sub.filter(user_id=sub_or_user.id, interval__isnull=True)
         for sub in subs:
             env.loop.create_task(update_interval(sub))
     else:
+        db.effective_utils.EffectiveTasks.update_sub(sub_or_user)
         await update_interval(sub_or_user)
 
     return sub_or_user
@@ -31,7 +31,7 @@ from ... import db, web, env
 from ...aio_helper import run_async
 from ...i18n import i18n
 from .utils import update_interval, list_sub, filter_urls, logger, escape_html, \
-    check_sub_limit, calculate_update
+    check_sub_limit, calculate_update, pack_hashes
 from ...parsing.utils import ensure_plain
 
 FeedSnifferCache = TTLCache(maxsize=256, ttl=60 * 60 * 24)
@@ -100,13 +100,18 @@ async def sub(user_id: int,
                 feed.state = 1
                 feed.error_count = 0
                 feed.next_check_time = wf.calc_next_check_as_per_server_side_cache()
+                feed_updated_fields = {
+                    'state', 'error_count', 'next_check_time', 'last_modified', 'packed_entry_hashes',
+                }
                 etag = wr.etag
                 if etag:
                     feed.etag = etag
+                    feed_updated_fields.add('etag')
                 feed.last_modified = wr.last_modified
-                feed.entry_hashes = list(calculate_update(old_hashes=None, entries=rss_d.entries)[0])
-                await feed.save()  # now we get the id
-                db.effective_utils.EffectiveTasks.update(feed.id)
+                feed.packed_entry_hashes = pack_hashes(calculate_update(old_hashes=None, entries=rss_d.entries)[0])
+                await db.FeedWriteBehind.save(feed, feed_updated_fields)
+                db.FeedStateTable.put(feed)
+                db.effective_utils.EffectiveTasks.update(feed.id, link=feed.link)
 
         sub_title = sub_title if feed.title != sub_title else None
 
@@ -125,7 +130,8 @@ async def sub(user_id: int,
                     'display_title': -100,
                     'display_entry_tags': -100,
                     'style': -100,
-                    'display_media': -100
+                    'display_media': -100,
+                    'digest': -100
                 }
             )
 
@@ -146,6 +152,7 @@ async def sub(user_id: int,
                 logger.info(f'Sub {feed_url} for {user_id} activated')
 
         _sub.feed = feed  # by doing this we don't need to fetch_related
+        db.effective_utils.EffectiveTasks.update_sub(_sub)
         ret['sub'] = _sub
         if created_new_sub:
             logger.info(f'Subed {feed_url} for {user_id}')
@@ -231,6 +238,7 @@ async def unsub(user_id: int, feed_url: str = None, sub_id: int = None, lang: Op
             return ret
 
         await sub_to_delete.delete()
+        db.effective_utils.EffectiveTasks.delete_sub(sub_to_delete.id)
         await update_interval(feed=feed)
 
         sub_to_delete.feed = feed
@@ -330,29 +338,47 @@ async def migrate_to_new_url(feed: db.Feed, new_url: str) -> Union[bool, db.Feed
     new_url_feed = await db.Feed.get_or_none(link=new_url)
     if new_url_feed is None:  # new_url not occupied
         feed.link = new_url
-        await feed.save()
+        await db.FeedWriteBehind.save(feed, ('link',))
+        db.FeedStateTable.put(feed)
+        db.effective_utils.EffectiveTasks.update_link(feed.id, new_url)
         return True
 
     # new_url has been occupied by another feed
+    db.FeedWriteBehind.merge(feed, ())  # carry the latest state of the old feed over
     new_url_feed.state = 1
     new_url_feed.title = feed.title
     new_url_feed.entry_hashes = feed.entry_hashes
+    new_url_feed.packed_entry_hashes = feed.packed_entry_hashes
     new_url_feed.etag = feed.etag
     new_url_feed.last_modified = feed.last_modified
     new_url_feed.error_count = 0
     new_url_feed.next_check_time = None
-    await new_url_feed.save()
+    await db.FeedWriteBehind.save(new_url_feed, (
+        'state', 'title', 'entry_hashes', 'packed_entry_hashes', 'etag', 'last_modified', 'error_count',
+        'next_check_time',
+    ))
+    db.FeedStateTable.put(new_url_feed)
 
     # migrate all subs to the new feed
     tasks_migrate = []
+    subs_migrated = []
+    subs_to_cascade = []
     async for exist_sub in feed.subs:
         if await db.Sub.filter(feed=new_url_feed, user_id=exist_sub.user_id).exists():
+            subs_to_cascade.append(exist_sub)
             continue  # sub already exists, skip it, delete cascade later
         exist_sub.feed = new_url_feed
+        subs_migrated.append(exist_sub)
         tasks_migrate.append(env.loop.create_task(exist_sub.save()))
 
     await asyncio.gather(*tasks_migrate)
+    for exist_sub in subs_migrated:
+        db.effective_utils.EffectiveTasks.update_sub(exist_sub)
+    for exist_sub in subs_to_cascade:
+        db.effective_utils.EffectiveTasks.delete_sub(exist_sub.id)
     await asyncio.gather(update_interval(new_url_feed), feed.delete())
+    db.FeedStateTable.delete(feed.id)
+    db.FeedWriteBehind.discard(feed.id)
     return new_url_feed
 
 
@@ -20,8 +20,11 @@ from collections.abc import Iterable, Sequence
 
 import asyncio
 import re
+import sys
+from array import array
 from collections import defaultdict
-from itertools import chain, repeat
+from hashlib import blake2b
+from itertools import chain
 from telethon import Button
 from telethon.tl.types import KeyboardButtonCallback
 
@@ -50,30 +53,97 @@ def construct_hashtags(tags: Union[Iterable[str], str]) -> str:
     return '#' + ' #'.join(tags)
 
 
-def calculate_update(old_hashes: Optional[Sequence[str]], entries: Sequence[dict]) \
-        -> tuple[Iterable[str], Iterable[dict]]:
-    new_hashes_d = {
-        hex(crc32(guid.encode('utf-8')))[2:]: entry
-        for guid, entry in (
-            (
-                entry.get('guid') or entry.get('link') or entry.get('title') or entry.get('summary')
-                or (
-                    # the first non-empty content.value
-                    next(filter(None, map(lambda content: content.get('value'), entry.get('content', []))), '')
-                ),
-                entry
-            )
-            for entry in entries
-        )
-        if guid
-    }
-    if old_hashes:
-        new_hashes_d.update(zip(old_hashes, repeat(None)))
-    new_hashes = new_hashes_d.keys()
-    updated_entries = filter(None, new_hashes_d.values())
+def get_entry_guid(entry: dict) -> str:
+    return (
+            entry.get('guid') or entry.get('link') or entry.get('title') or entry.get('summary')
+            # the first non-empty content.value
+            or next(filter(None, map(lambda content: content.get('value'), entry.get('content', []))), '')
+    )
+
+
+def hash_entry_guid(guid: str) -> int:
+    return int.from_bytes(blake2b(guid.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def pack_hashes(hashes: array) -> bytes:
+    """
+    :param hashes: `array('Q')` of entry hashes
+    :return: packed little-endian 64-bit hashes, 8 bytes each
+    """
+    if sys.byteorder != 'little':
+        hashes = array('Q', hashes)
+        hashes.byteswap()
+    return hashes.tobytes()
+
+
+def unpack_hashes(packed: Optional[bytes]) -> array:
+    hashes = array('Q')
+    if packed:
+        hashes.frombytes(packed)
+        if sys.byteorder != 'little':
+            hashes.byteswap()
+    return hashes
+
+
+def calculate_update(
+        old_hashes: Optional[bytes],
+        entries: Sequence[dict],
+        legacy_hashes: Optional[Sequence[str]] = None,
+) -> tuple[array, list[dict]]:
+    """
+    Find out updated entries.
+
+    :param old_hashes: packed hashes of known entries, see `pack_hashes()`
+    :param entries: entries of the feed
+    :param legacy_hashes: hex CRC32 hashes of known entries stored by older versions and not converted yet
+    :return: hashes of current entries followed by hashes of known entries no longer in the feed, and updated entries
+    """
+    old_hashes = unpack_hashes(old_hashes)
+    known_hashes = set(old_hashes)
+    legacy_hashes = set(legacy_hashes) if legacy_hashes else None
+    new_hashes = array('Q')
+    current_hashes = set()
+    updated_entries = []
+    for entry in entries:
+        guid = get_entry_guid(entry)
+        if not guid:
+            continue
+        entry_hash = hash_entry_guid(guid)
+        if entry_hash in current_hashes:  # duplicated
+            continue
+        current_hashes.add(entry_hash)
+        new_hashes.append(entry_hash)
+        if entry_hash in known_hashes:
+            continue
+        if legacy_hashes is not None and hex(crc32(guid.encode('utf-8')))[2:] in legacy_hashes:
+            continue
+        updated_entries.append(entry)
+    new_hashes.extend(entry_hash for entry_hash in old_hashes if entry_hash not in current_hashes)
     return new_hashes, updated_entries
 
 
+def carry_over_legacy_hashes(
+        legacy_hashes: Optional[Sequence[str]],
+        entries: Sequence[dict],
+        limit: int,
+) -> Optional[list[str]]:
+    """
+    Find out legacy hashes to be kept after `calculate_update()`.
+    Those of current entries have been converted, but those of entries no longer in the feed cannot be, since their
+    GUIDs are unknown. They are kept until they age out like other hashes, so that the entries are not sent again if
+    they come back.
+
+    :param legacy_hashes: hex CRC32 hashes of known entries stored by older versions
+    :param entries: entries of the feed
+    :param limit: the number of hashes that can still be kept
+    :return: legacy hashes of known entries no longer in the feed, or None if none is left
+    """
+    if not legacy_hashes or limit <= 0:
+        return None
+    current_hashes = {hex(crc32(guid.encode('utf-8')))[2:] for guid in map(get_entry_guid, entries) if guid}
+    return [legacy_hash for legacy_hash in legacy_hashes if legacy_hash not in current_hashes][:limit] or None
+
+
 def filter_urls(urls: Optional[Iterable[str]]) -> tuple[str, ...]:
     return tuple(filter(lambda x: x.startswith('http://') or x.startswith('https://'), urls)) if urls else ()
 
@@ -268,21 +338,33 @@ async def update_interval(feed: Union[db.Feed, db.Sub, int]):
     curr_interval = feed.interval or default_interval
     set_to_default = False
 
-    sub_exist = await feed.subs.all().exists()
+    effective_tasks = db.effective_utils.EffectiveTasks
+    sub_index_loaded = effective_tasks.is_sub_index_loaded()
+    sub_exist = effective_tasks.count_subs(feed.id) > 0 if sub_index_loaded else await feed.subs.all().exists()
     if not sub_exist:  # no sub subs the feed, del the feed
         await feed.delete()
+        db.FeedStateTable.delete(feed.id)
+        db.FeedWriteBehind.discard(feed.id)
         db.effective_utils.EffectiveTasks.delete(feed.id)
         return
-    intervals = await feed.subs.filter(state=1, interval__not_isnull=True).values_list('interval', flat=True)
-    intervals += await feed.subs.filter(state=1, interval__isnull=True, user__interval__not_isnull=True) \
-        .values_list('user__interval', flat=True)
-    some_using_default = await feed.subs.filter(state=1, interval__isnull=True, user__interval__isnull=True).exists()
+    if sub_index_loaded:  # O(1), no DB round trip
+        interval_multiset = effective_tasks.get_interval_multiset(feed.id)
+        some_using_default = None in interval_multiset
+        intervals = [interval for interval in interval_multiset if interval is not None]
+    else:
+        intervals = await feed.subs.filter(state=1, interval__not_isnull=True).values_list('interval', flat=True)
+        intervals += await feed.subs.filter(state=1, interval__isnull=True, user__interval__not_isnull=True) \
+            .values_list('user__interval', flat=True)
+        some_using_default = await feed.subs.filter(
+            state=1, interval__isnull=True, user__interval__isnull=True
+        ).exists()
     if not intervals and not some_using_default:  # no active sub subs the feed, deactivate the feed
         if feed.state == 1:
             feed.state = 0
             feed.error_count = 0
             feed.next_check_time = None
-            await feed.save()
+            await db.FeedWriteBehind.save(feed, ('state', 'error_count', 'next_check_time'))
+            db.FeedStateTable.put(feed)
         db.effective_utils.EffectiveTasks.delete(feed.id)
         return
     new_interval = min(intervals) if intervals else None
@@ -290,19 +372,20 @@ async def update_interval(feed: Union[db.Feed, db.Sub, int]):
         new_interval = default_interval
         set_to_default = True
 
-    feed_update_flag = False
+    feed_updated_fields: set[str] = set()
     if new_interval != curr_interval or (set_to_default and feed.interval is not None):
         feed.interval = None if set_to_default else new_interval
-        feed_update_flag = True
+        feed_updated_fields.add('interval')
     if feed.state != 1:
         feed.state = 1
         feed.error_count = 0
         feed.next_check_time = None
-        feed_update_flag = True
-    if feed_update_flag:
-        await feed.save()
+        feed_updated_fields.update(('state', 'error_count', 'next_check_time'))
+    if feed_updated_fields:
+        await db.FeedWriteBehind.save(feed, feed_updated_fields)
+        db.FeedStateTable.put(feed)
     if db.effective_utils.EffectiveTasks.get_interval(feed.id) != new_interval:
-        db.effective_utils.EffectiveTasks.update(feed.id, new_interval)
+        db.effective_utils.EffectiveTasks.update(feed.id, new_interval, link=feed.link)
 
 
 async def list_sub(user_id: int, *args, **kwargs) -> list[db.Sub]:
@@ -346,7 +429,8 @@ async def activate_feed(feed: db.Feed) -> db.Feed:
     feed.state = 1
     feed.error_count = 0
     feed.next_check_time = None
-    await feed.save()
+    await db.FeedWriteBehind.save(feed, ('state', 'error_count', 'next_check_time'))
+    db.FeedStateTable.put(feed)
     await update_interval(feed)
     return feed
 
@@ -357,12 +441,15 @@ async def deactivate_feed(feed: db.Feed) -> db.Feed:
     subs = await feed.subs.all()
     if not subs:
         await feed.delete()
+        db.FeedStateTable.delete(feed.id)
+        db.FeedWriteBehind.discard(feed.id)
         return feed
 
     feed.state = 0
     feed.error_count = 0
     feed.next_check_time = None
-    await feed.save()
+    await db.FeedWriteBehind.save(feed, ('state', 'error_count', 'next_check_time'))
+    db.FeedStateTable.delete(feed.id)
     await asyncio.gather(
         *(activate_or_deactivate_sub(sub.user_id, sub, activate=False, _update_interval=False) for sub in subs)
     )
@@ -388,6 +475,7 @@ async def activate_or_deactivate_sub(user_id: int, sub: Union[db.Sub, int], acti
 
     sub.state = 1 if activate else 0
     await sub.save()
+    db.effective_utils.EffectiveTasks.update_sub(sub)
     if not isinstance(sub.feed, db.Feed):
         await sub.fetch_related('feed')
 
@@ -419,8 +507,17 @@ async def activate_or_deactivate_all_subs(user_id: int, activate: bool) -> tuple
             feeds_to_update.append(feed)
         tasks.append(update_interval(feed))
     await db.Sub.bulk_update(subs, ['state'])
+    for sub in subs:
+        db.effective_utils.EffectiveTasks.update_sub(sub)
     if feeds_to_update:
-        await db.Feed.bulk_update(feeds_to_update, ['state', 'error_count', 'next_check_time'])
+        feed_updated_fields = {'state', 'error_count', 'next_check_time'}
+        # bulk_update() updates the same fields for all feeds, take over pending updates of all of them.
+        feed_updated_fields.update(*(
+            db.FeedWriteBehind.merge(feed, feed_updated_fields) for feed in feeds_to_update
+        ))
+        await db.Feed.bulk_update(feeds_to_update, list(feed_updated_fields))
+        for feed in feeds_to_update:
+            db.FeedStateTable.put(feed)
     for task in tasks:
         env.loop.create_task(task)
     return tuple(subs)
@@ -28,7 +28,7 @@ from tortoise.transactions import in_transaction
 
 from . import config, models
 from .. import env, log
-from . import effective_utils
+from . import effective_utils, feed_state, write_behind
 
 logger = log.getLogger('RSStT.db')
 
@@ -36,8 +36,12 @@ User = models.User
 Feed = models.Feed
 Sub = models.Sub
 Option = models.Option
+Lease = models.Lease
+Outbox = models.Outbox
 EffectiveOptions = effective_utils.EffectiveOptions
 EffectiveTasks = effective_utils.EffectiveTasks
+FeedWriteBehind = write_behind.FeedWriteBehind
+FeedStateTable = feed_state.FeedStateTable
 
 
 class DBType(Enum):  # TODO: use StrEnum once the minimum Python requirement is 3.11
@@ -112,8 +116,12 @@ async def init():
             logger.error('Failed to fetch unapplied migrations', exc_info=e)
         exit(1)
     await effective_utils.init()
+    await FeedStateTable.init()
     logger.info('Successfully connected to the DB')
 
 
 async def close():
-    await Tortoise.close_connections()
+    try:
+        await FeedWriteBehind.close()
+    finally:
+        await Tortoise.close_connections()
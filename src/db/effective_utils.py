@@ -19,16 +19,28 @@ from typing import Optional, Any, NoReturn, Union
 from typing_extensions import Final
 from collections.abc import Callable
 
-from collections import defaultdict
-from contextlib import suppress
+from array import array
+from collections import defaultdict, Counter
 from math import ceil
-from random import shuffle
+from random import randrange
+from time import time
+from urllib.parse import urlparse
+from zlib import crc32
 
 from . import models
-from .. import log
+from .. import env, log
+from ..helpers.persistence import persistence
+from ..helpers.timing_wheel import TimingWheel
 
 logger = log.getLogger('RSStT.db')
 
+GOLDEN_RATIO_CONJUGATE: Final[float] = 0.6180339887498949
+MAX_SLOT_SEARCH: Final[int] = 60 * 60  # seconds
+# A channel or group subscriber weighs as many as this number of user subscribers.
+CHANNEL_OR_GROUP_WEIGHT: Final[int] = 10
+# Weight tiers are log2 of weights, capped at this.
+MAX_WEIGHT_TIER: Final[int] = 10
+
 
 class __EffectiveOptions:
     """
@@ -54,6 +66,10 @@ class __EffectiveOptions:
         self.__default_options: dict[str, Union[str, int]] = {
             "default_interval": 10,
             "minimal_interval": 5,
+            "adaptive_interval_cap": 0,
+            "update_entry_limit": 0,
+            "mass_update_ratio": 0,
+            "update_overflow_action": "summary",
             "user_sub_limit": -1,
             "channel_or_group_sub_limit": -1,
             "sub_limit_reached_message": "",
@@ -76,6 +92,22 @@ class __EffectiveOptions:
     def minimal_interval(self) -> int:
         return self.get("minimal_interval")
 
+    @property
+    def adaptive_interval_cap(self) -> int:
+        return self.get("adaptive_interval_cap")
+
+    @property
+    def update_entry_limit(self) -> int:
+        return self.get("update_entry_limit")
+
+    @property
+    def mass_update_ratio(self) -> int:
+        return self.get("mass_update_ratio")
+
+    @property
+    def update_overflow_action(self) -> str:
+        return self.get("update_overflow_action")
+
     @property
     def user_sub_limit(self) -> int:
         return self.get("user_sub_limit")
@@ -168,24 +200,46 @@ class EffectiveTasks:
     """
     EffectiveTasks class.
 
-    A task dispatcher.
+    A task dispatcher scheduling each feed as per its own due time on a timing wheel.
+    Due times are persisted across restarts, so that polling resumes where it was instead of starting over.
+    Feeds on the same host are spread evenly across their intervals, and no more than `MONITOR_RATE_PER_HOST` of
+    them are scheduled in the same second.
+    Each feed carries a weight derived from its active subscribers, so that feeds with more subscribers can be
+    prioritized by the monitor.
+    Subs are mirrored in compact arrays (slots of deleted subs are reused), so that the effective intervals of active
+    subs of each feed (as a multiset), the number of subs of each feed, and the weight of each feed are maintained
+    incrementally as subs change (see `update_sub()` and `delete_sub()`), without querying the DB.
     """
-    __task_buckets: dict[int, "EffectiveTasks"] = {}  # key: interval, value: EffectiveTasks
     __all_tasks: dict[int, int] = {}  # key: id, value: interval
-
-    def __init__(self, interval: int) -> NoReturn:
-        self.interval: Final[int] = interval
-        self.__all_feeds: set[int] = set()
-        self.__pending_feeds: list[int] = []  # use a list here to make randomization easier
-        # self.__checked_feeds: set[int] = set()
-        self.__run_count: int = 0
+    __wheel: TimingWheel[int] = TimingWheel(start=int(time()))
+    __hosts: dict[int, str] = {}  # key: id, value: hostname
+    __host_slots: defaultdict[str, Counter[int]] = defaultdict(Counter)  # key: hostname, value: {due time: count}
+    __host_due_times: dict[int, int] = {}  # key: id, value: due time, mirrors __host_slots
+    # key: (hostname, interval), value: number of feeds placed so far
+    __host_seq: Counter[tuple[str, int]] = Counter()
+    __initialized: bool = False
+    __restored: Optional[dict[int, int]] = None  # key: id, value: due time; waiting to be applied
+    # The state may be restored after init, keep next_check_time from the DB until then.
+    __not_before: dict[int, float] = {}  # key: id, value: next_check_time
+    # Mirror of subs.
+    __sub_slots: dict[int, int] = {}  # key: sub id, value: index in the columns below
+    __free_sub_slots: list[int] = []
+    __sub_feed_ids: array[int] = array('l')
+    __sub_user_ids: array[int] = array('q')
+    __sub_states: array[int] = array('b')
+    __sub_intervals: array[int] = array('h')  # 0 if null
+    __user_sub_ids: defaultdict[int, set[int]] = defaultdict(set)  # key: user id, value: ids of subs of the user
+    __user_intervals: dict[int, int] = {}  # key: user id, value: default interval of the user, absent if null
+    # key: feed id, value: {effective interval of an active sub (None if the default interval applies): count}
+    __interval_multisets: defaultdict[int, Counter[Optional[int]]] = defaultdict(Counter)
+    __sub_counts: Counter[int] = Counter()  # key: feed id, value: number of subs, active or not
+    __weights: Counter[int] = Counter()  # key: feed id, value: weight of active subs
+    __subs_loaded: bool = False
+    __delete_callbacks: list[Callable[[int], Any]] = []
 
     @staticmethod
-    def __ignore_key_or_value_error(func: Callable, *args, **kwargs) -> Optional[Any]:
-        try:
-            return func(*args, **kwargs)
-        except (KeyError, ValueError):
-            return None
+    def now() -> int:
+        return int(time())
 
     @classmethod
     async def init(cls, flush: bool = False) -> NoReturn:
@@ -194,59 +248,382 @@ class EffectiveTasks:
 
         :param flush: if already initialized, re-initialize?
         """
-        if not cls.__task_buckets or flush:
+        if not cls.__all_tasks or flush:
             cls.__all_tasks = {}
-            cls.__task_buckets = {}
-            feeds = await models.Feed.filter(state=1).values('id', 'interval')
+            cls.__wheel = TimingWheel(start=cls.now())
+            cls.__hosts = {}
+            cls.__host_slots = defaultdict(Counter)
+            cls.__host_due_times = {}
+            cls.__host_seq = Counter()
+            cls.__not_before = {}
+            feeds = await models.Feed.filter(state=1).values('id', 'interval', 'link', 'next_check_time')
             default_interval = EffectiveOptions.default_interval
             for feed in feeds:
-                cls.update(feed_id=feed['id'], interval=feed['interval'] or default_interval)
+                cls.update(feed_id=feed['id'], interval=feed['interval'] or default_interval, link=feed['link'])
+                if next_check_time := feed['next_check_time']:
+                    cls.__not_before[feed['id']] = next_check_time.timestamp()
+            await cls.__load_subs()
+            cls.__initialized = True
+            cls.__apply_restored()
+
+    @classmethod
+    async def sync(cls) -> NoReturn:
+        """
+        Synchronize tasks with the DB, picking up feeds activated or deactivated by another process.
+        """
+        feeds = await models.Feed.filter(state=1).values_list('id', 'interval', 'link')
+        default_interval = EffectiveOptions.default_interval
+        active_feed_ids = set()
+        for feed_id, interval, link in feeds:
+            active_feed_ids.add(feed_id)
+            cls.update(feed_id=feed_id, interval=interval or default_interval, link=link)
+        for feed_id in cls.__all_tasks.keys() - active_feed_ids:
+            cls.delete(feed_id)
+        await cls.__load_subs()
+
+    @classmethod
+    async def __load_subs(cls) -> NoReturn:
+        subs = await models.Sub.all().values_list('id', 'feed_id', 'user_id', 'state', 'interval')
+        user_intervals = await models.User.filter(interval__not_isnull=True).values_list('id', 'interval')
+        cls.__sub_slots = {}
+        cls.__free_sub_slots = []
+        cls.__sub_feed_ids = array('l')
+        cls.__sub_user_ids = array('q')
+        cls.__sub_states = array('b')
+        cls.__sub_intervals = array('h')
+        cls.__user_sub_ids = defaultdict(set)
+        cls.__user_intervals = dict(user_intervals)
+        cls.__interval_multisets = defaultdict(Counter)
+        cls.__sub_counts = Counter()
+        cls.__weights = Counter()
+        for sub in subs:
+            cls.__add_sub(*sub)
+        cls.__subs_loaded = True
+
+    @classmethod
+    def __effective_interval(cls, user_id: int, interval: int) -> Optional[int]:
+        return interval or cls.__user_intervals.get(user_id)
+
+    @staticmethod
+    def __sub_weight(user_id: int) -> int:
+        return CHANNEL_OR_GROUP_WEIGHT if user_id < 0 else 1
+
+    @classmethod
+    def __add_sub(cls, sub_id: int, feed_id: int, user_id: int, state: int, interval: Optional[int]) -> NoReturn:
+        # Caller MUST ensure that the sub is absent, see __remove_sub().
+        if cls.__free_sub_slots:
+            slot = cls.__free_sub_slots.pop()
+        else:
+            slot = len(cls.__sub_feed_ids)
+            for column in (cls.__sub_feed_ids, cls.__sub_user_ids, cls.__sub_states, cls.__sub_intervals):
+                column.append(0)
+        cls.__sub_slots[sub_id] = slot
+        interval = interval or 0
+        cls.__sub_feed_ids[slot] = feed_id
+        cls.__sub_user_ids[slot] = user_id
+        cls.__sub_states[slot] = state
+        cls.__sub_intervals[slot] = interval
+        cls.__user_sub_ids[user_id].add(sub_id)
+        cls.__sub_counts[feed_id] += 1
+        if state == 1:
+            cls.__interval_multisets[feed_id][cls.__effective_interval(user_id, interval)] += 1
+            cls.__weights[feed_id] += cls.__sub_weight(user_id)
+
+    @classmethod
+    def __remove_sub(cls, sub_id: int) -> NoReturn:
+        slot = cls.__sub_slots.pop(sub_id, None)
+        if slot is None:
+            return
+        cls.__free_sub_slots.append(slot)
+        feed_id = cls.__sub_feed_ids[slot]
+        user_id = cls.__sub_user_ids[slot]
+        user_sub_ids = cls.__user_sub_ids[user_id]
+        user_sub_ids.discard(sub_id)
+        if not user_sub_ids:
+            del cls.__user_sub_ids[user_id]
+        cls.__sub_counts[feed_id] -= 1
+        if not cls.__sub_counts[feed_id]:
+            del cls.__sub_counts[feed_id]
+        if cls.__sub_states[slot] == 1:
+            multiset = cls.__interval_multisets[feed_id]
+            multiset[cls.__effective_interval(user_id, cls.__sub_intervals[slot])] -= 1
+            cls.__weights[feed_id] -= cls.__sub_weight(user_id)
+            if not +multiset:  # only zero counts left
+                del cls.__interval_multisets[feed_id]
+                del cls.__weights[feed_id]
+
+    @classmethod
+    def update_sub(cls, sub: models.Sub) -> NoReturn:
+        """
+        Apply a sub that has just been created or updated.
+
+        :param sub: the sub
+        """
+        if not cls.__subs_loaded:
+            return  # will be loaded from the DB
+        cls.__remove_sub(sub.id)
+        cls.__add_sub(sub.id, sub.feed_id, sub.user_id, sub.state, sub.interval)
+
+    @classmethod
+    def delete_sub(cls, sub_id: int) -> NoReturn:
+        """
+        Apply a sub that has just been deleted.
+
+        :param sub_id: the id of the sub
+        """
+        if cls.__subs_loaded:
+            cls.__remove_sub(sub_id)
+
+    @classmethod
+    def update_user_interval(cls, user_id: int, interval: Optional[int]) -> NoReturn:
+        """
+        Apply a change of the default interval of a user, which affects subs of the user without an interval.
+
+        :param user_id: the id of the user
+        :param interval: the new default interval of the user
+        """
+        if not cls.__subs_loaded:
+            return
+        old_interval = cls.__user_intervals.get(user_id)
+        if interval:
+            cls.__user_intervals[user_id] = interval
+        else:
+            cls.__user_intervals.pop(user_id, None)
+            interval = None
+        if old_interval == interval:
+            return
+        sub_slots, sub_states, sub_intervals = cls.__sub_slots, cls.__sub_states, cls.__sub_intervals
+        for sub_id in cls.__user_sub_ids.get(user_id, ()):
+            slot = sub_slots[sub_id]
+            if sub_states[slot] == 1 and not sub_intervals[slot]:
+                multiset = cls.__interval_multisets[cls.__sub_feed_ids[slot]]
+                multiset[old_interval] -= 1
+                multiset[interval] += 1
 
-    def __update(self, feed_id: int):
-        self.__all_feeds.add(feed_id)
-        # no need to add it to the pending list, since it will be processed in the next cycle
-        #
-        # if feed_id not in self.__pending_feeds:
-        #     self.__pending_feeds.append(feed_id)
+    @classmethod
+    def is_sub_index_loaded(cls) -> bool:
+        return cls.__subs_loaded
 
     @classmethod
-    def update(cls, feed_id: int, interval: int = None) -> NoReturn:
+    def count_subs(cls, feed_id: int) -> int:
+        """
+        :return `int`: the number of subs of the feed, active or not
+        """
+        return cls.__sub_counts.get(feed_id, 0)
+
+    @classmethod
+    def count_active_subs(cls, feed_id: int) -> int:
+        """
+        :return `int`: the number of active subs of the feed
+        """
+        multiset = cls.__interval_multisets.get(feed_id)
+        return sum(multiset.values()) if multiset else 0
+
+    @classmethod
+    def is_sub_active(cls, sub_id: int, feed_id: int) -> bool:
+        """
+        :return `bool`: whether the sub exists, belongs to the feed, and is active
+        """
+        slot = cls.__sub_slots.get(sub_id)
+        return slot is not None and cls.__sub_feed_ids[slot] == feed_id and cls.__sub_states[slot] == 1
+
+    @classmethod
+    def get_interval_multiset(cls, feed_id: int) -> Counter[Optional[int]]:
+        """
+        :return: a copy of {effective interval of an active sub (None if the default interval applies): count}
+        """
+        multiset = cls.__interval_multisets.get(feed_id)
+        return +multiset if multiset is not None else Counter()
+
+    @classmethod
+    async def check_sub_index(cls) -> list[int]:
+        """
+        Check the incrementally maintained multisets, sub counts and weights against a full recompute from the DB.
+        Mismatches are logged and fixed by adopting the recompute.
+
+        :return: ids of mismatched feeds
+        """
+        if not cls.__subs_loaded:
+            return []
+        multisets = {feed_id: +multiset for feed_id, multiset in cls.__interval_multisets.items()}
+        sub_counts = +cls.__sub_counts
+        weights = +cls.__weights
+        await cls.__load_subs()
+        mismatched = sorted(
+            feed_id
+            for feed_id in multisets.keys() | sub_counts.keys() | weights.keys()
+            | cls.__interval_multisets.keys() | cls.__sub_counts.keys()
+            if (multisets.get(feed_id, Counter()) != +cls.__interval_multisets.get(feed_id, Counter())
+                or sub_counts[feed_id] != cls.__sub_counts[feed_id]
+                or weights[feed_id] != cls.__weights[feed_id])
+        )
+        if mismatched:
+            logger.warning(f'Sub index mismatched the DB, recomputed for {len(mismatched)} feeds: {mismatched[:100]}')
+        return mismatched
+
+    @classmethod
+    def snapshot(cls) -> dict[int, int]:
+        """
+        Take a snapshot of due times of all tasks.
+
+        :return: a `dict` whose keys are feed ids and values are due times (UNIX timestamps)
+        """
+        return dict(cls.__wheel.items())
+
+    @classmethod
+    def restore(cls, snapshot: dict[int, int]) -> NoReturn:
+        """
+        Restore due times from a snapshot. Applied on init if not initialized yet.
+
+        :param snapshot: a snapshot taken by `snapshot()`
+        """
+        cls.__restored = snapshot
+        if cls.__initialized:
+            cls.__apply_restored()
+
+    @classmethod
+    def __apply_restored(cls) -> NoReturn:
+        restored, cls.__restored = cls.__restored, None
+        if restored is not None:
+            now = cls.now()
+            all_tasks = cls.__all_tasks
+            for feed_id, due_time in restored.items():
+                interval = all_tasks.get(feed_id)
+                if interval is None:  # no longer active
+                    continue
+                if due_time < now:
+                    # Became due while the bot was down. Resume at the same phase within its interval rather than
+                    # running all of them at once, so that the load stays as flat as before.
+                    due_time = now + (due_time - now) % (interval * 60)
+                cls.__insert(feed_id, due_time)
+        for feed_id, not_before in cls.__not_before.items():
+            cls.defer(feed_id, not_before)
+        if restored is not None:
+            cls.__not_before = {}
+
+    @classmethod
+    def __insert(cls, feed_id: int, due_time: int) -> NoReturn:
+        host = cls.__hosts.get(feed_id)
+        if host is not None:
+            cls.__release_slot(feed_id)
+            slots = cls.__host_slots[host]
+            rate = env.MONITOR_RATE_PER_HOST
+            if rate > 0:
+                due_time = int(due_time)
+                limit = due_time + MAX_SLOT_SEARCH
+                while slots[due_time] >= rate and due_time < limit:
+                    due_time += 1
+            slots[due_time] += 1
+            cls.__host_due_times[feed_id] = due_time
+        cls.__wheel.insert(feed_id, due_time)
+
+    @classmethod
+    def __release_slot(cls, feed_id: int) -> NoReturn:
+        due_time = cls.__host_due_times.pop(feed_id, None)
+        if due_time is None:
+            return
+        host = cls.__hosts[feed_id]
+        slots = cls.__host_slots[host]
+        slots[due_time] -= 1
+        if slots[due_time] <= 0:
+            del slots[due_time]
+            if not slots:
+                del cls.__host_slots[host]
+
+    @classmethod
+    def __initial_offset(cls, feed_id: int, interval: int) -> int:
+        host = cls.__hosts.get(feed_id)
+        if host is None:
+            return randrange(interval * 60)
+        # Feeds on the same host with the same interval take turns in a low-discrepancy sequence starting from a
+        # per-host phase, so that they are spread evenly across their interval no matter how many of them there are.
+        # Sharing a sequence across intervals would leave each interval with an uneven subsequence of it.
+        key = (host, interval)
+        seq = cls.__host_seq[key]
+        cls.__host_seq[key] = seq + 1
+        phase = crc32(host.encode()) / 0x100000000
+        return int((phase + seq * GOLDEN_RATIO_CONJUGATE) % 1 * interval * 60)
+
+    @classmethod
+    def update(cls, feed_id: int, interval: int = None, link: str = None) -> NoReturn:
         """
         Update or add a task.
 
+        A new task is scheduled at a moment within its interval to spread the load, evenly among feeds on the same
+        host if its link is known.
+        If the interval of an existing task is shortened, the task is brought forward accordingly.
+
         :param feed_id: the id of the feed in the task
         :param interval: the interval of the task
+        :param link: the link of the feed in the task
         """
         interval = interval or EffectiveOptions.default_interval
-        if feed_id in cls.__all_tasks:  # if already have a task
-            if cls.__all_tasks[feed_id] == interval:  # no need to update
-                return
-            cls.delete(feed_id, _preserve_in_all_tasks=True)  # delete the old one
-
-        if interval not in cls.__task_buckets:  # if lack of bucket
-            cls.__task_buckets[interval] = cls(interval)  # create one
-
+        if link:
+            cls.update_link(feed_id, link)
+        now = cls.now()
+        old_interval = cls.__all_tasks.get(feed_id)
+        if old_interval == interval:  # no need to update
+            return
         cls.__all_tasks[feed_id] = interval  # log the new task
-        cls.__task_buckets[interval].__update(feed_id)  # update task
+        if old_interval is None or feed_id not in cls.__wheel:
+            cls.__insert(feed_id, now + cls.__initial_offset(feed_id, interval))
+        elif interval < old_interval:
+            cls.__insert(feed_id, min(cls.__wheel.due_time(feed_id), now + interval * 60))
 
-    def __delete(self, feed_id: int) -> NoReturn:
-        self.__ignore_key_or_value_error(self.__all_feeds.remove, feed_id)
-        self.__ignore_key_or_value_error(self.__pending_feeds.remove, feed_id)
+    @classmethod
+    def update_link(cls, feed_id: int, link: str) -> NoReturn:
+        """
+        Update the link of a task, moving its slot to the new host if the host has changed.
+
+        :param feed_id: the id of the feed in the task
+        :param link: the new link of the feed in the task
+        """
+        host = urlparse(link).hostname
+        if cls.__hosts.get(feed_id) == host:
+            return
+        due_time = cls.__host_due_times.get(feed_id)
+        cls.__release_slot(feed_id)
+        if host:
+            cls.__hosts[feed_id] = host
+        else:
+            cls.__hosts.pop(feed_id, None)
+        if due_time is not None and feed_id in cls.__wheel:
+            cls.__insert(feed_id, due_time)
 
     @classmethod
-    def delete(cls, feed_id: int, _preserve_in_all_tasks: bool = False) -> NoReturn:
+    def delete(cls, feed_id: int) -> NoReturn:
         """
         Delete a task.
 
         :param feed_id: the id of the feed in the task
-        :param _preserve_in_all_tasks: for internal use
         """
-        with suppress(KeyError):
-            old_interval = cls.__all_tasks[feed_id]
-            cls.__task_buckets[old_interval].__delete(feed_id)
+        cls.__all_tasks.pop(feed_id, None)
+        cls.__release_slot(feed_id)
+        cls.__hosts.pop(feed_id, None)
+        cls.__wheel.cancel(feed_id)
+        for callback in cls.__delete_callbacks:
+            callback(feed_id)
+
+    @classmethod
+    def add_delete_callback(cls, callback: Callable[[int], Any]) -> NoReturn:
+        """
+        Register a callback to be called when a task is deleted, i.e., the feed is deleted or deactivated.
 
-            if not _preserve_in_all_tasks:
-                del cls.__all_tasks[feed_id]
+        :param callback: a callable accepting the id of the feed
+        """
+        cls.__delete_callbacks.append(callback)
+
+    @classmethod
+    def defer(cls, feed_id: int, not_before: float) -> NoReturn:
+        """
+        Postpone a task so that it will not be run before the specified time. Never bring a task forward.
+
+        :param feed_id: the id of the feed in the task
+        :param not_before: a UNIX timestamp
+        """
+        due_time = cls.__wheel.due_time(feed_id)
+        if due_time is not None and due_time < not_before:
+            cls.__insert(feed_id, ceil(not_before))
 
     @classmethod
     def exist(cls, feed_id: int) -> bool:
@@ -266,38 +643,61 @@ class EffectiveTasks:
         :param feed_id: the id of the feed in the task
         :return `int`: the interval of the task, or `None` if task do not exist
         """
-        return cls.__all_tasks[feed_id] if cls.exist(feed_id) else None
+        return cls.__all_tasks.get(feed_id)
 
-    def __get_tasks(self) -> set[int]:
-        if len(self.__all_feeds) == 0:
-            return set()  # nothing to run
-        if self.__run_count == 0:
-            self.__pending_feeds = list(self.__all_feeds)
-            shuffle(self.__pending_feeds)  # randomize
+    @classmethod
+    def get_weight(cls, feed_id: int) -> int:
+        """
+        Get the weight of a task.
 
-        pop_count = ceil(len(self.__pending_feeds) / (self.interval - self.__run_count))
-        # tasks_to_run = set(self.__pending_feeds.pop() for _ in range(pop_count) if self.__pending_feeds)
-        tasks_to_run = set(self.__pending_feeds[:pop_count])
-        del self.__pending_feeds[:pop_count]
-        self.__run_count = self.__run_count + 1 if self.__run_count + 1 < self.interval else 0
-        return tasks_to_run
+        :param feed_id: the id of the feed in the task
+        :return `int`: the weight of the task, at least 1
+        """
+        return cls.__weights.get(feed_id) or 1
 
     @classmethod
-    def get_tasks(cls) -> set[int]:
+    def get_weight_tier(cls, feed_id: int) -> int:
+        """
+        Get the weight tier of a task, i.e., log2 of its weight, capped at `MAX_WEIGHT_TIER`.
+
+        :param feed_id: the id of the feed in the task
+        :return `int`: the weight tier of the task, from 0 to `MAX_WEIGHT_TIER`
         """
-        Get tasks to be run.
+        return min(cls.get_weight(feed_id).bit_length() - 1, MAX_WEIGHT_TIER)
 
-        :return: a `set` contains the ids of feeds in tasks to be run
+    @classmethod
+    def get_due_time(cls, feed_id: int) -> Optional[int]:
         """
-        tasks_to_run = set()
-        for effective_tasks in cls.__task_buckets.values():
-            tasks = effective_tasks.__get_tasks()
-            if tasks:
-                tasks_to_run.update(tasks)
+        Get the due time of a task.
 
+        :param feed_id: the id of the feed in the task
+        :return `int`: a UNIX timestamp, or `None` if task do not exist
+        """
+        return cls.__wheel.due_time(feed_id)
+
+    @classmethod
+    def get_tasks(cls, now: Optional[int] = None) -> list[int]:
+        """
+        Get tasks that are due, and schedule their next run.
+
+        :param now: a UNIX timestamp, defaults to the current time
+        :return: a `list` contains the ids of feeds in tasks to be run
+        """
+        now = cls.now() if now is None else now
+        tasks_to_run = cls.__wheel.advance(now)
+        if not tasks_to_run:
+            return tasks_to_run
+        # Scheduling a task earlier than the minimal interval is meaningless since it will be deferred by the monitor.
+        minimal_interval = EffectiveOptions.minimal_interval
+        all_tasks = cls.__all_tasks
+        for feed_id in tasks_to_run:
+            cls.__insert(feed_id, now + max(all_tasks[feed_id], minimal_interval) * 60)
         return tasks_to_run
 
 
+persistence.register('scheduler', EffectiveTasks.snapshot, EffectiveTasks.restore)
+
+
 async def init():
     await EffectiveOptions.cache()
     await EffectiveTasks.init()
@@ -0,0 +1,246 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Optional
+from typing_extensions import Final
+from collections.abc import Iterable
+
+from array import array
+from datetime import datetime, timezone
+from math import isnan, nan
+
+from . import models
+from .. import log
+
+logger = log.getLogger('RSStT.db')
+
+
+def _to_timestamp(dt: Optional[datetime]) -> float:
+    return nan if dt is None else dt.timestamp()
+
+
+def _to_datetime(timestamp: float) -> Optional[datetime]:
+    return None if isnan(timestamp) else datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class FeedStateTable:
+    """
+    FeedStateTable class.
+
+    A write-through, array-backed in-memory table of active feeds, holding every column needed by the monitor so that
+    it does not need to load feeds from the DB on every poll.
+    Loaded once on init, and kept in sync by the write paths: `put()` after saving a feed, `delete()` after deleting a
+    feed. `FeedWriteBehind` writes through it.
+
+    Feeds whose legacy entry hashes have not been converted yet are not served, so that they are loaded from the DB.
+    """
+    NULL_INTERVAL: Final[int] = -1
+
+    __slots: dict[int, int] = {}  # key: id, value: index in the columns below
+    __free_slots: list[int] = []
+    __legacy: set[int] = set()  # ids of feeds still having legacy entry hashes
+    __links: list[Optional[str]] = []
+    __titles: list[Optional[str]] = []
+    __etags: list[Optional[str]] = []
+    __packed_entry_hashes: list[Optional[bytes]] = []
+    __intervals: array[int] = array('h')
+    __error_counts: array[int] = array('h')
+    # UNIX timestamps, NaN if null
+    __last_modified: array[float] = array('d')
+    __next_check_times: array[float] = array('d')
+    __created_at: array[float] = array('d')
+    __updated_at: array[float] = array('d')
+
+    @classmethod
+    async def init(cls):
+        """
+        Load all active feeds from the DB.
+        """
+        cls.__slots.clear()
+        cls.__free_slots.clear()
+        cls.__legacy.clear()
+        for column in (cls.__links, cls.__titles, cls.__etags, cls.__packed_entry_hashes):
+            column.clear()
+        for column in (cls.__intervals, cls.__error_counts,
+                       cls.__last_modified, cls.__next_check_times, cls.__created_at, cls.__updated_at):
+            del column[:]
+        rows = await models.Feed.filter(state=1).values_list(
+            'id', 'link', 'title', 'etag', 'packed_entry_hashes', 'interval', 'error_count',
+            'last_modified', 'next_check_time', 'created_at', 'updated_at',
+        )
+        for row in rows:
+            cls.__put(*row)
+        # Loading legacy hashes defeats the purpose, only find out which feeds have them.
+        cls.__legacy.update(
+            await models.Feed.filter(state=1, entry_hashes__not_isnull=True).values_list('id', flat=True)
+        )
+        logger.debug(f'Loaded states of {len(cls.__slots)} feeds')
+
+    @classmethod
+    async def sync(cls):
+        """
+        Synchronize with the DB, dropping feeds changed or deactivated by another process.
+        Dropped feeds are loaded from the DB next time they are monitored.
+        """
+        rows = await models.Feed.filter(state=1).values_list('id', 'updated_at')
+        updated_at_map = dict(rows)
+        updated_at_column = cls.__updated_at
+        for feed_id, slot in tuple(cls.__slots.items()):
+            updated_at = updated_at_map.get(feed_id)
+            if updated_at is None or updated_at.timestamp() != updated_at_column[slot]:
+                cls.delete(feed_id)
+
+    @classmethod
+    def __put(
+            cls,
+            feed_id: int,
+            link: str,
+            title: str,
+            etag: Optional[str],
+            packed_entry_hashes: Optional[bytes],
+            interval: Optional[int],
+            error_count: int,
+            last_modified: Optional[datetime],
+            next_check_time: Optional[datetime],
+            created_at: Optional[datetime],
+            updated_at: Optional[datetime],
+    ):
+        slot = cls.__slots.get(feed_id)
+        if slot is None:
+            if cls.__free_slots:
+                slot = cls.__free_slots.pop()
+            else:
+                slot = len(cls.__links)
+                for column in (cls.__links, cls.__titles, cls.__etags, cls.__packed_entry_hashes):
+                    column.append(None)
+                for column in (cls.__intervals, cls.__error_counts):
+                    column.append(0)
+                for column in (cls.__last_modified, cls.__next_check_times, cls.__created_at, cls.__updated_at):
+                    column.append(nan)
+            cls.__slots[feed_id] = slot
+        cls.__links[slot] = link
+        cls.__titles[slot] = title
+        cls.__etags[slot] = etag
+        cls.__packed_entry_hashes[slot] = packed_entry_hashes
+        cls.__intervals[slot] = cls.NULL_INTERVAL if interval is None else interval
+        cls.__error_counts[slot] = error_count
+        cls.__last_modified[slot] = _to_timestamp(last_modified)
+        cls.__next_check_times[slot] = _to_timestamp(next_check_time)
+        cls.__created_at[slot] = _to_timestamp(created_at)
+        cls.__updated_at[slot] = _to_timestamp(updated_at)
+
+    @classmethod
+    def put(cls, feed: models.Feed):
+        """
+        Insert or update the state of a feed that has just been saved. Deactivated feeds are deleted.
+
+        :param feed: the feed
+        """
+        if feed.state != 1:
+            cls.delete(feed.id)
+            return
+        cls.__put(
+            feed.id, feed.link, feed.title, feed.etag, feed.packed_entry_hashes, feed.interval, feed.error_count,
+            feed.last_modified, feed.next_check_time, feed.created_at, feed.updated_at,
+        )
+        if feed.entry_hashes is None:
+            cls.__legacy.discard(feed.id)
+        else:
+            cls.__legacy.add(feed.id)
+
+    @classmethod
+    def update(cls, feed: models.Feed):
+        """
+        Update the state of a feed if it is in the table. Used by write-behind updates, which should not bring back
+        a feed deleted or deactivated in the meantime.
+
+        :param feed: the feed
+        """
+        if feed.id in cls.__slots:
+            cls.put(feed)
+
+    @classmethod
+    def delete(cls, feed_id: int):
+        """
+        Delete the state of a feed.
+
+        :param feed_id: the id of the feed
+        """
+        cls.__legacy.discard(feed_id)
+        slot = cls.__slots.pop(feed_id, None)
+        if slot is None:
+            return
+        # Release references to heavy objects.
+        for column in (cls.__links, cls.__titles, cls.__etags, cls.__packed_entry_hashes):
+            column[slot] = None
+        cls.__free_slots.append(slot)
+
+    @classmethod
+    def get(cls, feed_id: int) -> Optional[models.Feed]:
+        """
+        Get a feed from the table.
+
+        :param feed_id: the id of the feed
+        :return: a `models.Feed` object behaving as if loaded from the DB, None if not served by the table
+        """
+        slot = cls.__slots.get(feed_id)
+        if slot is None or feed_id in cls.__legacy:
+            return None
+        interval = cls.__intervals[slot]
+        feed = models.Feed(
+            id=feed_id,
+            state=1,
+            link=cls.__links[slot],
+            title=cls.__titles[slot],
+            interval=None if interval == cls.NULL_INTERVAL else interval,
+            entry_hashes=None,
+            packed_entry_hashes=cls.__packed_entry_hashes[slot],
+            etag=cls.__etags[slot],
+            last_modified=_to_datetime(cls.__last_modified[slot]),
+            error_count=cls.__error_counts[slot],
+            next_check_time=_to_datetime(cls.__next_check_times[slot]),
+            created_at=_to_datetime(cls.__created_at[slot]),
+            updated_at=_to_datetime(cls.__updated_at[slot]),
+        )
+        feed._saved_in_db = True  # so that save() updates the row instead of inserting a new one
+        return feed
+
+    @classmethod
+    def get_many(cls, feed_ids: Iterable[int]) -> tuple[list[models.Feed], set[int]]:
+        """
+        Get feeds from the table.
+
+        :param feed_ids: the ids of the feeds
+        :return: feeds served by the table, and ids of feeds not served by the table
+        """
+        feeds: list[models.Feed] = []
+        missed: set[int] = set()
+        for feed_id in feed_ids:
+            feed = cls.get(feed_id)
+            if feed is None:
+                missed.add(feed_id)
+            else:
+                feeds.append(feed)
+        return feeds, missed
+
+    @classmethod
+    def ids(cls) -> tuple[int, ...]:
+        return tuple(cls.__slots)
+
+    @classmethod
+    def size(cls) -> int:
+        return len(cls.__slots)
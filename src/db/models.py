@@ -66,6 +66,7 @@ class User(Model, Base):
     display_entry_tags = fields.SmallIntField(default=-1)
     style = fields.SmallIntField(default=0)
     display_media = fields.SmallIntField(default=0)
+    digest = fields.SmallIntField(default=-1)
 
     class Meta:
         table = 'user'
@@ -98,7 +99,15 @@ class Feed(Model, Base):
                     'Should be the minimal interval of all subs to the feed,'
                     'default interval will be applied if null',
     )
-    entry_hashes = fields.JSONField(null=True, description='Hashes (CRC32) of entries')
+    entry_hashes = fields.JSONField(
+        null=True,
+        description='Hashes (CRC32) of entries. '
+                    'Legacy, superseded by packed_entry_hashes and cleared once the feed is monitored',
+    )
+    packed_entry_hashes = fields.BinaryField(
+        null=True,
+        description='Hashes (64-bit BLAKE2b) of entries, packed as little-endian 8-byte integers',
+    )
     etag = fields.CharField(
         max_length=128,
         null=True,
@@ -208,6 +217,9 @@ class Sub(Model, Base):
         description='Display media or not?'
                     '-1=disable, 0=enable',
     )
+    # new field, use the de facto default value (-100) and with description unset to avoid future migration
+    # Merge new posts into a digest when too many posts are waiting to be sent to the chat? -1=disable, 1=enable
+    digest = fields.SmallIntField(default=-100)
 
     class Meta:
         table = 'sub'
@@ -226,3 +238,36 @@ class Option(Model, Base):
 
     class Meta:
         table = 'option'
+
+
+class Lease(Model):
+    """
+    Lease model.
+
+    Stores leases of monitor workers (if `MONITOR_ROLE=worker`), among which feeds are sharded.
+    """
+    worker_id = fields.CharField(max_length=255, pk=True)
+    expires_at = fields.DatetimeField()
+
+    class Meta:
+        table = 'lease'
+
+
+class Outbox(Model, Base):
+    """
+    Outbox model.
+
+    Stores updates detected by monitor workers (if `MONITOR_ROLE=worker`), waiting to be sent by the sender.
+    """
+    id = fields.IntField(pk=True)
+    feed: fields.ForeignKeyRelation['Feed'] = fields.ForeignKeyField(
+        'models.Feed',
+        related_name='outbox',
+        to_field='id',
+        on_delete=fields.CASCADE,
+    )
+    feed_id: int  # type hint stub
+    payload = fields.BinaryField()  # pickled (entries, reason)
+
+    class Meta:
+        table = 'outbox'
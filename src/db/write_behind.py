@@ -0,0 +1,233 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Optional, Any
+from typing_extensions import Final
+from collections.abc import Callable, Iterable
+
+import asyncio
+from collections import defaultdict
+from time import perf_counter
+
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
+from . import models
+from .feed_state import FeedStateTable
+from .. import env, log
+
+logger = log.getLogger('RSStT.db')
+
+FLUSH_INTERVAL: Final[float] = 1.0  # seconds
+FLUSH_SIZE: Final[int] = 500  # feeds
+
+
+class FeedWriteBehind:
+    """
+    FeedWriteBehind class.
+
+    A write-behind buffer that coalesces field updates of feeds and flushes them in bulk, within one transaction,
+    every FLUSH_INTERVAL seconds or once FLUSH_SIZE feeds are pending.
+    """
+    __pending: dict[int, tuple[models.Feed, set[str]]] = {}  # key: id, value: (the latest feed object, fields)
+    __flush_handle: Optional[asyncio.TimerHandle] = None
+    __flush_tasks: set[asyncio.Task] = set()
+    __flush_lock: Optional[asyncio.Lock] = None
+    __flush_callbacks: list[Callable[[int, float], Any]] = []
+
+    @classmethod
+    def __put(cls, feed: models.Feed, update_fields: Iterable[str]):
+        pending = cls.__pending.get(feed.id)
+        if pending is None:
+            cls.__pending[feed.id] = (feed, set(update_fields))
+            return
+        pending_feed, pending_fields = pending
+        if pending_feed is not feed:
+            # Values are read from the feed object when flushing, carry pending values not being updated over.
+            for field in pending_fields.difference(update_fields):
+                setattr(feed, field, getattr(pending_feed, field))
+        cls.__pending[feed.id] = (feed, pending_fields.union(update_fields))
+
+    @classmethod
+    def update(cls, feed: models.Feed, update_fields: Iterable[str]):
+        """
+        Buffer an update of a feed. Values are read from the feed object when flushing.
+        `updated_at` is always updated, so that other processes (see `FeedStateTable.sync()`) notice the change.
+
+        :param feed: the feed to be updated
+        :param update_fields: the fields to be updated
+        """
+        if not update_fields:
+            return
+        # auto_now only applies to save() and fields being updated, bulk_update() needs it to be set explicitly
+        feed.updated_at = timezone.now()
+        update_fields = {*update_fields, 'updated_at'}
+        FeedStateTable.update(feed)  # write through
+        cls.__put(feed, update_fields)
+        if len(cls.__pending) >= FLUSH_SIZE:
+            cls.__schedule_flush(0)
+        elif cls.__flush_handle is None:
+            cls.__schedule_flush(FLUSH_INTERVAL)
+
+    @classmethod
+    async def save(cls, feed: models.Feed, update_fields: Iterable[str]):
+        """
+        Write an update of a feed to the DB immediately, together with its pending updates (if any).
+        Used when the update must be persisted before doing something irreversible, e.g., sending new entries.
+
+        :param feed: the feed to be updated
+        :param update_fields: the fields to be updated
+        """
+        feed.updated_at = timezone.now()
+        update_fields = {*update_fields, 'updated_at'}
+        pending = cls.__pending.pop(feed.id, None)
+        if pending is not None:
+            update_fields.update(cls.__merge(feed, update_fields, *pending))
+        try:
+            await feed.save(update_fields=list(update_fields))
+        except Exception:
+            if pending is not None:  # keep the pending updates, the caller is responsible for the rest
+                cls.__put(*pending)
+            raise
+        FeedStateTable.update(feed)
+
+    @staticmethod
+    def __merge(
+            feed: models.Feed,
+            update_fields: set[str],
+            pending_feed: models.Feed,
+            pending_fields: set[str],
+    ) -> set[str]:
+        if pending_feed is not feed:
+            for field in pending_fields.difference(update_fields):
+                setattr(feed, field, getattr(pending_feed, field))
+        return pending_fields
+
+    @classmethod
+    def merge(cls, feed: models.Feed, update_fields: Iterable[str]) -> set[str]:
+        """
+        Take over pending updates of a feed about to be saved directly, e.g., by a command.
+        Pending values of fields other than `update_fields` are applied to the feed object, so that saving it neither
+        overwrites them with stale values nor drops them.
+
+        :param feed: the feed to be saved
+        :param update_fields: the fields being updated by the caller, which take precedence over pending updates
+        :return: `update_fields` plus the fields of pending updates, i.e., the fields to be saved
+        """
+        update_fields = set(update_fields)
+        pending = cls.__pending.pop(feed.id, None)
+        if pending is not None:
+            update_fields.update(cls.__merge(feed, update_fields, *pending))
+        return update_fields
+
+    @classmethod
+    def discard(cls, feed_id: int):
+        """
+        Drop pending updates of a feed. Call it once a feed is deleted, so that the pending updates do not bring it back
+        in the DB. Feeds saved directly should take over their pending updates instead, see `merge()` and `save()`.
+
+        :param feed_id: the id of the feed
+        """
+        cls.__pending.pop(feed_id, None)
+
+    @classmethod
+    def overlay(cls, feeds: Iterable[models.Feed]):
+        """
+        Apply pending updates to feeds freshly loaded from the DB.
+
+        :param feeds: feeds loaded from the DB
+        """
+        if not cls.__pending:
+            return
+        for feed in feeds:
+            pending = cls.__pending.get(feed.id)
+            if pending is None:
+                continue
+            pending_feed, pending_fields = pending
+            if pending_feed is feed:
+                continue
+            for field in pending_fields:
+                setattr(feed, field, getattr(pending_feed, field))
+
+    @classmethod
+    def add_flush_callback(cls, callback: Callable[[int, float], Any]):
+        """
+        Add a callback to be called after each successful flush.
+
+        :param callback: a callable accepting the number of flushed feeds and the duration of the flush in seconds
+        """
+        cls.__flush_callbacks.append(callback)
+
+    @classmethod
+    def __schedule_flush(cls, delay: float):
+        if cls.__flush_handle is not None:
+            cls.__flush_handle.cancel()
+        cls.__flush_handle = env.loop.call_later(delay, cls.__flush_bg)
+
+    @classmethod
+    def __flush_bg(cls):
+        cls.__flush_handle = None
+        task = env.loop.create_task(cls.flush())
+        cls.__flush_tasks.add(task)
+        task.add_done_callback(cls.__flush_tasks.discard)
+
+    @classmethod
+    async def flush(cls):
+        """
+        Flush all pending updates.
+        """
+        if cls.__flush_lock is None:
+            cls.__flush_lock = asyncio.Lock()
+        async with cls.__flush_lock:
+            if cls.__flush_handle is not None:
+                cls.__flush_handle.cancel()
+                cls.__flush_handle = None
+            if not cls.__pending:
+                return
+            pending, cls.__pending = cls.__pending, {}
+            # bulk_update() updates the same fields for all objects, so group them by fields.
+            grouped: defaultdict[frozenset[str], list[models.Feed]] = defaultdict(list)
+            for feed, fields in pending.values():
+                grouped[frozenset(fields)].append(feed)
+            start = perf_counter()
+            try:
+                async with in_transaction() as conn:
+                    for fields, feeds in grouped.items():
+                        await models.Feed.bulk_update(feeds, fields=list(fields), using_db=conn)
+            except Exception as e:
+                logger.error(f'Failed to flush updates of {len(pending)} feeds, will retry later', exc_info=e)
+                # Put them back, keeping updates buffered during the flush as the newest.
+                pending, cls.__pending = cls.__pending, pending
+                for feed, fields in pending.values():
+                    cls.__put(feed, fields)
+                if cls.__flush_handle is None:
+                    cls.__schedule_flush(FLUSH_INTERVAL)
+                return
+            duration = perf_counter() - start
+            logger.debug(f'Flushed updates of {len(pending)} feeds in {duration:.3f}s')
+            for callback in cls.__flush_callbacks:
+                callback(len(pending), duration)
+
+    @classmethod
+    async def close(cls):
+        """
+        Flush all pending updates and stop flushing periodically.
+        """
+        await cls.flush()
+        if cls.__flush_handle is not None:
+            cls.__flush_handle.cancel()
+            cls.__flush_handle = None
@@ -47,6 +47,7 @@ from .i18n import i18n, ALL_LANGUAGES, get_commands_list
 from .parsing import tgraph
 from .helpers.bg import bg
 from .helpers.queue import queued
+from .helpers.persistence import persistence
 
 # log
 logger = log.getLogger('RSStT')
@@ -75,6 +76,14 @@ def init():
         loop.create_task(tgraph.init()),
         loop.create_task(bg.init(loop=loop)),
         loop.create_task(queued.init(loop=loop)),
+        loop.create_task(persistence.init(
+            loop=loop,
+            folder=(
+                os.path.join(env.config_folder_path, 'state', f'worker-{env.MONITOR_WORKER_ID}')
+                if env.MONITOR_ROLE == 'worker'
+                else os.path.join(env.config_folder_path, 'state')
+            ),
+        )),
     ))
 
     if env.PORT:
@@ -89,6 +98,10 @@ def init():
         loop.run_until_complete(asyncio.gather(*pre_tasks))
         exit(0)
 
+    if env.MONITOR_ROLE == 'worker':
+        # Monitor workers never log in, only the sender holds the bot session.
+        return
+
     sleep_for = 0
     while api_keys:
         sleep_for += 10
@@ -279,14 +292,23 @@ async def lazy():
 
 async def post():
     logger.info('Exiting gracefully...')
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    # Stop the monitor (releasing the lease, if any) and background tasks first, so that nothing writes to the DB after
+    # it is closed.
+    res = await asyncio.gather(
+        loop.create_task(monitor.close()),
+        loop.create_task(bg.close()),
+        loop.create_task(queued.close()),
+        return_exceptions=True,
+    )
+    for e in (e for e in res if isinstance(e, BaseException)):
+        logger.error('Error when exiting gracefully: ', exc_info=e)
     tasks = [
         asyncio.shield(loop.create_task(db.close())),
         loop.create_task(tgraph.close()),
-        loop.create_task(bg.close()),
-        loop.create_task(queued.close()),
+        loop.create_task(persistence.close()),
     ]
-    if scheduler.running:
-        scheduler.shutdown(wait=False)
     if bot and bot.is_connected():
         tasks.append(bot.disconnect())
     res = await asyncio.gather(*tasks, return_exceptions=True)
@@ -308,6 +330,31 @@ def sig_handler(signum, *_, **__):
     exit(128 + signum)
 
 
+def start_monitor():
+    scheduler.add_job(func=monitor.run_periodic_task,
+                      trigger=CronTrigger(minute='*', second=env.CRON_SECOND, timezone='UTC'),
+                      max_instances=10,
+                      misfire_grace_time=10)
+    scheduler.start()
+    monitor.start()
+
+
+def run_as_monitor_worker():
+    loop.run_until_complete(asyncio.gather(*pre_tasks))
+
+    logger.info(
+        f"RSS-to-Telegram-Bot ({', '.join(env.VERSION.split())}) started as a monitor worker!\n"
+        f"MONITOR_WORKER_ID: {env.MONITOR_WORKER_ID}\n"
+        f"R_PROXY (for RSS): {env.REQUESTS_PROXIES['all'] if env.REQUESTS_PROXIES else 'not set'}\n"
+        f"DATABASE: {env.DATABASE_URL.split('://', 1)[0]}\n"
+        f"UVLOOP: {'Enable' if env.uvloop_enabled else 'Disable'}"
+    )
+
+    start_monitor()
+
+    loop.run_forever()  # until being signaled
+
+
 def main():
     # bot.disconnected usually means the bot is logged out due to a network error or Telegram DC degradation,
     # so we should exit with a non-zero code to indicate an error.
@@ -319,6 +366,9 @@ def main():
 
         init()
 
+        if env.MONITOR_ROLE == 'worker':
+            run_as_monitor_worker()  # never returns
+
         loop.run_until_complete(pre())
 
         logger.info(
@@ -332,6 +382,7 @@ def main():
             f"TELEGRAPH: {f'Enable ({tgraph.apis.count} accounts)' if tgraph.apis else 'Disable'}\n"
             f"UVLOOP: {'Enable' if env.uvloop_enabled else 'Disable'}\n"
             f"MULTIUSER: {'Enable' if env.MULTIUSER else 'Disable'}\n"
+            f"MONITOR_ROLE: {env.MONITOR_ROLE}\n"
             f"CPU: {aio_helper.PROCESS_COUNT} (usable) / "
             f"{aio_helper.AVAIL_CPU_COUNT} (available) / "
             f"{aio_helper.CPU_COUNT} (total)"
@@ -342,11 +393,7 @@ def main():
 
         loop.create_task(lazy())
 
-        scheduler.add_job(func=monitor.run_periodic_task,
-                          trigger=CronTrigger(minute='*', second=env.CRON_SECOND, timezone='UTC'),
-                          max_instances=10,
-                          misfire_grace_time=10)
-        scheduler.start()
+        start_monitor()
 
         loop.run_until_complete(bot.disconnected)
     except (KeyboardInterrupt, SystemExit) as e:
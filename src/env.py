@@ -256,6 +256,20 @@ MULTIUSER: Final = __bool_parser(os.environ.get('MULTIUSER'), default_value=True
 
 CRON_SECOND: Final = int(os.environ.get('CRON_SECOND') or 0) % 60
 
+MONITOR_CONCURRENCY: Final = max(int(os.environ.get('MONITOR_CONCURRENCY') or 0), 0)
+MONITOR_RATE_PER_HOST: Final = max(int(os.environ.get('MONITOR_RATE_PER_HOST') or 0), 0)
+FETCH_WORKERS: Final = max(int(os.environ.get('FETCH_WORKERS') or 0), 0)
+
+MONITOR_ROLE: Final = (os.environ.get('MONITOR_ROLE') or 'all').lower()
+if MONITOR_ROLE not in {'all', 'sender', 'worker'}:
+    logger.critical(f'INVALID "MONITOR_ROLE" (EXPECTED: all, sender, worker): {MONITOR_ROLE}')
+    exit(1)
+# Must be stable across restarts, since the lease and the persisted state of the worker are keyed by it.
+MONITOR_WORKER_ID: Final = os.environ.get('MONITOR_WORKER_ID') or None
+if MONITOR_ROLE == 'worker' and not MONITOR_WORKER_ID:
+    logger.critical('"MONITOR_WORKER_ID" NOT SET! A UNIQUE ID STABLE ACROSS RESTARTS IS REQUIRED FOR EACH WORKER!')
+    exit(1)
+
 # ----- network config -----
 DEFAULT_PROXY: Final = os.environ.get('SOCKS_PROXY') or os.environ.get('socks_proxy') \
                        or os.environ.get('HTTP_PROXY') or os.environ.get('http_proxy') \
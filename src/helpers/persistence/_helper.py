@@ -0,0 +1,132 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Callable, Optional, Any, Final, NamedTuple
+
+import asyncio
+import os
+import pickle
+
+from ._common import logger
+
+
+class _Registration(NamedTuple):
+    dumper: Callable[[], Any]
+    loader: Callable[[Any], None]
+    version: int
+
+
+class PersistenceHelper:
+    """
+    Persist in-memory states across restarts.
+
+    Each state is registered with a dumper and a loader.
+    Registered states are loaded on init (or on registration, if registered after init), and dumped periodically as
+    well as on close.
+
+    The dumper is called in the event loop and MUST return a self-contained snapshot, which is pickled in a worker
+    thread.
+    The loader is called with what the dumper returned last time, unless the version has been changed in between.
+    """
+
+    def __init__(self):
+        self._registrations: Final[dict[str, _Registration]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._folder: Optional[str] = None
+        self._period: float = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._dump_lock: Optional[asyncio.Lock] = None
+
+    def register(self, name: str, dumper: Callable[[], Any], loader: Callable[[Any], None], version: int = 1):
+        if name in self._registrations:
+            raise KeyError(f'Persistent state {name} has already been registered')
+        self._registrations[name] = _Registration(dumper, loader, version)
+        if self._folder is not None:
+            self._load(name)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._folder, f'{name}.pickle')
+
+    def _load(self, name: str):
+        registration = self._registrations[name]
+        path = self._path(name)
+        try:
+            with open(path, 'rb') as f:
+                version, data = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f'Failed to load persistent state {name}, discarded:', exc_info=e)
+            return
+        if version != registration.version:
+            logger.info(f'Persistent state {name} discarded due to version mismatch: '
+                        f'{version} (persisted) != {registration.version} (expected)')
+            return
+        try:
+            registration.loader(data)
+        except Exception as e:
+            logger.warning(f'Failed to restore persistent state {name}, discarded:', exc_info=e)
+            return
+        logger.debug(f'Restored persistent state {name}')
+
+    @staticmethod
+    def _write(path: str, version: int, data: Any):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((version, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)  # atomic
+
+    async def dump(self, *names: str):
+        """
+        Dump the specified states, or all states if none is specified.
+        """
+        if self._folder is None:
+            return
+        async with self._dump_lock:
+            for name in names or tuple(self._registrations):
+                registration = self._registrations[name]
+                try:
+                    data = registration.dumper()
+                    await self._loop.run_in_executor(None, self._write, self._path(name), registration.version, data)
+                except Exception as e:
+                    logger.error(f'Failed to dump persistent state {name}:', exc_info=e)
+                finally:
+                    data = None  # release the snapshot ASAP
+
+    def _schedule(self):
+        self._timer = self._loop.call_later(self._period, self._on_timer)
+
+    def _on_timer(self):
+        self._loop.create_task(self.dump())
+        self._schedule()
+
+    async def init(self, loop: asyncio.AbstractEventLoop, folder: str, period: float = 5 * 60):
+        self._loop = loop
+        self._folder = folder
+        self._period = period
+        self._dump_lock = asyncio.Lock()
+        await loop.run_in_executor(None, os.makedirs, folder, 0o777, True)
+        for name in self._registrations:
+            self._load(name)
+        if period > 0:
+            self._schedule()
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.dump()
@@ -0,0 +1,80 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Optional, Generic, TypeVar, Final, Hashable
+
+from collections import OrderedDict
+from time import time
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class PersistentTTLCache(Generic[K, V]):
+    """
+    A LRU cache with per-item TTL based on the wall clock, so that the expiration survives restarts.
+
+    Use ``dump`` and ``load`` as the dumper and loader of ``PersistenceHelper.register``.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize: Final[int] = maxsize
+        self.ttl: Final[float] = ttl
+        self._data: Final[OrderedDict[K, tuple[float, V]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires <= time():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None):
+        self._set(key, value, time() + (self.ttl if ttl is None else ttl))
+
+    def _set(self, key: K, value: V, expires: float):
+        data = self._data
+        data[key] = expires, value
+        data.move_to_end(key)
+        while len(data) > self.maxsize:
+            data.popitem(last=False)
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def expire(self):
+        now = time()
+        for key in [key for key, (expires, _) in self._data.items() if expires <= now]:
+            del self._data[key]
+
+    def dump(self) -> list[tuple[K, float, V]]:
+        now = time()
+        return [(key, expires, value) for key, (expires, value) in self._data.items() if expires > now]
+
+    def load(self, items: list[tuple[K, float, V]]):
+        now = time()
+        for key, expires, value in items:
+            if expires > now and key not in self._data:
+                self._set(key, value, expires)
@@ -0,0 +1,102 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+from typing import Generic, TypeVar, Final, Hashable
+
+import asyncio
+from time import monotonic
+
+K = TypeVar('K', bound=Hashable)
+
+
+class TokenBucket:
+    """
+    A token bucket holding up to `capacity` tokens, refilled at `rate` tokens per second.
+
+    Acquisitions are served in FIFO order.
+    Acquiring more tokens than the capacity is allowed: it waits until the bucket is full and then goes into debt, which
+    later acquisitions pay back by waiting.
+    """
+    __slots__ = ('rate', 'capacity', '_tokens', '_updated_at', '_lock')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate: Final[float] = rate
+        self.capacity: Final[float] = capacity
+        self._tokens: float = capacity
+        self._updated_at: float = monotonic()
+        self._lock: Final[asyncio.Lock] = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self._tokens + (now - self._updated_at) * self.rate, self.capacity)
+        self._updated_at = now
+
+    def is_idle(self, now: float) -> bool:
+        """
+        :return `bool`: whether the bucket is full and nobody is acquiring from it, i.e., as good as a new one
+        """
+        if self._lock.locked():
+            return False
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """
+        :param tokens: the number of tokens to acquire
+        :return `float`: how long it has waited, in seconds
+        """
+        start = monotonic()
+        async with self._lock:
+            self._refill(monotonic())
+            if (shortage := min(tokens, self.capacity) - self._tokens) > 0:
+                await asyncio.sleep(shortage / self.rate)
+                self._refill(monotonic())
+            self._tokens -= tokens
+        return monotonic() - start
+
+
+class TokenBucketMap(Generic[K]):
+    """
+    A mapping creating token buckets on demand.
+    Idle buckets are dropped by `prune()`, which is lossless since an idle bucket is as good as a new one.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate: Final[float] = rate
+        self._capacity: Final[float] = capacity
+        self._buckets: Final[dict[K, TokenBucket]] = {}
+
+    def __getitem__(self, key: K) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self._rate, self._capacity)
+        return bucket
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def prune(self) -> int:
+        """
+        Drop idle buckets.
+
+        :return `int`: the number of buckets dropped
+        """
+        now = monotonic()
+        idle_keys = tuple(key for key, bucket in self._buckets.items() if bucket.is_idle(now))
+        for key in idle_keys:
+            del self._buckets[key]
+        return len(idle_keys)
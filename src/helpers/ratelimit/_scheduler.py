@@ -0,0 +1,144 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+from typing import Callable, Generic, TypeVar, Final, Hashable, Optional
+from collections.abc import AsyncIterator
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from time import monotonic
+
+from ._ratelimit import TokenBucket
+
+K = TypeVar('K', bound=Hashable)
+
+
+class _QueueEntry:
+    __slots__ = ('enqueued_at', 'waiter')
+
+    def __init__(self):
+        self.enqueued_at: Final[float] = monotonic()
+        self.waiter: Optional[asyncio.Future] = None
+
+
+class FairScheduler(Generic[K]):
+    """
+    Serve keys (e.g., chats) fairly within rate limits.
+
+    Each key has a FIFO queue (see `queue()`), whose holders are served one by one, like a lock.
+    Tokens are acquired from the bucket of the key first, and then from the shared bucket, where keys take turns in a
+    round-robin manner (see `acquire()`).
+    Thus, a busy key can neither exceed its own rate limit nor delay other keys by more than one turn each.
+    """
+
+    def __init__(self, bucket: TokenBucket, key_bucket: Callable[[K], TokenBucket]):
+        self._bucket: Final[TokenBucket] = bucket
+        self._key_bucket: Final[Callable[[K], TokenBucket]] = key_bucket
+        self._queues: Final[dict[K, deque[_QueueEntry]]] = {}
+        # Keys waiting for a turn in order, and their waiters with tokens to acquire in order.
+        self._ring: Final[deque[K]] = deque()
+        self._turn_waiters: Final[dict[K, deque[tuple[asyncio.Future, float]]]] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def queue(self, key: K) -> AsyncIterator[None]:
+        """
+        Wait in the FIFO queue of a key, and hold the head of it within the context.
+        """
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        entry = _QueueEntry()
+        queue.append(entry)
+        try:
+            if queue[0] is not entry:
+                entry.waiter = asyncio.get_running_loop().create_future()
+                await entry.waiter
+            yield
+        finally:
+            was_head = queue[0] is entry
+            queue.remove(entry)
+            if not queue:
+                del self._queues[key]
+            elif was_head and (waiter := queue[0].waiter) is not None and not waiter.done():
+                waiter.set_result(None)
+
+    async def acquire(self, key: K, tokens: float = 1) -> float:
+        """
+        :param key: the key
+        :param tokens: the number of tokens to acquire
+        :return `float`: how long it has waited, in seconds
+        """
+        start = monotonic()
+        await self._key_bucket(key).acquire(tokens)
+        waiter = asyncio.get_running_loop().create_future()
+        turn_waiters = self._turn_waiters.get(key)
+        if turn_waiters is None:
+            turn_waiters = self._turn_waiters[key] = deque()
+            self._ring.append(key)
+        turn_waiters.append((waiter, tokens))
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        await waiter
+        return monotonic() - start
+
+    async def _dispatch(self):
+        ring = self._ring
+        turn_waiters_map = self._turn_waiters
+        try:
+            while ring:
+                key = ring.popleft()
+                turn_waiters = turn_waiters_map[key]
+                waiter, tokens = turn_waiters.popleft()
+                if turn_waiters:
+                    ring.append(key)  # next turn
+                else:
+                    del turn_waiters_map[key]
+                if waiter.done():  # cancelled
+                    continue
+                await self._bucket.acquire(tokens)
+                if not waiter.done():
+                    waiter.set_result(None)
+        finally:
+            self._dispatcher = None
+
+    def queue_depth(self, key: K) -> int:
+        queue = self._queues.get(key)
+        return len(queue) if queue is not None else 0
+
+    def oldest_age(self, key: K) -> float:
+        """
+        :return `float`: how long the oldest holder or waiter has been in the queue of the key, in seconds
+        """
+        queue = self._queues.get(key)
+        return monotonic() - queue[0].enqueued_at if queue else 0.0
+
+    def stats(self) -> tuple[int, int, float]:
+        """
+        :return: the number of keys with a non-empty queue, the max queue depth, the max age of queue heads (in seconds)
+        """
+        queues = self._queues
+        if not queues:
+            return 0, 0, 0.0
+        now = monotonic()
+        return (
+            len(queues),
+            max(len(queue) for queue in queues.values()),
+            now - min(queue[0].enqueued_at for queue in queues.values()),
+        )
@@ -0,0 +1,69 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Callable, Awaitable, Generic, TypeVar, Final, Hashable
+from typing_extensions import ParamSpec
+
+import asyncio
+from functools import update_wrapper
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+
+class SingleFlight(Generic[P, R]):
+    """
+    Coalesce concurrent calls with the same arguments into a single in-flight call.
+
+    Callers arriving while a call is in flight await the same result instead of starting a new one.
+    The underlying call runs as a task shielded from its callers, so that one caller being canceled does not affect
+    the others.
+    Results are not kept after the call finishes. Combine it with a cache (e.g., ``asyncstdlib.lru_cache``) if needed.
+    """
+
+    def __init__(self, func: Callable[P, Awaitable[R]]):
+        self._func: Final[Callable[P, Awaitable[R]]] = func
+        self._in_flight: Final[dict[Hashable, asyncio.Task[R]]] = {}
+        update_wrapper(self, func)
+
+    @staticmethod
+    def _make_key(args: tuple, kwargs: dict) -> Hashable:
+        return (args, tuple(sorted(kwargs.items()))) if kwargs else args
+
+    def _on_done(self, key: Hashable, task: asyncio.Task[R]):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case all callers have been canceled.
+            task.exception()
+
+    @property
+    def in_flight_count(self) -> int:
+        return len(self._in_flight)
+
+    async def __call__(self, *args: P.args, **kwargs: P.kwargs) -> R:
+        key = self._make_key(args, kwargs)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._func(*args, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+        return await asyncio.shield(task)
+
+
+def single_flight(func: Callable[P, Awaitable[R]]) -> SingleFlight[P, R]:
+    return SingleFlight(func)
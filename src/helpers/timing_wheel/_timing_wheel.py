@@ -0,0 +1,109 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Optional, Generic, TypeVar, Final, Hashable
+
+K = TypeVar('K', bound=Hashable)
+
+
+class TimingWheel(Generic[K]):
+    """
+    A two-level hierarchical timing wheel with a tick of 1 second.
+
+    Level 0 has one slot per tick of the current round (``slot_count`` ticks).
+    Level 1 buckets keys due in later rounds by their round number, and each bucket is cascaded into level 0 when its
+    round begins.
+    Insertion and cancellation are O(1). Advancing is O(elapsed ticks + fired keys).
+    """
+
+    def __init__(self, start: int, slot_count: int = 3600):
+        self._slot_count: Final[int] = slot_count
+        self._slots: Final[list[set[K]]] = [set() for _ in range(slot_count)]
+        self._rounds: Final[dict[int, set[K]]] = {}
+        self._due: Final[dict[K, int]] = {}
+        self._cursor: int = start  # the next tick to be processed
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._due
+
+    @property
+    def cursor(self) -> int:
+        return self._cursor
+
+    def due_time(self, key: K) -> Optional[int]:
+        return self._due.get(key)
+
+    def items(self):
+        return self._due.items()
+
+    def insert(self, key: K, due: int):
+        """
+        Insert a key, or reschedule it if it already exists.
+        A key due in the past is fired on the next tick.
+        """
+        self.cancel(key)
+        due = max(int(due), self._cursor)
+        self._due[key] = due
+        slot_count = self._slot_count
+        round_number = due // slot_count
+        if round_number == self._cursor // slot_count:
+            self._slots[due % slot_count].add(key)
+        elif (bucket := self._rounds.get(round_number)) is not None:
+            bucket.add(key)
+        else:
+            self._rounds[round_number] = {key}
+
+    def cancel(self, key: K) -> bool:
+        due = self._due.pop(key, None)
+        if due is None:
+            return False
+        slot_count = self._slot_count
+        round_number = due // slot_count
+        if round_number == self._cursor // slot_count:
+            self._slots[due % slot_count].discard(key)
+        else:
+            bucket = self._rounds[round_number]
+            bucket.discard(key)
+            if not bucket:
+                del self._rounds[round_number]
+        return True
+
+    def advance(self, now: int) -> list[K]:
+        """
+        Process all ticks up to (including) ``now``.
+
+        :return: keys that are due, removed from the wheel
+        """
+        fired: list[K] = []
+        slot_count = self._slot_count
+        slots = self._slots
+        due_map = self._due
+        while self._cursor <= now:
+            slot = slots[self._cursor % slot_count]
+            if slot:
+                fired.extend(slot)
+                for key in slot:
+                    del due_map[key]
+                slot.clear()
+            self._cursor += 1
+            if self._cursor % slot_count == 0:  # a new round begins, cascade
+                for key in self._rounds.pop(self._cursor // slot_count, ()):
+                    slots[due_map[key] % slot_count].add(key)
+        return fired
@@ -0,0 +1,50 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Callable, Generic, TypeVar, Final, Hashable
+
+from weakref import WeakValueDictionary
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class WeakBucket(Generic[K, V]):
+    """
+    A mapping creating values on demand, and dropping them as soon as they are no longer referenced elsewhere.
+
+    It fits stateful per-key primitives (e.g., locks and semaphores), which are idle once nobody references them: a
+    lock being held or waited for is referenced by its holder or waiters.
+    Thus, unlike a ``defaultdict``, it does not grow with every key ever seen.
+    Values must support weak references.
+    """
+
+    def __init__(self, factory: Callable[[], V]):
+        self._factory: Final[Callable[[], V]] = factory
+        self._values: Final[WeakValueDictionary[K, V]] = WeakValueDictionary()
+
+    def __getitem__(self, key: K) -> V:
+        value = self._values.get(key)
+        if value is None:
+            value = self._values[key] = self._factory()
+        return value
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
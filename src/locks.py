@@ -18,18 +18,19 @@ Shared locks.
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
-from typing import Union
+from typing import Union, Final
 from contextlib import AbstractAsyncContextManager
 
 import asyncio
 from time import time
-from collections import defaultdict
 from functools import partial
 from urllib.parse import urlparse
 
 from . import log, env
 from .errors_collection import ContextTimeoutError
 from .compat import nullcontext
+from .helpers.ratelimit import TokenBucket, TokenBucketMap, FairScheduler
+from .helpers.weak_bucket import WeakBucket
 
 _USER_LIKE = Union[int, str]
 
@@ -71,28 +72,26 @@ class ContextTimeoutManager:
 
 
 # ----- user locks -----
+# Locks of a user are dropped once nobody holds or waits for them, so that they do not pile up for every user ever seen.
 
-class _UserLockBucket:
-    def __init__(self):
-        self.msg_lock = asyncio.Lock()
-        self.flood_lock = asyncio.Lock()
-        self.media_upload_semaphore = asyncio.BoundedSemaphore(3)
-        self.pending_callbacks = set()
-
-
-_user_bucket: defaultdict[_USER_LIKE, _UserLockBucket] = defaultdict(_UserLockBucket)
+_user_msg_locks: WeakBucket[_USER_LIKE, asyncio.Lock] = WeakBucket(asyncio.Lock)
+_user_flood_locks: WeakBucket[_USER_LIKE, asyncio.Lock] = WeakBucket(asyncio.Lock)
+_user_media_upload_semaphores: WeakBucket[_USER_LIKE, asyncio.BoundedSemaphore] = WeakBucket(
+    partial(asyncio.BoundedSemaphore, 3)
+)
+_user_pending_callbacks: WeakBucket[_USER_LIKE, set] = WeakBucket(set)
 
 
 def user_msg_lock(user: _USER_LIKE) -> asyncio.Lock:
-    return _user_bucket[user].msg_lock
+    return _user_msg_locks[user]
 
 
 def user_flood_lock(user: _USER_LIKE) -> asyncio.Lock:
-    return _user_bucket[user].flood_lock
+    return _user_flood_locks[user]
 
 
 def user_media_upload_semaphore(user: _USER_LIKE) -> asyncio.BoundedSemaphore:
-    return _user_bucket[user].media_upload_semaphore
+    return _user_media_upload_semaphores[user]
 
 
 def user_msg_locks(user: _USER_LIKE) -> tuple[asyncio.Lock, asyncio.Lock]:
@@ -103,10 +102,122 @@ def user_msg_locks(user: _USER_LIKE) -> tuple[asyncio.Lock, asyncio.Lock]:
 
 
 def user_pending_callbacks(user: _USER_LIKE) -> set:
-    return _user_bucket[user].pending_callbacks
+    return _user_pending_callbacks[user]
+
+
+def user_lock_count() -> int:
+    """
+    :return: the number of user locks (and other per-user primitives) in use
+    """
+    return (len(_user_msg_locks) + len(_user_flood_locks) + len(_user_media_upload_semaphores)
+            + len(_user_pending_callbacks))
+
+
+# ----- rate limits -----
+# Telegram limits how many messages a bot can send, exceeding the limits results in flood waits.
+# Acquire from the buckets before sending to avoid them.
+OVERALL_MSG_RATE: Final[float] = 30  # messages per second
+PRIVATE_CHAT_MSG_RATE: Final[float] = 1  # messages per second
+GROUP_OR_CHANNEL_MSG_RATE: Final[float] = 20 / 60  # messages per second
+GROUP_OR_CHANNEL_MSG_BURST: Final[int] = 5
+# Uploading media (before sending them) is not a message and has a separate, looser budget, so that an album is not
+# charged twice.
+MEDIA_UPLOAD_RATE: Final[float] = 1  # media per second
+MEDIA_UPLOAD_BURST: Final[int] = 10  # a whole album
+
+_overall_msg_bucket: Final[TokenBucket] = TokenBucket(OVERALL_MSG_RATE, OVERALL_MSG_RATE)
+_private_chat_msg_buckets: Final[TokenBucketMap[_USER_LIKE]] = TokenBucketMap(PRIVATE_CHAT_MSG_RATE, 1)
+_group_or_channel_msg_buckets: Final[TokenBucketMap[_USER_LIKE]] = TokenBucketMap(
+    GROUP_OR_CHANNEL_MSG_RATE, GROUP_OR_CHANNEL_MSG_BURST
+)
+_media_upload_buckets: Final[TokenBucketMap[_USER_LIKE]] = TokenBucketMap(MEDIA_UPLOAD_RATE, MEDIA_UPLOAD_BURST)
+# Since the last call to pop_rate_limit_stats().
+_rate_limit_stats: dict[str, Union[int, float]] = {'waited': 0, 'delay': 0.0, 'flood_waits': 0}
+
+
+def _chat_msg_bucket(user: _USER_LIKE) -> TokenBucket:
+    chat_buckets = (
+        _group_or_channel_msg_buckets
+        if isinstance(user, int) and user < 0
+        else _private_chat_msg_buckets
+    )
+    return chat_buckets[user]
+
+
+# Chats take turns to send, so that a chat receiving lots of posts cannot delay other chats.
+_outbound_scheduler: Final[FairScheduler[_USER_LIKE]] = FairScheduler(_overall_msg_bucket, _chat_msg_bucket)
+
+
+def user_outbound_queue(user: _USER_LIKE) -> AbstractAsyncContextManager[None]:
+    """
+    :return: a context manager waiting in the FIFO queue of outbound posts to a user, and holding the head of it
+    """
+    return _outbound_scheduler.queue(user)
+
+
+def user_outbound_queue_depth(user: _USER_LIKE) -> int:
+    return _outbound_scheduler.queue_depth(user)
+
+
+def user_outbound_queue_oldest_age(user: _USER_LIKE) -> float:
+    return _outbound_scheduler.oldest_age(user)
+
+
+def outbound_queue_stats() -> tuple[int, int, float]:
+    """
+    :return: the number of chats with outbound posts queued, the max queue depth, the age of the oldest post in queues
+    """
+    return _outbound_scheduler.stats()
+
+
+async def user_msg_rate_limit(user: _USER_LIKE, count: int = 1) -> float:
+    """
+    Wait until `count` messages can be sent to a user without exceeding rate limits.
+
+    :param user: user id, negative for groups and channels
+    :param count: the number of messages to be sent (e.g., the number of media in an album)
+    :return `float`: how long it has waited, in seconds
+    """
+    delay = await _outbound_scheduler.acquire(user, count)
+    if delay > 0.001:
+        _rate_limit_stats['waited'] += 1  # otherwise it would have probably hit a flood wait
+        _rate_limit_stats['delay'] += delay
+    return delay
+
+
+async def user_media_upload_rate_limit(user: _USER_LIKE) -> float:
+    """
+    Wait until a medium can be uploaded for a user. Unlike `user_msg_rate_limit()`, it does not charge the message
+    budget, which is charged when the message containing the medium is sent.
+
+    :param user: user id, negative for groups and channels
+    :return `float`: how long it has waited, in seconds
+    """
+    return await _media_upload_buckets[user].acquire()
+
+
+def pop_rate_limit_stats() -> dict[str, Union[int, float]]:
+    """
+    :return: {'waited': number of sends delayed by rate limits, 'delay': total delay in seconds,
+              'flood_waits': number of flood waits hit}, since the last call
+    """
+    stats = _rate_limit_stats.copy()
+    _rate_limit_stats.update(waited=0, delay=0.0, flood_waits=0)
+    return stats
+
+
+def prune_rate_limit_buckets():
+    _private_chat_msg_buckets.prune()
+    _group_or_channel_msg_buckets.prune()
+    _media_upload_buckets.prune()
+
+
+def rate_limit_bucket_count() -> int:
+    return len(_private_chat_msg_buckets) + len(_group_or_channel_msg_buckets) + len(_media_upload_buckets)
 
 
 async def user_flood_wait(user: _USER_LIKE, seconds: int, call_time: float = None) -> bool:
+    _rate_limit_stats['flood_waits'] += 1
     if call_time is None:
         call_time = time()
     flood_lock = user_flood_lock(user)
@@ -138,8 +249,8 @@ overall_web_semaphore = (asyncio.BoundedSemaphore(env.HTTP_CONCURRENCY)
                          else nullcontext())
 
 if env.HTTP_CONCURRENCY_PER_HOST > 0:
-    _hostname_semaphore_bucket: defaultdict[str, asyncio.BoundedSemaphore] = \
-        defaultdict(partial(asyncio.BoundedSemaphore, env.HTTP_CONCURRENCY_PER_HOST))
+    _hostname_semaphore_bucket: WeakBucket[str, asyncio.BoundedSemaphore] = \
+        WeakBucket(partial(asyncio.BoundedSemaphore, env.HTTP_CONCURRENCY_PER_HOST))
 
 
     def hostname_semaphore(url: str, parse: bool = True) -> asyncio.BoundedSemaphore:
@@ -0,0 +1,213 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Optional, Final
+from collections.abc import Iterable
+
+from .. import db
+from ..helpers.persistence import persistence
+
+# Weight of the newest inter-arrival time in the EWMA.
+EWMA_ALPHA: Final[float] = 0.3
+# Poll several times per expected inter-arrival time.
+INTERVAL_TO_GAP_RATIO: Final[float] = 0.25
+# Do not trust the EWMA until enough inter-arrival times have been observed.
+MIN_SAMPLES: Final[int] = 3
+# Without enough samples, a feed is considered dormant only after being silent for this long (in seconds).
+MIN_SILENCE: Final[int] = 24 * 60 * 60
+
+# The weekly activity profile of a feed counts its entries in each hour of a week (in UTC).
+HOURS_PER_WEEK: Final[int] = 7 * 24
+HOUR: Final[int] = 60 * 60
+# Hours from the start of a week (Monday 00:00) to the UNIX epoch (Thursday 00:00).
+EPOCH_HOUR_OF_WEEK: Final[int] = 3 * 24
+# Halve the profile when any hour reaches this count, so that it follows changes of the publishing schedule.
+PROFILE_DECAY_THRESHOLD: Final[int] = 255
+# Do not trust the profile until enough entries have been counted.
+MIN_PROFILE_ENTRIES: Final[int] = 100
+# Entries timestamped further in the future than this (in seconds) are bogus.
+MAX_CLOCK_SKEW: Final[int] = 60 * 60
+
+
+def _hour_of_week(timestamp: float) -> int:
+    return (int(timestamp // HOUR) + EPOCH_HOUR_OF_WEEK) % HOURS_PER_WEEK
+
+
+class _FeedActivity:
+    __slots__ = ('since', 'last_arrival', 'mean_gap', 'samples', 'profile', 'profiled_until')
+
+    def __init__(
+            self,
+            since: float,
+            last_arrival: Optional[float] = None,
+            mean_gap: float = 0.0,
+            samples: int = 0,
+            profile: Optional[bytes] = None,
+            profiled_until: float = 0.0,
+    ):
+        self.since: float = since  # when the feed was observed for the first time
+        self.last_arrival: Optional[float] = last_arrival
+        self.mean_gap: float = mean_gap  # EWMA of inter-arrival times, in seconds
+        self.samples: int = samples
+        # number of entries published in each hour of a week, see `_hour_of_week()`
+        self.profile: bytearray = bytearray(profile) if profile is not None else bytearray(HOURS_PER_WEEK)
+        self.profiled_until: float = profiled_until  # the newest entry timestamp counted in the profile
+
+
+class FeedActivityTracker:
+    """
+    Learn how often new entries arrive in each feed, and derive an adaptive monitoring interval from it.
+
+    All timestamps are UNIX timestamps so that the history survives restarts.
+    """
+
+    def __init__(self):
+        self._activities: Final[dict[int, _FeedActivity]] = {}
+        persistence.register('feed_activity', self._dump, self._load)
+        # Feeds deleted or deactivated between dumps would otherwise stay in memory.
+        db.effective_utils.EffectiveTasks.add_delete_callback(self.forget)
+
+    def _dump(self) -> dict[int, tuple[float, Optional[float], float, int, bytes, float]]:
+        exist = db.effective_utils.EffectiveTasks.exist
+        return {
+            feed_id: (
+                activity.since, activity.last_arrival, activity.mean_gap, activity.samples,
+                bytes(activity.profile), activity.profiled_until,
+            )
+            for feed_id, activity in self._activities.items()
+            if exist(feed_id)
+        }
+
+    def _load(self, data: dict[int, tuple]):
+        # Dumps from older versions lack the profile.
+        for feed_id, args in data.items():
+            self._activities.setdefault(feed_id, _FeedActivity(*args))
+
+    def on_checked(
+            self,
+            feed_id: int,
+            now: float,
+            new_entry_count: int,
+            entry_timestamps: Optional[Iterable[int]] = None,
+    ):
+        """
+        :param feed_id: the id of the feed
+        :param now: a UNIX timestamp
+        :param new_entry_count: the number of new entries
+        :param entry_timestamps: when entries in the feed were published, to learn the weekly activity profile from
+        """
+        activity = self._activities.get(feed_id)
+        if activity is None:
+            activity = self._activities[feed_id] = _FeedActivity(
+                since=now, last_arrival=now if new_entry_count else None
+            )
+            if entry_timestamps:
+                self._learn_profile(activity, entry_timestamps, now)
+            return
+        if entry_timestamps:
+            self._learn_profile(activity, entry_timestamps, now)
+        if not new_entry_count:
+            return
+        if activity.last_arrival is not None:
+            # Entries arriving together are considered evenly distributed since the last arrival.
+            gap = (now - activity.last_arrival) / new_entry_count
+            activity.mean_gap = (
+                gap
+                if activity.samples == 0
+                else EWMA_ALPHA * gap + (1 - EWMA_ALPHA) * activity.mean_gap
+            )
+            activity.samples += 1
+        activity.last_arrival = now
+
+    @staticmethod
+    def _learn_profile(activity: _FeedActivity, entry_timestamps: Iterable[int], now: float):
+        profile = activity.profile
+        profiled_until = activity.profiled_until
+        newest = profiled_until
+        for timestamp in entry_timestamps:
+            # Entries counted before are skipped, so are those from the future.
+            if not profiled_until < timestamp <= now + MAX_CLOCK_SKEW:
+                continue
+            newest = max(newest, timestamp)
+            hour = _hour_of_week(timestamp)
+            if profile[hour] >= PROFILE_DECAY_THRESHOLD:
+                for i in range(HOURS_PER_WEEK):
+                    profile[i] >>= 1
+            profile[hour] += 1
+        activity.profiled_until = newest
+
+    def get_active_window_start(self, feed_id: int, now: float) -> Optional[float]:
+        """
+        Find out whether the feed is in a historically dead window of its weekly activity profile.
+
+        :param feed_id: the id of the feed
+        :param now: a UNIX timestamp
+        :return: the start of the next active window if it is in a dead window, otherwise `None`
+        """
+        if (activity := self._activities.get(feed_id)) is None:
+            return None
+        profile = activity.profile
+        if sum(profile) < MIN_PROFILE_ENTRIES:
+            return None
+        hour = _hour_of_week(now)
+        # Hours adjacent to an active hour are active as well, tolerating publishing schedules that drift a bit.
+        if profile[hour - 1] or profile[hour] or profile[(hour + 1) % HOURS_PER_WEEK]:
+            return None
+        for hours_ahead in range(2, HOURS_PER_WEEK):
+            if profile[(hour + hours_ahead) % HOURS_PER_WEEK]:
+                # The active window starts an hour before the active hour.
+                return (now // HOUR + hours_ahead - 1) * HOUR
+        return None  # unreachable since the profile is not empty
+
+    def is_dormant(self, feed_id: int, now: float) -> bool:
+        """
+        :return `bool`: whether the feed has been silent for long or is in a historically dead window
+        """
+        if (activity := self._activities.get(feed_id)) is None:
+            return False
+        return (
+                now - (activity.last_arrival or activity.since) >= MIN_SILENCE
+                or self.get_active_window_start(feed_id, now) is not None
+        )
+
+    def forget(self, feed_id: int):
+        self._activities.pop(feed_id, None)
+
+    def __len__(self) -> int:
+        return len(self._activities)
+
+    def get_interval(self, feed_id: int, now: float, interval: int, cap: int) -> int:
+        """
+        Get the adaptive monitoring interval of a feed.
+
+        :param feed_id: the id of the feed
+        :param now: a UNIX timestamp
+        :param interval: the lower bound (in seconds), i.e., the interval required by subscribers
+        :param cap: the upper bound (in seconds)
+        :return: the adaptive interval (in seconds)
+        """
+        if cap <= interval or (activity := self._activities.get(feed_id)) is None:
+            return interval
+        silence = now - (activity.last_arrival or activity.since)
+        if activity.samples >= MIN_SAMPLES:
+            # A feed being silent for longer than usual is probably becoming dormant.
+            expected_gap = max(activity.mean_gap, silence)
+        elif silence >= MIN_SILENCE:
+            expected_gap = silence
+        else:
+            return interval
+        return int(min(max(expected_gap * INTERVAL_TO_GAP_RATIO, interval), cap))
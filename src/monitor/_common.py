@@ -19,5 +19,13 @@ from typing import Final
 from ..log import getLogger
 
 TIMEOUT: Final[int] = 10 * 60  # 10 minutes
+MEDIA_PREVALIDATION_CONCURRENCY: Final[int] = 16  # overall
+MEDIA_PREVALIDATION_LIMIT: Final[int] = 30  # per feed update
+LOOP_LAG_SPIKE_THRESHOLD: Final[float] = 0.1  # seconds
+WEIGHT_PRIORITY_BOOST: Final[int] = 60  # seconds ahead in the monitor queue, per weight tier
+USER_BLOCKED_TTL: Final[int] = 24 * 60 * 60  # seconds, forget users who blocked the bot fewer than 5 times after it
+OUTBOX_BATCH_SIZE: Final[int] = 100  # updates drained from the outbox per tick (if MONITOR_ROLE=sender)
+SUB_INDEX_CHECK_INTERVAL: Final[int] = 24 * 60 * 60  # seconds, check the incrementally maintained sub index this often
+DIGEST_BACKLOG_THRESHOLD: Final[int] = 10  # messages, coalesce posts into a digest if a chat's backlog would exceed it
 
 logger = getLogger('RSStT.monitor')
@@ -0,0 +1,179 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Optional, Final
+
+from collections import Counter
+from time import time
+from urllib.parse import urlparse
+
+from .. import db
+from ..helpers.persistence import persistence
+from ..web import FailureClass
+
+# Transient failures are retried as usual until this many consecutive failures have occurred.
+TRANSIENT_BACKOFF_THRESHOLD: Final[int] = 10
+# Delay (in seconds) before probing a host again after it failed for the first time, doubled on each failure.
+HOST_BACKOFF_BASE: Final[int] = 5 * 60
+# Upper bound of all backoff delays (in seconds).
+BACKOFF_CAP: Final[int] = 24 * 60 * 60
+# Feeds on a host failing continuously for so long (in seconds) are deactivated as if they failed too many times.
+HOST_DEACTIVATION_AGE: Final[int] = 14 * 24 * 60 * 60
+# Backoff delays of feeds are halved per weight tier, up to this many times.
+MAX_BACKOFF_SPEEDUP: Final[int] = 3
+
+
+class _HostFailure:
+    __slots__ = ('failures', 'retry_at', 'since', 'probing')
+
+    def __init__(self, failures: int = 0, retry_at: float = 0, since: Optional[float] = None):
+        self.failures: int = failures  # consecutive host-wide failures
+        self.retry_at: float = retry_at  # feeds on the host are not fetched before it
+        self.since: float = time() if since is None else since  # when the host started failing
+        self.probing: bool = False  # a feed has been let through to probe the host
+
+
+class FeedFailureTracker:
+    """
+    Decide when to retry failing feeds as per the class of their failures.
+
+    Permanent failures (e.g., 404, 410, invalid feeds) back off exponentially from the first failure.
+    Transient failures (e.g., 5xx, timeouts) are retried at the normal interval and only back off after many
+    consecutive failures.
+    Host-wide failures (e.g., DNS, TLS, connection refused) are attributed to the host: all feeds on the host are held
+    back until one of them probes it again, so that a dead host costs one fetch per backoff period instead of one per
+    feed. Once the host has been failing for HOST_DEACTIVATION_AGE, its feeds are no longer held back and are
+    deactivated on their next failure.
+
+    All timestamps are UNIX timestamps so that the state survives restarts.
+    """
+
+    def __init__(self):
+        self._feed_failures: Final[dict[int, FailureClass]] = {}  # key: feed id, value: class of the last failure
+        self._hosts: Final[dict[str, _HostFailure]] = {}  # key: hostname
+        persistence.register('feed_failures', self._dump, self._load)
+
+    def _dump(self) -> tuple[dict[int, str], dict[str, tuple[int, float, float]]]:
+        exist = db.effective_utils.EffectiveTasks.exist
+        # Hosts not probed for so long have no feed left.
+        stale_before = time() - BACKOFF_CAP
+        for host in tuple(host for host, host_failure in self._hosts.items() if host_failure.retry_at < stale_before):
+            del self._hosts[host]
+        for feed_id in tuple(feed_id for feed_id in self._feed_failures if not exist(feed_id)):
+            del self._feed_failures[feed_id]
+        return (
+            {feed_id: failure_class.value for feed_id, failure_class in self._feed_failures.items()},
+            {
+                host: (host_failure.failures, host_failure.retry_at, host_failure.since)
+                for host, host_failure in self._hosts.items()
+            },
+        )
+
+    def _load(self, data: tuple[dict[int, str], dict[str, tuple[float, ...]]]):
+        feed_failures, hosts = data
+        for feed_id, failure_class in feed_failures.items():
+            self._feed_failures.setdefault(feed_id, FailureClass(failure_class))
+        for host, args in hosts.items():
+            self._hosts.setdefault(host, _HostFailure(*args))
+
+    @staticmethod
+    def _host(link: str) -> Optional[str]:
+        return urlparse(link).hostname
+
+    def host_retry_at(self, link: str, now: float) -> Optional[float]:
+        """
+        :return: when the host of the feed can be probed again, or None if it is not held back
+        """
+        if not self._hosts or (host_failure := self._hosts.get(self._host(link))) is None:
+            return None
+        if now - host_failure.since >= HOST_DEACTIVATION_AGE:
+            return None  # let every feed on the dead host fail once more to be deactivated
+        if host_failure.retry_at > now:
+            return host_failure.retry_at
+        # Let this feed probe the host, and hold back the others until the probe is done.
+        host_failure.probing = True
+        host_failure.retry_at = now + HOST_BACKOFF_BASE
+        return None
+
+    def is_host_dead(self, link: str, now: float) -> bool:
+        """
+        :return: whether the host of the feed has been failing for HOST_DEACTIVATION_AGE
+        """
+        if not self._hosts or (host_failure := self._hosts.get(self._host(link))) is None:
+            return False
+        return now - host_failure.since >= HOST_DEACTIVATION_AGE
+
+    def on_succeeded(self, feed_id: int, link: str):
+        self._feed_failures.pop(feed_id, None)
+        if self._hosts:
+            self._hosts.pop(self._host(link), None)
+
+    def on_failed(
+            self,
+            feed_id: int,
+            link: str,
+            failure_class: FailureClass,
+            error_count: int,
+            interval: int,
+            now: float,
+            weight_tier: int = 0,
+    ) -> Optional[float]:
+        """
+        Record a failure of a feed.
+
+        :param feed_id: the id of the feed
+        :param link: the link of the feed
+        :param failure_class: the class of the failure
+        :param error_count: the number of consecutive failures of the feed, including this one
+        :param interval: the monitoring interval of the feed (in minutes)
+        :param now: a UNIX timestamp
+        :param weight_tier: the weight tier of the feed, feeds with more subscribers are retried more aggressively
+        :return: when to check the feed next time, or None to check it as usual
+        """
+        self._feed_failures[feed_id] = failure_class
+        host = self._host(link)
+        if failure_class is FailureClass.HOST and host:
+            host_failure = self._hosts.get(host)
+            if host_failure is None:
+                host_failure = self._hosts[host] = _HostFailure(since=now)
+            if host_failure.probing or host_failure.retry_at <= now:
+                # Feeds on the same host being fetched concurrently fail together, count them as one failure.
+                host_failure.failures += 1
+                host_failure.retry_at = now + min(HOST_BACKOFF_BASE << min(host_failure.failures - 1, 16),
+                                                  BACKOFF_CAP)
+                host_failure.probing = False
+            return host_failure.retry_at
+        if self._hosts:
+            self._hosts.pop(host, None)  # the host is reachable after all
+        if failure_class is FailureClass.PERMANENT:
+            # Equals: interval * (2 ** error_count), clamp to BACKOFF_CAP
+            delay = min((interval * 60) << min(error_count, 16), BACKOFF_CAP)
+        elif error_count >= TRANSIENT_BACKOFF_THRESHOLD:
+            # Equals: interval * (2 ** exp), clamp to BACKOFF_CAP
+            delay = min((interval * 60) << (error_count // TRANSIENT_BACKOFF_THRESHOLD), BACKOFF_CAP)
+        else:
+            return None
+        return now + max(delay >> min(weight_tier, MAX_BACKOFF_SPEEDUP), interval * 60)
+
+    def forget(self, feed_id: int):
+        self._feed_failures.pop(feed_id, None)
+
+    def count_failing_feeds(self) -> Counter[FailureClass]:
+        return Counter(self._feed_failures.values())
+
+    def count_failing_hosts(self) -> int:
+        return len(self._hosts)
@@ -0,0 +1,238 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Optional, NamedTuple, Any
+
+import asyncio
+import pickle
+import threading
+from calendar import timegm
+from datetime import datetime
+from itertools import count
+from time import perf_counter
+
+from ._common import logger
+from .. import env, web, aio_helper
+from ..command import inner
+from ..parsing.utils import ensure_plain
+
+
+class FetchResult(NamedTuple):
+    url: str  # redirected url
+    status: int
+    error: Optional[web.WebError] = None
+    etag: Optional[str] = None
+    last_modified: Optional[datetime] = None
+    next_check_time: Optional[datetime] = None  # as per server-side cache
+    title: Optional[str] = None  # None if not fetched or empty
+    new_hashes: Optional[bytes] = None  # packed
+    legacy_hashes: Optional[list[str]] = None  # legacy hashes of known entries no longer in the feed, if any left
+    updated_entries: Optional[list[dict]] = None
+    entry_count: int = 0  # number of all entries in the feed
+    # durations of phases in seconds, None if not reached
+    fetch_time: Optional[float] = None  # excluding parse_time
+    parse_time: Optional[float] = None
+    diff_time: Optional[float] = None
+    entry_timestamps: Optional[tuple[int, ...]] = None  # when entries in the feed were published, as UNIX timestamps
+
+
+def _get_entry_timestamps(entries: list[dict]) -> tuple[int, ...]:
+    timestamps = []
+    for entry in entries:
+        if not (time_struct := entry.get('published_parsed') or entry.get('updated_parsed')):
+            continue
+        try:
+            timestamps.append(timegm(time_struct))
+        except (TypeError, ValueError, OverflowError):
+            continue
+    return tuple(timestamps)
+
+
+async def fetch_and_diff(
+        link: str,
+        headers: dict[str, str],
+        entry_hashes: Optional[bytes],
+        legacy_entry_hashes: Optional[list[str]],
+        now: datetime,
+) -> FetchResult:
+    """
+    Fetch a feed, parse it, and find out updated entries.
+    This is the CPU-heavy part of monitoring, which runs in fetch workers if `FETCH_WORKERS` is set.
+
+    :param link: Feed link
+    :param headers: Headers for a conditional request
+    :param entry_hashes: Packed hashes of known entries of the feed
+    :param legacy_entry_hashes: Hashes of known entries of the feed stored by older versions
+    :param now: A datetime object representing the current time
+    :return: A FetchResult object
+    """
+    fetch_start = perf_counter()
+    wf = await web.feed_get(link, headers=headers, verbose=False)
+    parse_time = wf.parse_time
+    fetch_time = perf_counter() - fetch_start - (parse_time or 0)
+    rss_d = wf.rss_d
+    if wf.status == 304 or rss_d is None:  # cached or error occurred
+        return FetchResult(url=wf.url, status=wf.status, error=wf.error, fetch_time=fetch_time, parse_time=parse_time)
+
+    wr = wf.web_response
+    assert wr is not None
+    wr.now = now
+    result = FetchResult(
+        url=wf.url,
+        status=wf.status,
+        etag=wr.etag,
+        last_modified=wr.last_modified,
+        next_check_time=wf.calc_next_check_as_per_server_side_cache(),
+        fetch_time=fetch_time,
+        parse_time=parse_time,
+    )
+    if not rss_d.entries:  # empty
+        return result
+
+    title = rss_d.feed.title
+    diff_start = perf_counter()
+    new_hashes, updated_entries = inner.utils.calculate_update(entry_hashes, rss_d.entries, legacy_entry_hashes)
+    hash_limit = max(len(rss_d.entries) * 2, 100)
+    new_hashes = new_hashes[:hash_limit]
+    legacy_hashes = inner.utils.carry_over_legacy_hashes(
+        legacy_entry_hashes, rss_d.entries, hash_limit - len(new_hashes)
+    )
+    diff_time = perf_counter() - diff_start
+    return result._replace(
+        title=await ensure_plain(title) if title else '',
+        new_hashes=inner.utils.pack_hashes(new_hashes),
+        legacy_hashes=legacy_hashes,
+        updated_entries=updated_entries,
+        entry_count=len(rss_d.entries),
+        diff_time=diff_time,
+        entry_timestamps=_get_entry_timestamps(rss_d.entries),
+    )
+
+
+# ----- fetch workers (if FETCH_WORKERS is set) -----
+# Requests: (request_id, link, headers, entry_hashes, legacy_entry_hashes, now), None to stop.
+# Responses: (request_id, pickled FetchResult or None, error message or None), None to stop.
+# A WebError is passed as (error_name, status, url, failure_class) since it cannot be pickled as is.
+
+def _dump_result(result: FetchResult) -> bytes:
+    error = result.error
+    if error is not None:
+        result = result._replace(error=(error.error_name, error.status, error.url, error.failure_class))
+    return pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_result(payload: bytes) -> FetchResult:
+    result: FetchResult = pickle.loads(payload)
+    if result.error is not None:
+        error_name, status, url, failure_class = result.error
+        result = result._replace(error=web.WebError(error_name, status, url, failure_class=failure_class))
+    return result
+
+
+async def _handle_request(request: tuple, responses: Any):
+    request_id, *args = request
+    try:
+        responses.put((request_id, _dump_result(await fetch_and_diff(*args)), None))
+    except Exception as e:
+        logger.debug(f'Failed to fetch {args[0]} in a fetch worker:', exc_info=e)
+        responses.put((request_id, None, f'{type(e).__name__}: {e}'))
+
+
+async def _serve(requests: Any, responses: Any):
+    loop = env.loop
+    tasks: set[asyncio.Task] = set()
+    while (request := await loop.run_in_executor(None, requests.get)) is not None:
+        task = loop.create_task(_handle_request(request, responses))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+def serve(requests: Any, responses: Any):
+    """
+    The main function of a fetch worker process.
+    """
+    # Under fork, the worker inherits the event loop of the main process (which has never run at that time), while
+    # under spawn or forkserver, `env` is imported afresh. Either way, start a fresh loop and depend on nothing else
+    # from the main process but the settings in `env` and the queues.
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    env.loop = loop
+    loop.run_until_complete(_serve(requests, responses))
+
+
+class FetchWorkerClient:
+    """
+    Dispatch fetch_and_diff() to fetch workers and await the results, so that the event loop of the main process only
+    needs to update states and send posts.
+    """
+
+    def __init__(self):
+        self._futures: dict[int, asyncio.Future[FetchResult]] = {}
+        self._request_ids = count()
+        self._reader: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._reader is None:
+            self._reader = threading.Thread(target=self._read_responses, name='rsstt_fetch_reader', daemon=True)
+            self._reader.start()
+
+    def _read_responses(self):
+        responses = aio_helper.fetchResponseQueue
+        loop = env.loop
+        while (response := responses.get()) is not None:
+            request_id, payload, error_message = response
+            try:
+                # Unpickle in this thread to keep the event loop responsive.
+                result = _load_result(payload) if payload is not None else None
+            except Exception as e:
+                result, error_message = None, f'{type(e).__name__}: {e}'
+            loop.call_soon_threadsafe(self._resolve, request_id, result, error_message)
+
+    def _resolve(self, request_id: int, result: Optional[FetchResult], error_message: Optional[str]):
+        future = self._futures.pop(request_id, None)
+        if future is None or future.done():  # cancelled (e.g., timed out)
+            return
+        if error_message is not None:
+            future.set_exception(RuntimeError(f'Fetch worker failed: {error_message}'))
+        else:
+            future.set_result(result)
+
+    async def fetch_and_diff(
+            self,
+            link: str,
+            headers: dict[str, str],
+            entry_hashes: Optional[bytes],
+            legacy_entry_hashes: Optional[list[str]],
+            now: datetime,
+    ) -> FetchResult:
+        request_id = next(self._request_ids)
+        future = self._futures[request_id] = env.loop.create_future()
+        aio_helper.fetchRequestQueue.put((request_id, link, headers, entry_hashes, legacy_entry_hashes, now))
+        try:
+            return await future
+        finally:
+            self._futures.pop(request_id, None)
+
+    def stop(self):
+        if self._reader is not None:
+            aio_helper.fetchResponseQueue.put(None)
+            self._reader = None
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
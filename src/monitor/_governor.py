@@ -0,0 +1,100 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+from __future__ import annotations
+from typing import Optional, Final
+
+import enum
+
+from ._common import logger
+
+# Weight of the newest sample in the EWMA of loop lag.
+LAG_EWMA_ALPHA: Final[float] = 0.2
+# Start shedding load when the EWMA of loop lag (in seconds) or the number of in-flight subtasks reaches these...
+SHED_LAG_THRESHOLD: Final[float] = 0.5
+SHED_IN_FLIGHT_THRESHOLD: Final[int] = 2000
+# ... and stop shedding only after both drop below these, so that the state does not flap.
+RECOVER_LAG_THRESHOLD: Final[float] = 0.1
+RECOVER_IN_FLIGHT_THRESHOLD: Final[int] = 1000
+# Stay in a state for at least this long (in seconds) before leaving it.
+MIN_STATE_DURATION: Final[int] = 30
+# Feeds are monitored in batches of at most this size while shedding load.
+SHED_BATCH_SIZE: Final[int] = 50
+
+
+class LoadState(enum.Enum):
+    NORMAL = 'normal'
+    SHEDDING = 'shedding'
+
+
+class LoadGovernor:
+    """
+    Shed low-priority work when the event loop is overloaded.
+
+    Once the loop falls behind, all subtasks slow down together until they time out and are cancelled, wasting all the
+    work done. Instead, while overloaded, low-priority polls are skipped, media pre-validation is paused and feeds are
+    monitored in smaller batches, until the load drops.
+    """
+
+    def __init__(self):
+        self._state: LoadState = LoadState.NORMAL
+        self._state_since: Optional[float] = None
+        self._lag: float = 0.0  # EWMA of loop lag, in seconds
+        self._in_flight: int = 0
+
+    @property
+    def state(self) -> LoadState:
+        return self._state
+
+    @property
+    def shedding(self) -> bool:
+        return self._state is LoadState.SHEDDING
+
+    def observe(self, lag: float, in_flight: int, now: float):
+        """
+        Feed a sample of loop lag and the number of in-flight subtasks, and transition between states if needed.
+
+        :param lag: loop lag, in seconds
+        :param in_flight: the number of in-flight monitor and notifier subtasks
+        :param now: a monotonic timestamp
+        """
+        self._lag = LAG_EWMA_ALPHA * lag + (1 - LAG_EWMA_ALPHA) * self._lag
+        self._in_flight = in_flight
+        if self._state_since is None:
+            self._state_since = now
+        if now - self._state_since < MIN_STATE_DURATION:
+            return
+        if self._state is LoadState.NORMAL:
+            if self._lag >= SHED_LAG_THRESHOLD or in_flight >= SHED_IN_FLIGHT_THRESHOLD:
+                self._transition(LoadState.SHEDDING, now)
+        elif self._lag < RECOVER_LAG_THRESHOLD and in_flight < RECOVER_IN_FLIGHT_THRESHOLD:
+            self._transition(LoadState.NORMAL, now)
+
+    def _transition(self, state: LoadState, now: float):
+        logger.warning(
+            f'Load state changed ({self._state.value} -> {state.value}) after {now - self._state_since:.0f}s: '
+            f'loop lag {self._lag * 1000:.0f}ms, {self._in_flight} subtasks in flight'
+        )
+        self._state = state
+        self._state_since = now
+
+    def batch_size(self, size: int) -> int:
+        """
+        :param size: the number of feeds waiting to be monitored
+        :return: the number of feeds to be monitored in the next batch
+        """
+        return min(size, SHED_BATCH_SIZE) if self.shedding else size
@@ -21,20 +21,33 @@ from collections.abc import Iterable
 import enum
 import asyncio
 import logging
+import pickle
 from datetime import datetime, timedelta, timezone
 from email.utils import format_datetime
 from collections import defaultdict
-from itertools import islice, chain, repeat
-
-from ._common import logger, TIMEOUT
+from itertools import islice, count
+from math import ceil
+from time import time
+
+from ._activity import FeedActivityTracker
+from ._failure import FeedFailureTracker
+from ._governor import LoadGovernor
+from ._fetcher import FetchWorkerClient, fetch_and_diff
+from ._common import (
+    logger, TIMEOUT, MEDIA_PREVALIDATION_CONCURRENCY, MEDIA_PREVALIDATION_LIMIT, OUTBOX_BATCH_SIZE,
+    WEIGHT_PRIORITY_BOOST, SUB_INDEX_CHECK_INTERVAL,
+)
 from ._notifier import Notifier
-from ._stat import MonitorStat
-from .. import db, env, web, locks
+from ._shard import ShardCoordinator
+from ._stat import MonitorStat, LatencyHistogram
+from ._throttle import throttle_update
+from .. import db, env, web, locks, aio_helper
 from ..command import inner
 from ..helpers.bg import bg
 from ..helpers.singleton import Singleton
 from ..helpers.timeout import BatchTimeout
-from ..parsing.utils import ensure_plain
+from ..parsing.medium import Image, Video
+from ..parsing.utils import extract_media_urls
 
 
 class TaskState(enum.IntFlag):
@@ -42,23 +55,53 @@ class TaskState(enum.IntFlag):
     LOCKED = 1 << 0
     IN_PROGRESS = 1 << 1
     DEFERRED = 1 << 2
+    QUEUED = 1 << 3
 
 
 FEED_OR_ID = Union[int, db.Feed]
+# (urgency, boosted due time, negative weight, sequence number, feed, active subs, now, enqueued at)
+QUEUE_ITEM = tuple[int, int, int, int, db.Feed, list[db.Sub], datetime, float]
 
 
 class Monitor(Singleton):
     def __init__(self):
         self._stat: Final[MonitorStat] = MonitorStat()
         self._bg_task: Optional[asyncio.Task] = None
+        self._tick_handle: Optional[asyncio.TimerHandle] = None
+        self._next_tick_at: Optional[float] = None  # loop time
+        self._activity: Final[FeedActivityTracker] = FeedActivityTracker()
+        self._failures: Final[FeedFailureTracker] = FeedFailureTracker()
+        self._governor: Final[LoadGovernor] = LoadGovernor()
         # Synchronous operations are atomic from the perspective of asynchronous coroutines, so we can just use a map
         # plus additional prologue & epilogue to simulate an asynchronous lock.
         # In the meantime, the deferring logic is implemented using this map.
-        self._subtask_defer_map: Final[defaultdict[int, TaskState]] = defaultdict(lambda: TaskState.EMPTY)
+        # Feeds in the EMPTY state are absent so that the map only holds feeds being monitored or locked up.
+        self._subtask_defer_map: Final[dict[int, TaskState]] = {}
         self._lock_up_period: int = 0  # in seconds
+        self._media_prevalidation_semaphore: Final[asyncio.BoundedSemaphore] = asyncio.BoundedSemaphore(
+            MEDIA_PREVALIDATION_CONCURRENCY
+        )
+        # Only used when MONITOR_CONCURRENCY is set, otherwise each monitoring task spawns its subtasks unboundedly.
+        self._queue: Final[Optional[asyncio.PriorityQueue[QUEUE_ITEM]]] = (
+            asyncio.PriorityQueue() if env.MONITOR_CONCURRENCY else None
+        )
+        self._queue_seq: Final = count()  # tie-breaker, keeping FIFO order and preventing db.Feed from being compared
+        self._workers: list[asyncio.Task] = []
+        # MONITOR_ROLE=worker: monitor the shard of feeds owned by this worker, hand updates over to the sender.
+        # MONITOR_ROLE=sender: monitor nothing, send updates handed over by workers.
+        self._shard: Final[Optional[ShardCoordinator]] = (
+            ShardCoordinator(env.MONITOR_WORKER_ID) if env.MONITOR_ROLE == 'worker' else None
+        )
+        self._draining_outbox: bool = False
+        self._sub_index_checked_at: float = time()
+        # FETCH_WORKERS: fetching and parsing are done in dedicated processes, off the event loop.
+        self._fetch_worker_client: Final[Optional[FetchWorkerClient]] = (
+            FetchWorkerClient() if aio_helper.FETCH_WORKER_COUNT else None
+        )
 
         # update _lock_up_period on demand
         db.effective_utils.EffectiveOptions.add_set_callback('minimal_interval', self._update_lock_up_period_cb)
+        db.FeedWriteBehind.add_flush_callback(self._stat.db_flushed)
 
     def _update_lock_up_period_cb(self, key: str, value: int, expected_key: str = 'minimal_interval'):
         if key != expected_key:
@@ -87,15 +130,48 @@ class Monitor(Singleton):
                 feed_id = feed
                 if not self._defer_feed_id(feed_id):
                     feed_ids.add(feed_id)
+        if feed_ids:
+            # Only feeds not served by the in-memory table need to be loaded from the DB.
+            feeds_in_table, feed_ids = db.FeedStateTable.get_many(feed_ids)
+            db_feeds.update(feeds_in_table)
         if feed_ids:
             db_feeds_to_merge = await db.Feed.filter(id__in=feed_ids)
+            self._stat.db_queried()
+            db.FeedWriteBehind.overlay(db_feeds_to_merge)
             db_feeds.update(db_feeds_to_merge)
+            for feed in db_feeds_to_merge:
+                db.FeedStateTable.put(feed)
             if len(db_feeds_to_merge) != len(feed_ids):
                 feed_ids_not_found = feed_ids - {feed.id for feed in db_feeds_to_merge}
                 logger.error(f'Feeds {feed_ids_not_found} not found, but they were submitted to the monitor queue.')
 
         return db_feeds
 
+    async def _load_active_subs(self, feeds: set[db.Feed]) -> defaultdict[int, list[db.Sub]]:
+        # Load active subs of all feeds, along with their users, in two queries rather than one (plus one per sub)
+        # for each feed.
+        feed_subs_map: defaultdict[int, list[db.Sub]] = defaultdict(list)
+        subs = await db.Sub.filter(feed_id__in=[feed.id for feed in feeds], state=1).prefetch_related('user')
+        self._stat.db_queried(2)
+        for sub in subs:
+            feed_subs_map[sub.feed_id].append(sub)
+        return feed_subs_map
+
+    async def _refresh_active_subs(self, feed: db.Feed, subs: list[db.Sub]) -> list[db.Sub]:
+        # Subs of a queued feed were loaded when it was enqueued. Drop those deleted or deactivated since then, and
+        # reload them if any have been added or activated in the meantime.
+        effective_tasks = db.effective_utils.EffectiveTasks
+        if not effective_tasks.is_sub_index_loaded():
+            return subs
+        subs = [sub for sub in subs if effective_tasks.is_sub_active(sub.id, feed.id)]
+        if len(subs) == effective_tasks.count_active_subs(feed.id):
+            return subs
+        try:
+            return (await self._load_active_subs({feed})).get(feed.id, [])
+        except Exception as e:
+            logger.warning(f'Failed to reload subs, using the remaining ones: {feed.id}: {feed.link}', exc_info=e)
+            return subs
+
     def _on_subtask_canceled(self, err: BaseException, feed: db.Feed, *_):
         self._stat.cancelled()
         logger.error(f'Monitoring subtask failed due to CancelledError: {feed.id}: {feed.link}', exc_info=err)
@@ -106,30 +182,51 @@ class Monitor(Singleton):
 
     def _on_subtask_timeout(self, err: BaseException, feed: db.Feed, *_):
         self._stat.timeout()
-        logger.error(f'Monitoring subtask timed out after {TIMEOUT}s: {feed.id}: {feed.link}', exc_info=err)
+        logger.error(f'Monitoring subtask timed out after {self._timeout_budget(feed.id)}s: {feed.id}: {feed.link}',
+                     exc_info=err)
 
     def _on_subtask_timeout_unknown_error(self, err: BaseException, feed: db.Feed, *_):
         self._stat.timeout_unknown_error()
         logger.error(
-            f'Monitoring subtask timed out after {TIMEOUT}s and caused an unknown error: {feed.id}: {feed.link}',
+            f'Monitoring subtask timed out after {self._timeout_budget(feed.id)}s and caused an unknown error: '
+            f'{feed.id}: {feed.link}',
             exc_info=err
         )
 
-    async def _do_monitor_subtask(self, feed: db.Feed, now: datetime):
-        self._subtask_defer_map[feed.id] |= TaskState.IN_PROGRESS
+    @staticmethod
+    def _timeout_budget(feed_id: int) -> int:
+        # Sending updates to more subscribers takes longer, allow up to twice the time for the heaviest feeds.
+        effective_tasks = db.effective_utils.EffectiveTasks
+        return TIMEOUT + TIMEOUT * effective_tasks.get_weight_tier(feed_id) // db.effective_utils.MAX_WEIGHT_TIER
+
+    def _new_batch_timeout(self, timeout: int = TIMEOUT) -> BatchTimeout[[db.Feed, list[db.Sub], datetime], None]:
+        return BatchTimeout[[db.Feed, list[db.Sub], datetime], None](
+            func=self._do_monitor_subtask,
+            timeout=timeout,
+            loop=env.loop,
+            on_canceled=self._on_subtask_canceled,
+            on_error=self._on_subtask_unknown_error,
+            on_timeout=self._on_subtask_timeout,
+            on_timeout_error=self._on_subtask_timeout_unknown_error,
+        )
+
+    async def _do_monitor_subtask(self, feed: db.Feed, subs: list[db.Sub], now: datetime):
+        # IN_PROGRESS is set before QUEUED is erased, so that the erasure never triggers a resubmission.
+        self._set_state_for_feed_id(
+            feed.id, self._get_state_for_feed_id(feed.id) & ~TaskState.QUEUED | TaskState.IN_PROGRESS
+        )
         self._stat.start()
         try:
-            await self._do_monitor_a_feed(feed, now)
+            await self._do_monitor_a_feed(feed, subs, now)
         finally:
             self._erase_state_for_feed_id(feed.id, TaskState.IN_PROGRESS)
             self._stat.finish()
 
-    # In the foreseeable future, we may limit the number of concurrent monitoring tasks and use
-    # helpers.queue.QueuedDecorator(PriorityQueue) to prioritize some jobs.
-    # Since the execution of monitoring tasks is completely unlimited now, we can use the simpler `bg` decorator to
-    # avoid the extra overhead of `queued`.
+    # When MONITOR_CONCURRENCY is set, feeds are put into self._queue and consumed by a fixed number of workers.
+    # helpers.queue.QueuedDecorator is not used since each feed needs its own priority and the execution of a feed
+    # should be awaited by the worker (instead of being spawned in the background) to bound the concurrency.
     @bg
-    async def _do_monitor_task(self, feeds: Iterable[FEED_OR_ID], description: str):
+    async def _do_monitor_task(self, feeds: Iterable[FEED_OR_ID], description: str, urgent: bool = False):
         # Previously, this was a tail call (self._ensure_db_feeds() calls self._do_monitor_task() at the end).
         # It turned out that the tail call made the frame of self._ensure_db_feeds(), which keep referencing all db.Feed
         # objects produced there, persisted until self._do_monitor_task() was done.
@@ -143,28 +240,126 @@ class Monitor(Singleton):
         handle_id = id(feeds)
         logger.debug(f'Start monitoring {feed_count} feeds (handle: {handle_id}): {description}')
 
+        feed_subs_map = await self._load_active_subs(feeds)
         now = datetime.now(timezone.utc)
-        _do_monitor_subtask: BatchTimeout[[db.Feed, datetime], None]
-        async with BatchTimeout[[db.Feed], None](
-                func=self._do_monitor_subtask,
-                timeout=TIMEOUT,
-                loop=env.loop,
-                on_canceled=self._on_subtask_canceled,
-                on_error=self._on_subtask_unknown_error,
-                on_timeout=self._on_subtask_timeout,
-                on_timeout_error=self._on_subtask_timeout_unknown_error,
-        ) as _do_monitor_subtask:
-            for feed in feeds:
-                self._lock_feed_id(feed.id)
-                _do_monitor_subtask(feed, now, _task_name_suffix=feed.id)
-            # It could take a long time waiting for all subtasks to finish or time out.
-            # Release unnecessary references to heavy objects so that they can be garbage collected ASAP.
-            del feed, feeds, now
+        if self._governor.shedding and not urgent:
+            feeds = self._shed_low_priority(feeds, feed_subs_map, now)
+            if not feeds:
+                return
+        if self._queue is not None:
+            self._enqueue_feeds(feeds, feed_subs_map, now, urgent)
+            logger.debug(f'Queued {feed_count} feeds (handle: {handle_id}): {description}')
+            return
+
+        # Feeds with different timeout budgets are monitored in separate batches.
+        batches: defaultdict[int, list[db.Feed]] = defaultdict(list)
+        for feed in feeds:
+            batches[self._timeout_budget(feed.id)].append(feed)
+        batch_coros = [
+            self._do_monitor_batch(batch, feed_subs_map, now, timeout)
+            for timeout, batch in batches.items()
+        ]
+        # It could take a long time waiting for all subtasks to finish or time out.
+        # Release unnecessary references to heavy objects so that they can be garbage collected ASAP.
+        del feed, feeds, feed_subs_map, now, batches
+        await asyncio.gather(*batch_coros)
 
         logger.debug(f'Finished monitoring {feed_count} feeds (handle: {handle_id}): {description}')
 
+    async def _do_monitor_batch(
+            self,
+            feeds: list[db.Feed],
+            feed_subs_map: defaultdict[int, list[db.Sub]],
+            now: datetime,
+            timeout: int,
+    ):
+        _do_monitor_subtask: BatchTimeout[[db.Feed, list[db.Sub], datetime], None]
+        while feeds:
+            # Smaller batches while shedding load, so that each batch finishes well within its timeout.
+            batch_size = self._governor.batch_size(len(feeds))
+            batch = feeds[-batch_size:]
+            del feeds[-batch_size:]
+            async with self._new_batch_timeout(timeout) as _do_monitor_subtask:
+                for feed in batch:
+                    self._lock_feed_id(feed.id)
+                    _do_monitor_subtask(feed, feed_subs_map.get(feed.id, []), now, _task_name_suffix=feed.id)
+                # Release unnecessary references to heavy objects so that they can be garbage collected ASAP.
+                del feed
+                batch.clear()
+
+    def _shed_low_priority(
+            self,
+            feeds: set[db.Feed],
+            feed_subs_map: defaultdict[int, list[db.Sub]],
+            now: datetime,
+    ) -> set[db.Feed]:
+        # Dormant feeds and feeds whose subscribers are all experiencing flood wait can wait.
+        # They have already been rescheduled one interval later when they became due, so skipping them is enough.
+        timestamp = now.timestamp()
+        kept: set[db.Feed] = set()
+        for feed in feeds:
+            subs = feed_subs_map.get(feed.id)
+            if (
+                    self._activity.is_dormant(feed.id, timestamp)
+                    or (subs and all(locks.user_flood_lock(sub.user_id).locked() for sub in subs))
+            ):
+                self._stat.shed()
+            else:
+                kept.add(feed)
+        return kept
+
     _do_monitor_task_bg_sync = _do_monitor_task.bg_sync
 
+    def _enqueue_feeds(
+            self,
+            feeds: set[db.Feed],
+            feed_subs_map: defaultdict[int, list[db.Sub]],
+            now: datetime,
+            urgent: bool
+    ):
+        # Scheduled feeds are submitted as soon as they are due, so the submission time is their due time.
+        due = int(now.timestamp())
+        enqueued_at = env.loop.time()
+        urgency = 0 if urgent else 1
+        effective_tasks = db.effective_utils.EffectiveTasks
+        for feed in feeds:
+            self._lock_feed_id(feed.id)
+            self._set_state_for_feed_id(feed.id, self._get_state_for_feed_id(feed.id) | TaskState.QUEUED)
+            subs = feed_subs_map.get(feed.id, [])
+            # Feeds with more subscribers jump ahead of others due a bit earlier, so that they are not the ones
+            # starved when saturated, while others are delayed by a bounded time only.
+            boosted_due = due - effective_tasks.get_weight_tier(feed.id) * WEIGHT_PRIORITY_BOOST
+            self._queue.put_nowait(
+                (urgency, boosted_due, -effective_tasks.get_weight(feed.id), next(self._queue_seq),
+                 feed, subs, now, enqueued_at)
+            )
+            self._stat.enqueued()
+
+    async def _monitor_worker(self):
+        queue = self._queue
+        while True:
+            *_, feed, subs, now, enqueued_at = await queue.get()
+            self._stat.dequeued(env.loop.time() - enqueued_at)
+            try:
+                subs = await self._refresh_active_subs(feed, subs)
+                # TIMEOUT starts counting from here, not from being enqueued.
+                _do_monitor_subtask: BatchTimeout[[db.Feed, list[db.Sub], datetime], None]
+                async with self._new_batch_timeout(self._timeout_budget(feed.id)) as _do_monitor_subtask:
+                    _do_monitor_subtask(feed, subs, now, _task_name_suffix=feed.id)
+            finally:
+                queue.task_done()
+            # Do not keep referencing heavy objects while waiting for the next item.
+            del feed, subs, now
+
+    def _get_state_for_feed_id(self, feed_id: int) -> TaskState:
+        return self._subtask_defer_map.get(feed_id, TaskState.EMPTY)
+
+    def _set_state_for_feed_id(self, feed_id: int, task_state: TaskState):
+        if task_state:
+            self._subtask_defer_map[feed_id] = task_state
+        else:
+            self._subtask_defer_map.pop(feed_id, None)
+
     def _lock_feed_id(self, feed_id: int):
         if not self._lock_up_period:  # lock disabled
             return
@@ -178,22 +373,22 @@ class Monitor(Singleton):
         )
 
     def _erase_state_for_feed_id(self, feed_id: int, flag_to_erase: TaskState):
-        task_state = self._subtask_defer_map[feed_id]
+        task_state = self._get_state_for_feed_id(feed_id)
         if not task_state:
             logger.warning(f'Unexpected empty state ({repr(task_state)}): {feed_id}')
             return
         erased_state = task_state & ~flag_to_erase
         if erased_state == TaskState.DEFERRED:  # deferred with any other flag erased, resubmit it
-            self._subtask_defer_map[feed_id] = TaskState.EMPTY
+            del self._subtask_defer_map[feed_id]
             self.submit_feed(feed_id, 'resubmit deferred subtask')
             self._stat.resubmitted()
             logger.debug(f'Resubmitted a deferred subtask ({repr(task_state)}): {feed_id}')
             return
-        self._subtask_defer_map[feed_id] = erased_state  # update the state
+        self._set_state_for_feed_id(feed_id, erased_state)  # update the state
 
     def _defer_feed_id(self, feed_id: int, feed_link: str = None) -> bool:
         feed_description = f'{feed_id}: {feed_link}' if feed_link else str(feed_id)
-        task_state = self._subtask_defer_map[feed_id]
+        task_state = self._get_state_for_feed_id(feed_id)
         if task_state == TaskState.DEFERRED:
             # This should not happen, but just in case.
             logger.warning(f'A deferred subtask ({repr(task_state)}) was never resubmitted: {feed_description}')
@@ -206,44 +401,243 @@ class Monitor(Singleton):
             return True  # deferred, later operations should be skipped
         return False  # not deferred
 
-    def submit_feeds(self, feeds: Iterable[FEED_OR_ID], description: str = ''):
-        self._do_monitor_task_bg_sync(feeds, description)
+    async def _prevalidate_medium(self, medium: Union[Image, Video]):
+        async with self._media_prevalidation_semaphore:
+            try:
+                await medium.validate()
+            except Exception as e:
+                logger.debug(f'Failed to pre-validate medium: {medium.describe}', exc_info=e)
+
+    # Media validation is lazy and happens on the critical path of sending the first message.
+    # Probing media as soon as updates are detected lets the probes overlap with the formatting of posts.
+    # The results are shared via the cache (and single-flight) of web.get_medium_info().
+    @bg
+    async def _prevalidate_media(self, entries: list, feed_link: str):
+        media: dict[str, Union[Image, Video]] = {}
+        for entry in entries:
+            for medium_type, url in extract_media_urls(entry, feed_link):
+                if url not in media:
+                    media[url] = Video(url) if medium_type == 'video' else Image(url)
+            if len(media) >= MEDIA_PREVALIDATION_LIMIT:
+                break
+        if not media:
+            return
+        self._stat.media_prevalidated(len(media))
+        await asyncio.gather(*(
+            self._prevalidate_medium(medium)
+            for medium in islice(media.values(), MEDIA_PREVALIDATION_LIMIT)
+        ))
+
+    _prevalidate_media_bg_sync = _prevalidate_media.bg_sync
+
+    def submit_feeds(self, feeds: Iterable[FEED_OR_ID], description: str = '', urgent: bool = False):
+        """
+        Submit feeds to the monitor.
+
+        :param feeds: Feeds or feed IDs to be monitored
+        :param description: Description of the submission, for debugging
+        :param urgent: If MONITOR_CONCURRENCY is set, jump the queue (e.g., checks triggered by users)
+        """
+        self._do_monitor_task_bg_sync(feeds, description, urgent)
+
+    def submit_feed(self, feed: FEED_OR_ID, description: str = '', urgent: bool = False):
+        self.submit_feeds((feed,), description, urgent)
+
+    def _tick(self):
+        now = time()
+        # Loop lag and load states are measured on the monotonic clock of the loop, immune to wall clock steps.
+        loop_now = env.loop.time()
+        if self._next_tick_at is not None:
+            # How late the event loop is, i.e., loop lag.
+            lag = max(loop_now - self._next_tick_at, 0)
+            self._stat.loop_lagged(lag)
+            self._governor.observe(lag, self._stat.in_progress_count + Notifier.in_progress_count(), loop_now)
+        try:
+            if env.MONITOR_ROLE == 'sender':
+                if not self._draining_outbox:
+                    self._draining_outbox = True
+                    self._drain_outbox_bg_sync()
+                return
+            feed_ids = db.effective_utils.EffectiveTasks.get_tasks(int(now))
+            if feed_ids and self._shard is not None:
+                # Every worker advances the whole wheel to keep the due times in sync, but only submits its own shard.
+                owns = self._shard.owns
+                feed_ids = [feed_id for feed_id in feed_ids if owns(feed_id)]
+            if feed_ids:
+                self.submit_feeds(feed_ids, 'scheduled task')
+        finally:
+            # Align to the beginning of the next second.
+            delay = 1 - now % 1
+            self._next_tick_at = loop_now + delay
+            self._tick_handle = env.loop.call_later(delay, self._tick)
+
+    @bg
+    async def _drain_outbox(self):
+        try:
+            rows = await db.Outbox.all().order_by('id').limit(
+                self._governor.batch_size(OUTBOX_BATCH_SIZE)
+            ).prefetch_related('feed')
+            self._stat.db_queried(2)
+            if not rows:
+                return
+            feed_rows_map: defaultdict[int, list[db.Outbox]] = defaultdict(list)
+            for row in rows:
+                feed_rows_map[row.feed_id].append(row)
+            feed_subs_map = await self._load_active_subs({row.feed for row in rows})
+            # Updates of the same feed are sent in order, while different feeds are sent concurrently.
+            await asyncio.gather(*(
+                self._send_outbox_rows(feed_rows, feed_subs_map.get(feed_id, []))
+                for feed_id, feed_rows in feed_rows_map.items()
+            ))
+            await db.Outbox.filter(id__in=[row.id for row in rows]).delete()
+            self._stat.db_queried()
+        except Exception as e:
+            logger.error('Failed to drain the outbox:', exc_info=e)
+        finally:
+            self._draining_outbox = False
+
+    _drain_outbox_bg_sync = _drain_outbox.bg_sync
+
+    @staticmethod
+    async def _send_outbox_rows(rows: list[db.Outbox], subs: list[db.Sub]):
+        for row in rows:
+            entries, reason, *throttled = pickle.loads(row.payload)
+            overflow, mass_update = throttled or (None, False)  # handed over by an older worker
+            if isinstance(reason, tuple):  # (error_name, status, url) of a web.WebError
+                reason = web.WebError(*reason)
+            try:
+                await Notifier(feed=row.feed, subs=subs, entries=entries, reason=reason,
+                               overflow=overflow, mass_update=mass_update).notify_all()
+            except Exception as e:
+                logger.error(f'Failed to send updates handed over by workers: {row.feed_id}: {row.feed.link}',
+                             exc_info=e)
+
+    async def _notify(self, feed: db.Feed, subs: list[db.Sub], entries: list = None,
+                      reason: Union[web.WebError, str] = None, overflow: list = None, mass_update: bool = False,
+                      polled_at: Optional[float] = None, media_prevalidated: bool = False):
+        if self._shard is None:
+            await Notifier(feed=feed, subs=subs, entries=entries, reason=reason,
+                           overflow=overflow, mass_update=mass_update,
+                           polled_at=polled_at, media_prevalidated=media_prevalidated).notify_all()
+            return
+        # Only the sender holds the bot session, hand it over via the outbox.
+        if isinstance(reason, web.WebError):
+            reason = (reason.error_name, reason.status, reason.url)
+        await db.Outbox.create(
+            feed=feed,
+            payload=pickle.dumps((entries, reason, overflow, mass_update), protocol=pickle.HIGHEST_PROTOCOL),
+        )
+        self._stat.db_queried()
+
+    async def _start_sharded(self):
+        try:
+            await self._shard.start()
+        except Exception as e:
+            logger.critical(f'Failed to join the ring as monitor worker {self._shard.worker_id}:', exc_info=e)
+            raise
+        logger.info(f'Joined the ring as monitor worker {self._shard.worker_id}')
+        if self._tick_handle is None:
+            self._tick()
+
+    def start(self):
+        """
+        Start submitting feeds to the monitor as they are due.
+        """
+        if self._queue is not None and not self._workers and env.MONITOR_ROLE != 'sender':
+            self._workers = [
+                env.loop.create_task(self._monitor_worker(), name=f'monitor_worker_{i}')
+                for i in range(env.MONITOR_CONCURRENCY)
+            ]
+            logger.info(f'Started {len(self._workers)} monitor workers')
+        if self._fetch_worker_client is not None and env.MONITOR_ROLE != 'sender':
+            self._fetch_worker_client.start()
+        if self._shard is not None:
+            env.loop.create_task(self._start_sharded())
+            return
+        if self._tick_handle is None:
+            self._tick()
+
+    def stop(self):
+        if self._tick_handle is not None:
+            self._tick_handle.cancel()
+            self._tick_handle = None
+            self._next_tick_at = None
+        for worker in self._workers:
+            worker.cancel()
+        self._workers.clear()
+        if self._fetch_worker_client is not None:
+            self._fetch_worker_client.stop()
+
+    async def close(self):
+        self.stop()
+        if self._shard is not None:
+            await self._shard.stop()
+
+    def latency_histograms(self) -> dict[str, LatencyHistogram]:
+        """
+        Get per-phase latency histograms of both monitoring and notifying since the last periodical summary.
+        """
+        return {**self._stat.latency_histograms(), **Notifier.latency_histograms()}
 
-    def submit_feed(self, feed: FEED_OR_ID, description: str = ''):
-        self.submit_feeds((feed,), description)
+    def map_sizes(self) -> dict[str, int]:
+        """
+        Get the sizes of long-lived maps keyed by feeds or users, which should not grow with every id ever seen.
+        """
+        return {
+            'task states': len(self._subtask_defer_map),
+            'feed activities': len(self._activity),
+            'user locks': locks.user_lock_count(),
+            **Notifier.map_sizes(),
+        }
 
     async def run_periodic_task(self):
+        self._stat.failing(self._failures.count_failing_feeds(), self._failures.count_failing_hosts())
+        self._stat.map_sized(self.map_sizes())
         self._stat.print_summary()
         Notifier.on_periodic_task()
-        feed_ids_set = db.effective_utils.EffectiveTasks.get_tasks()
-        if not feed_ids_set:
+        if self._shard is not None:
+            # Subscriptions and options are managed by the sender, pick up changes.
+            await db.EffectiveOptions.cache()
+            await db.effective_utils.EffectiveTasks.sync()  # also reloads the sub index
+            await db.FeedStateTable.sync()
+        elif time() - self._sub_index_checked_at >= SUB_INDEX_CHECK_INTERVAL:
+            self._sub_index_checked_at = time()
+            await db.effective_utils.EffectiveTasks.check_sub_index()
+
+    def _defer_adaptively(
+            self,
+            feed_id: int,
+            now: float,
+            new_entry_count: int,
+            entry_timestamps: Optional[tuple[int, ...]] = None,
+    ):
+        self._activity.on_checked(feed_id, now, new_entry_count, entry_timestamps)
+        cap = db.EffectiveOptions.adaptive_interval_cap
+        if cap <= 0:  # disabled
             return
+        effective_tasks = db.effective_utils.EffectiveTasks
+        interval = effective_tasks.get_interval(feed_id)
+        if interval is None:
+            return
+        interval = max(interval, db.EffectiveOptions.minimal_interval) * 60
+        adaptive_interval = self._activity.get_interval(feed_id, now, interval, cap * 60)
+        if (active_window_start := self._activity.get_active_window_start(feed_id, now)) is not None:
+            # Historically dead window, skip polls until the next active window starts.
+            window_interval = min(active_window_start - now, cap * 60)
+            if window_interval > adaptive_interval:
+                effective_tasks.defer(feed_id, now + window_interval)
+                self._stat.window_deferred(ceil(window_interval / interval) - 1)
+                return
+        if adaptive_interval > interval:
+            effective_tasks.defer(feed_id, now + adaptive_interval)
+            self._stat.adaptively_deferred()
 
-        # Assuming the method is called once per minute, let's divide feed_ids into 60 chunks and submit one by one
-        # every second.
-        feed_ids: list[int] = list(feed_ids_set)
-        feed_count = len(feed_ids)
-        chunk_count = 60
-        larger_chunk_count = feed_count % chunk_count
-        smaller_chunk_size = feed_count // chunk_count
-        smaller_chunk_count = chunk_count - larger_chunk_count
-        larger_chunk_size = smaller_chunk_size + 1
-        pos = 0
-        for delay, count in enumerate(chain(
-                repeat(larger_chunk_size, larger_chunk_count),
-                repeat(smaller_chunk_size, smaller_chunk_count)
-        )):
-            if count == 0:
-                break
-            env.loop.call_later(delay, self.submit_feeds, feed_ids[pos:pos + count], 'periodic task')
-            pos += count
-        assert pos == feed_count
-
-    async def _do_monitor_a_feed(self, feed: db.Feed, now: datetime):
+    async def _do_monitor_a_feed(self, feed: db.Feed, subs: list[db.Sub], now: datetime):
         """
         Monitor the update of a feed.
 
         :param feed: Feed object to be monitored
+        :param subs: Active subs of the feed, with their users prefetched
         :param now: A datetime object representing the current time
         :return: None
         """
@@ -252,7 +646,6 @@ class Monitor(Singleton):
             stat.skipped()
             return  # skip this monitor task
 
-        subs = await feed.subs.filter(state=1)
         if not subs:  # nobody has subbed it
             logger.warning(f'Feed {feed.id} ({feed.link}) has no active subscribers.')
             await inner.utils.update_interval(feed)
@@ -263,82 +656,137 @@ class Monitor(Singleton):
             stat.skipped()
             return  # all subscribers are experiencing flood wait, skip this monitor task
 
+        if (host_retry_at := self._failures.host_retry_at(feed.link, now.timestamp())) is not None:
+            # The host is failing, do not count it against the feed.
+            db.effective_utils.EffectiveTasks.defer(feed.id, host_retry_at)
+            stat.host_deferred()
+            stat.skipped()
+            return
+
+        polled_at = env.loop.time()  # time to first message is measured from here
         headers = {
             'If-Modified-Since': format_datetime(feed.last_modified or feed.updated_at)
         }
         if feed.etag:
             headers['If-None-Match'] = feed.etag
 
-        wf = await web.feed_get(feed.link, headers=headers, verbose=False)
-        rss_d = wf.rss_d
+        fetched = await (
+            self._fetch_worker_client.fetch_and_diff
+            if self._fetch_worker_client is not None
+            else fetch_and_diff
+        )(feed.link, headers, feed.packed_entry_hashes, feed.entry_hashes, now)
+        stat.fetched(fetched.fetch_time, fetched.parse_time, fetched.diff_time)
 
         new_error_count = 0
+        new_entry_count = 0
         new_next_check_time: Optional[datetime] = None  # clear next_check_time by default
         feed_updated_fields: set[str] = set()
+        write_through = False
+        media_prevalidated = False
         try:
-            if wf.status == 304:  # cached
+            if fetched.status == 304:  # cached
                 logger.debug(f'Fetched (not updated, cached): {feed.link}')
                 stat.cached()
                 return
 
-            if rss_d is None:  # error occurred
-                new_error_count = feed.error_count + 1
-                if new_error_count >= 100:
+            if fetched.error is not None:  # error occurred
+                failure_class = fetched.error.failure_class
+                if failure_class is web.FailureClass.HOST:
+                    # Counted against the host instead, which holds back all feeds on it, see FeedFailureTracker.
+                    # Otherwise, a short outage of a host would deactivate all feeds on it.
+                    new_error_count = feed.error_count
+                    deactivate = self._failures.is_host_dead(feed.link, now.timestamp())
+                else:
+                    new_error_count = feed.error_count + 1
+                    deactivate = new_error_count >= 100
+                if deactivate:
                     logger.error(
-                        f'Deactivated due to too many ({new_error_count}) errors (current: {wf.error}): {feed.link}'
+                        f'Deactivated due to too many ({new_error_count}) errors or a long outage of the host '
+                        f'(current: {fetched.error}): {feed.link}'
                     )
-                    await Notifier(feed=feed, subs=subs, reason=wf.error).notify_all()
-                    stat.failed()
+                    self._failures.forget(feed.id)
+                    await self._notify(feed, subs, reason=fetched.error)
+                    stat.failed(failure_class)
                     return
-                if new_error_count >= 10:  # too much error, defer next check
-                    interval = feed.interval or db.EffectiveOptions.default_interval
-                    # Equals: interval * (2 ** exp), clamp to 1 day
-                    next_check_delay = min(interval << (new_error_count // 10), 1440)
-                    new_next_check_time = now + timedelta(minutes=next_check_delay)
+                timestamp = now.timestamp()
+                retry_at = self._failures.on_failed(
+                    feed.id,
+                    feed.link,
+                    failure_class,
+                    new_error_count,
+                    feed.interval or db.EffectiveOptions.default_interval,
+                    timestamp,
+                    db.effective_utils.EffectiveTasks.get_weight_tier(feed.id),
+                )
+                if retry_at is not None:  # back off
+                    new_next_check_time = now + timedelta(seconds=retry_at - timestamp)
                 logger.log(
                     logging.WARNING
-                    if new_error_count % 20 == 0
+                    if new_error_count % 20 == 0 and failure_class is not web.FailureClass.HOST
                     else logging.DEBUG,
-                    f'Fetch failed ({new_error_count}th retry, {wf.error}): {feed.link}',
+                    f'Fetch failed ({new_error_count}th retry, {failure_class.value}, {fetched.error}): {feed.link}',
                 )
-                stat.failed()
+                stat.failed(failure_class)
                 return
 
-            wr = wf.web_response
-            assert wr is not None
-            wr.now = now
-
             # Update even when etag is None, allowing clearing etag when the server no longer sends it.
-            if (etag := wr.etag) != feed.etag:
+            if (etag := fetched.etag) != feed.etag:
                 feed.etag = etag
                 feed_updated_fields.add('etag')
 
-            new_next_check_time = wf.calc_next_check_as_per_server_side_cache()
+            new_next_check_time = fetched.next_check_time
 
-            if not rss_d.entries:  # empty
+            if fetched.title is None:  # empty
                 logger.debug(f'Fetched (not updated, empty): {feed.link}')
                 stat.empty()
                 return
 
-            title = rss_d.feed.title
-            title = await ensure_plain(title) if title else ''
+            title = fetched.title
             if title != feed.title:
                 logger.debug(f'Feed title changed ({feed.title} -> {title}): {feed.link}')
                 feed.title = title
                 feed_updated_fields.add('title')
 
-            new_hashes, updated_entries = inner.utils.calculate_update(feed.entry_hashes, rss_d.entries)
-            updated_entries = list(updated_entries)
+            updated_entries = fetched.updated_entries
 
             if not updated_entries:  # not updated
+                if feed.entry_hashes is not None and (  # legacy hashes, convert them anyway
+                        fetched.legacy_hashes != feed.entry_hashes or fetched.new_hashes != feed.packed_entry_hashes
+                ):
+                    feed.packed_entry_hashes = fetched.new_hashes
+                    feed.entry_hashes = fetched.legacy_hashes
+                    feed_updated_fields.update({'packed_entry_hashes', 'entry_hashes'})
                 logger.debug(f'Fetched (not updated): {feed.link}')
                 stat.not_updated()
                 return
 
             logger.debug(f'Updated: {feed.link}')
-            feed.last_modified = wr.last_modified
-            feed.entry_hashes = list(islice(new_hashes, max(len(rss_d.entries) * 2, 100))) or None
-            feed_updated_fields.update({'last_modified', 'entry_hashes'})
+            new_entry_count = len(updated_entries)
+
+            throttled = throttle_update(updated_entries, fetched.entry_count)
+            updated_entries = throttled.entries
+            if throttled.overflow:
+                overflow_count = len(throttled.overflow)
+                if throttled.mass_update:
+                    logger.warning(f'Mass update ({new_entry_count} of {fetched.entry_count} entries are new, '
+                                   f'{"summarized" if throttled.summarize else "dropped"}): {feed.link}')
+                else:
+                    logger.info(f'Throttled ({overflow_count} of {new_entry_count} new entries '
+                                f'{"summarized" if throttled.summarize else "dropped"}): {feed.link}')
+                stat.throttled(overflow_count, throttled.mass_update, throttled.summarize)
+
+            # Media are validated by the sender, pre-validating them in a worker is pointless.
+            # It is also paused while shedding load.
+            if not (env.LAZY_MEDIA_VALIDATION or env.TRAFFIC_SAVING or self._shard is not None
+                    or self._governor.shedding):
+                self._prevalidate_media_bg_sync(updated_entries, feed.link)
+                media_prevalidated = True
+
+            feed.last_modified = fetched.last_modified
+            feed.packed_entry_hashes = fetched.new_hashes
+            feed.entry_hashes = fetched.legacy_hashes
+            feed_updated_fields.update({'last_modified', 'packed_entry_hashes', 'entry_hashes'})
+            write_through = True
         finally:
             if feed.error_count != new_error_count:
                 feed.error_count = new_error_count
@@ -348,17 +796,35 @@ class Monitor(Singleton):
                 feed.next_check_time = new_next_check_time
                 feed_updated_fields.add('next_check_time')
 
-            if new_error_count == 0 and wf.url != feed.link:
-                new_url_feed = await inner.sub.migrate_to_new_url(feed, wf.url)
+            if new_next_check_time:
+                # Do not let the scheduler submit it again before it is really due.
+                db.effective_utils.EffectiveTasks.defer(feed.id, new_next_check_time.timestamp())
+
+            if fetched.error is None:
+                self._failures.on_succeeded(feed.id, feed.link)
+                self._defer_adaptively(feed.id, now.timestamp(), new_entry_count, fetched.entry_timestamps)
+
+            if fetched.error is None and fetched.url != feed.link:
+                new_url_feed = await inner.sub.migrate_to_new_url(feed, fetched.url)
                 if isinstance(new_url_feed, db.Feed):
                     feed = new_url_feed
                     # Update has been done during the migration, skip it.
                     feed_updated_fields.clear()
 
             if feed_updated_fields:
-                await feed.save(update_fields=feed_updated_fields)
+                if write_through:
+                    # New entries are about to be sent, persist their hashes first, or they would be sent again if
+                    # the process died before the next flush.
+                    await db.FeedWriteBehind.save(feed, feed_updated_fields)
+                else:
+                    # Buffered and flushed in bulk, so that subtasks are not serialized on the DB writer lock.
+                    db.FeedWriteBehind.update(feed, feed_updated_fields)
 
         updated_entries.reverse()  # send the earliest entry first
-        await Notifier(feed=feed, subs=subs, entries=updated_entries).notify_all()
+        overflow = throttled.overflow if throttled.summarize else None
+        if updated_entries or overflow:
+            await self._notify(feed, subs, entries=updated_entries, overflow=overflow,
+                               mass_update=throttled.mass_update,
+                               polled_at=polled_at, media_prevalidated=media_prevalidated)
         stat.updated()
         return
@@ -19,21 +19,24 @@ from typing import Sequence, MutableMapping, Union, Final, ClassVar, Optional, A
 
 import asyncio
 from collections import defaultdict, Counter
+from time import perf_counter, time
 from telethon.errors import BadRequestError
 from traceback import format_exc
 
-from ._common import logger, TIMEOUT
-from ._stat import NotifierStat
-from .. import db, env, web
+from ._common import logger, TIMEOUT, USER_BLOCKED_TTL, DIGEST_BACKLOG_THRESHOLD
+from ._stat import NotifierStat, LatencyHistogram
+from ._throttle import OVERFLOW_SUMMARY_LIMIT
+from .. import db, env, web, locks
 from ..command import inner
 from ..command.utils import unsub_all_and_leave_chat, escape_html
 from ..compat import nullcontext
 from ..errors_collection import EntityNotFoundError, UserBlockedErrors
 from ..helpers.bg import bg
+from ..helpers.weak_bucket import WeakBucket
 from ..helpers.pipeline import SameFuncPipelineContextManager, StopPipeline
 from ..helpers.timeout import BatchTimeout
 from ..i18n import i18n
-from ..parsing.post import get_post_from_entry, Post
+from ..parsing.post import get_post_from_entry, Post, Digest
 
 null_ctx_obj: Final[nullcontext] = nullcontext()
 
@@ -41,9 +44,9 @@ null_ctx_obj: Final[nullcontext] = nullcontext()
 class Notifier:
     _stat: ClassVar[NotifierStat] = NotifierStat()
 
-    # it may cause memory leak, but they are too small that leaking thousands of that is still not a big deal!
-    _user_unsub_all_lock_bucket: ClassVar[dict[int, asyncio.Lock]] = defaultdict(asyncio.Lock)
+    _user_unsub_all_lock_bucket: ClassVar[WeakBucket[int, asyncio.Lock]] = WeakBucket(asyncio.Lock)
     _user_blocked_counter: ClassVar[Counter] = Counter()
+    _user_blocked_at: ClassVar[dict[int, float]] = {}  # key: user id, value: when the user was blocked last time
 
     def __init__(
             self,
@@ -51,15 +54,28 @@ class Notifier:
             subs: Sequence[db.Sub],
             entries: Optional[Sequence[MutableMapping]] = None,
             reason: Optional[Union[web.WebError, str]] = None,
+            overflow: Optional[Sequence[MutableMapping]] = None,
+            mass_update: bool = False,
+            polled_at: Optional[float] = None,
+            media_prevalidated: bool = False,
     ):
+        """
+        :param polled_at: loop time when the poll finding the update started, defaults to now
+        :param media_prevalidated: whether media of the entries have been pre-validated in the background
+        """
         if entries is not None and reason is not None:
             raise ValueError('entries and reason cannot be set at the same time')
+        if overflow and reason is not None:
+            raise ValueError('overflow and reason cannot be set at the same time')
         self._feed: Final[db.Feed] = feed
         self._subs: Final[set[db.Sub]] = set(subs)
         self._entries: Final[Optional[Sequence[MutableMapping]]] = entries
         self._reason: Final[Optional[Union[web.WebError, str]]] = reason
+        self._overflow: Final[Optional[Sequence[MutableMapping]]] = overflow or None  # collapsed into a summary
+        self._mass_update: Final[bool] = mass_update
 
         self._entry_count: Final[int] = len(entries) if entries is not None else 0
+        self._overflow_summary_body: dict[str, str] = {}  # key: lang, value: summary body
         self._sub_count: Final[int] = len(subs)
         self._cached_posts: dict[int, Union[Post, None, False]] = {}
         self._posts_got_counter: Final[Counter] = Counter()
@@ -72,6 +88,9 @@ class Notifier:
         )
 
         self._raise_stop_pipeline_after_leave_chat: bool = False
+        self._polled_at: Final[float] = env.loop.time() if polled_at is None else polled_at
+        self._media_prevalidated: Final[bool] = media_prevalidated
+        self._first_message_sent: bool = False
 
     def _describe_subtask(self, sub: db.Sub, *_, **__) -> str:
         return f'{sub.id} (feed: {sub.feed_id}, user: {sub.user_id}): {self._feed.link}'
@@ -127,7 +146,32 @@ class Notifier:
 
     @classmethod
     def on_periodic_task(cls):
+        cls._stat.rate_limited(**locks.pop_rate_limit_stats())
+        cls._stat.outbound_queued(*locks.outbound_queue_stats())
         cls._stat.print_summary()
+        locks.prune_rate_limit_buckets()
+        # Users not blocking the bot again for so long are not considered having blocked it.
+        expired_before = time() - USER_BLOCKED_TTL
+        user_blocked_at = cls._user_blocked_at
+        for user_id in tuple(user_id for user_id, blocked_at in user_blocked_at.items() if blocked_at < expired_before):
+            del user_blocked_at[user_id]
+            del cls._user_blocked_counter[user_id]
+
+    @classmethod
+    def in_progress_count(cls) -> int:
+        return cls._stat.in_progress_count
+
+    @classmethod
+    def map_sizes(cls) -> dict[str, int]:
+        return {
+            'unsub locks': len(cls._user_unsub_all_lock_bucket),
+            'blocked users': len(cls._user_blocked_counter),
+            'rate limit buckets': locks.rate_limit_bucket_count(),
+        }
+
+    @classmethod
+    def latency_histograms(cls) -> dict[str, LatencyHistogram]:
+        return cls._stat.latency_histograms()
 
     async def _get_post(self, idx: int) -> Union[Post, None, False]:
         if (cached := self._cached_posts.get(idx)) is not None:
@@ -138,8 +182,10 @@ class Notifier:
         feed = self._feed
         entry = self._entries[idx]
         link = entry.get('link')
+        parse_start = perf_counter()
         try:
             post = await get_post_from_entry(entry, feed.title, feed.link)
+            self._stat.observe_latency('post_parse', perf_counter() - parse_start)
         except Exception as e:
             logger.error(f'Failed to parse the post {link} (feed: {feed.link}) from entry:', exc_info=e)
             try:
@@ -162,19 +208,91 @@ class Notifier:
             self._cached_posts[idx] = post
             return post
 
+    def _get_overflow_summary_body(self, lang: Optional[str]) -> str:
+        if (cached := self._overflow_summary_body.get(lang)) is not None:
+            return cached
+        overflow = self._overflow
+        overflow_count = len(overflow)
+        if self._mass_update:
+            body = i18n[lang]['mass_update_warn'] % overflow_count
+        else:
+            body = '\n'.join((
+                i18n[lang]['update_overflow_summary'] % overflow_count,
+                *(
+                    f'- <a href="{escape_html(entry.get("link") or self._feed.link)}">'
+                    f'{escape_html(entry.get("title") or entry.get("link") or "#")}</a>'
+                    for entry in overflow[:OVERFLOW_SUMMARY_LIMIT]
+                ),
+                *(('...',) if overflow_count > OVERFLOW_SUMMARY_LIMIT else ()),
+            ))
+        self._overflow_summary_body[lang] = body
+        return body
+
+    async def _notify_sub_with_overflow_summary(self, sub: db.Sub) -> None:
+        if not isinstance(sub.user, db.User):  # not prefetched
+            await sub.fetch_related('user')
+        feed = self._feed
+        await self._do_send(
+            sub,
+            f'<a href="{escape_html(feed.link)}">{escape_html(sub.title or feed.title)}</a>\n'
+            + self._get_overflow_summary_body(sub.user.lang),
+        )
+
     async def _notify_sub_with_entry_idx(self, idx: int, sub: db.Sub) -> None:
+        if idx == self._entry_count:  # the overflow summary comes last
+            await self._notify_sub_with_overflow_summary(sub)
+            return
         async with self._get_post_lock[idx]:
             post = await self._get_post(idx)
         if post:
             await self._do_send(sub, post)
 
+    def _should_digest(self, sub: db.Sub) -> bool:
+        if self._entry_count <= 1:
+            return False
+        digest = sub.digest
+        if digest == -100:
+            if not isinstance(sub.user, db.User):  # not prefetched, digest disabled by default
+                return False
+            digest = sub.user.digest
+        if digest != 1:
+            return False
+        # the backlog of the chat: posts still queued for it and posts of this update
+        return locks.user_outbound_queue_depth(sub.user_id) + self._entry_count > DIGEST_BACKLOG_THRESHOLD
+
+    async def _notify_sub_with_digest(self, sub: db.Sub) -> None:
+        posts: list[Post] = []
+        for idx in range(self._entry_count):
+            try:
+                async with self._get_post_lock[idx]:
+                    post = await self._get_post(idx)
+            finally:
+                self._on_notify_sub_with_entry_idx_finish(None, idx)
+            if post:
+                posts.append(post)
+        if posts:
+            if not isinstance(sub.user, db.User):  # not prefetched
+                await sub.fetch_related('user')
+            feed = self._feed
+            await self._do_send(
+                sub,
+                Digest(posts, i18n[sub.user.lang]['digest_header'] % len(posts), feed.title, feed.link),
+            )
+            self._stat.digest_sent(len(posts))
+        if self._overflow is not None:
+            await self._notify_sub_with_overflow_summary(sub)
+
     async def _notify_sub(self, sub: db.Sub) -> None:
+        if self._should_digest(sub):
+            await self._notify_sub_with_digest(sub)
+            self._subs.discard(sub)
+            return
         async with SameFuncPipelineContextManager[[int, db.Sub], None](
                 func=self._notify_sub_with_entry_idx,
                 on_success=self._on_notify_sub_with_entry_idx_finish,
                 on_error=self._on_notify_sub_with_entry_idx_error,
         ) as _notify_sub_with_entry_idx:
-            for idx in range(self._entry_count):
+            for idx in range(self._entry_count + (self._overflow is not None)):
                 _notify_sub_with_entry_idx(idx, sub)
         # Release references so that it can be garbage collected while some other subs are being notified.
         self._subs.discard(sub)
@@ -260,14 +378,16 @@ class Notifier:
 
         logger.debug(f'Deactivated {sub_count} subs: {feed_description}')
 
-    async def _do_send(self, sub: db.Sub, post: Union[str, Post]) -> None:
+    async def _do_send(self, sub: db.Sub, post: Union[str, Post, Digest]) -> None:
         self._stat.start()
+        send_start = perf_counter()
         try:
             await self._send(sub, post)
+            self._stat.observe_latency('send', perf_counter() - send_start)
         finally:
             self._stat.finish()
 
-    async def _send(self, sub: db.Sub, post: Union[str, Post]) -> None:
+    async def _send(self, sub: db.Sub, post: Union[str, Post, Digest]) -> None:
         user_id = sub.user_id
         try:
             try:
@@ -282,6 +402,9 @@ class Notifier:
                     await env.bot.send_message(user_id, post, parse_mode='html', silent=not sub.notify)
                     return None
                 await post.send_formatted_post_according_to_sub(sub)
+                if not self._first_message_sent:
+                    self._first_message_sent = True
+                    self._stat.first_message_sent(env.loop.time() - self._polled_at, self._media_prevalidated)
                 if self._user_blocked_counter[user_id]:  # reset the counter if success
                     del self._user_blocked_counter[user_id]
             except UserBlockedErrors as e:
@@ -290,6 +413,9 @@ class Notifier:
                 if e.message == 'TOPIC_CLOSED':
                     return await self._locked_unsub_all_and_leave_chat(user_id=user_id, err_msg=e.message)
         except Exception as e:
+            if isinstance(post, str):  # e.g., an overflow summary, which has no link to report
+                logger.error(f'Failed to send a message (feed: {self._feed.link}, user: {sub.user_id}):', exc_info=e)
+                return None
             logger.error(f'Failed to send {post.link} (feed: {post.feed_link}, user: {sub.user_id}):', exc_info=e)
             try:
                 error_message = Post(
@@ -321,9 +447,11 @@ class Notifier:
         async with user_unsub_all_lock:
             if self._user_blocked_counter[user_id] < 5:
                 self._user_blocked_counter[user_id] += 1
+                self._user_blocked_at[user_id] = time()
                 return  # skip once
             # fail for 5 times, consider been banned
             del self._user_blocked_counter[user_id]
+            self._user_blocked_at.pop(user_id, None)
             logger.error(f'User blocked ({err_msg}): {user_id}')
             await unsub_all_and_leave_chat(user_id)
             if self._raise_stop_pipeline_after_leave_chat:
@@ -0,0 +1,145 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Optional, Final
+from collections.abc import Iterable
+
+import asyncio
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+from hashlib import blake2b
+
+from ._common import logger
+from .. import db, env
+
+VIRTUAL_NODES: Final[int] = 64  # per worker
+LEASE_TTL: Final[timedelta] = timedelta(seconds=30)
+LEASE_RENEW_PERIOD: Final[float] = 10  # seconds
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    A consistent hash ring. When a member joins or leaves, only the keys owned by it are moved.
+    """
+
+    def __init__(self, members: Iterable[str], virtual_nodes: int = VIRTUAL_NODES):
+        self.members: Final[frozenset[str]] = frozenset(members)
+        points = sorted((_hash(f'{member}#{i}'), member) for member in self.members for i in range(virtual_nodes))
+        self._hashes: Final[list[int]] = [h for h, _ in points]
+        self._owners: Final[list[str]] = [member for _, member in points]
+
+    def owner(self, key: int) -> Optional[str]:
+        if not self._hashes:
+            return None
+        return self._owners[bisect(self._hashes, _hash(str(key))) % len(self._hashes)]
+
+
+class ShardCoordinator:
+    """
+    Shard feeds among monitor workers sharing the same DB.
+
+    Each worker keeps a lease row alive. Live workers form a consistent hash ring, and each of them only monitors the
+    feeds it owns. Shards are rebalanced once a worker joins, leaves, or has its lease expired.
+    A worker whose own lease has expired (i.e., failed to renew it in time) owns nothing until it renews the lease,
+    since other workers may have taken its shard over.
+    """
+
+    def __init__(self, worker_id: str):
+        self.worker_id: Final[str] = worker_id
+        self._ring: HashRing = HashRing(())
+        self._task: Optional[asyncio.Task] = None
+        self._expires_at: float = 0  # monotonic, when the lease renewed last time expires
+
+    @property
+    def lease_valid(self) -> bool:
+        return env.loop.time() < self._expires_at
+
+    def owns(self, feed_id: int) -> bool:
+        return self.lease_valid and self._ring.owner(feed_id) == self.worker_id
+
+    async def _heartbeat(self):
+        # Count the TTL from before the renewal, so that the lease never outlives what other workers see in the DB.
+        renewing_at = env.loop.time()
+        now = datetime.now(timezone.utc)
+        await db.Lease.update_or_create(defaults={'expires_at': now + LEASE_TTL}, worker_id=self.worker_id)
+        lease_was_valid = self.lease_valid
+        self._expires_at = renewing_at + LEASE_TTL.total_seconds()
+        await db.Lease.filter(expires_at__lt=now).delete()
+        members = set(await db.Lease.all().values_list('worker_id', flat=True))
+        members.add(self.worker_id)
+        old_ring = self._ring
+        if members != old_ring.members:
+            logger.info(f'Rebalanced shards among {len(members)} workers: {", ".join(sorted(members))}')
+            self._ring = HashRing(members)
+        if old_ring.members:  # not the first heartbeat
+            if not lease_was_valid:
+                logger.info(f'Renewed the expired lease of monitor worker {self.worker_id}, resuming monitoring')
+                # Other workers may have taken the whole shard over while the lease was expired.
+                self._invalidate_taken_over(HashRing(()))
+            elif self._ring is not old_ring:
+                self._invalidate_taken_over(old_ring)
+
+    def _invalidate_taken_over(self, old_ring: HashRing):
+        # Feeds taken over from other workers may have been changed by them, drop their (possibly stale) states so
+        # that they are loaded from the DB next time they are monitored.
+        worker_id = self.worker_id
+        taken_over = [
+            feed_id
+            for feed_id in db.FeedStateTable.ids()
+            if self._ring.owner(feed_id) == worker_id and old_ring.owner(feed_id) != worker_id
+        ]
+        for feed_id in taken_over:
+            db.FeedStateTable.delete(feed_id)
+        if taken_over:
+            logger.debug(f'Invalidated states of {len(taken_over)} feeds taken over from other workers')
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(LEASE_RENEW_PERIOD)
+            try:
+                await self._heartbeat()
+            except Exception as e:
+                logger.warning(f'Failed to renew the lease of monitor worker {self.worker_id}:', exc_info=e)
+                if not self.lease_valid:
+                    logger.error(f'The lease of monitor worker {self.worker_id} has expired, '
+                                 f'pausing monitoring until it is renewed')
+
+    async def start(self):
+        """
+        Acquire a lease and join the ring. Feeds are only monitored after the first heartbeat succeeds.
+        """
+        await self._heartbeat()
+        if self._task is None:
+            self._task = env.loop.create_task(self._run())
+
+    async def stop(self):
+        """
+        Leave the ring by releasing the lease, so that other workers take over the shard immediately.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._ring = HashRing(())
+        self._expires_at = 0
+        try:
+            await db.Lease.filter(worker_id=self.worker_id).delete()
+        except Exception as e:
+            logger.warning(f'Failed to release the lease of monitor worker {self.worker_id}:', exc_info=e)
@@ -15,15 +15,18 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
-from typing import Optional, ClassVar, TypeVar, Generic
+from typing import Optional, ClassVar, TypeVar, Generic, Final
 
 import gc
 import logging
 from abc import ABC, abstractmethod
+from bisect import bisect_left
 from collections import Counter
+from math import ceil, inf, nan
 
-from ._common import logger, TIMEOUT
+from ._common import logger, TIMEOUT, LOOP_LAG_SPIKE_THRESHOLD
 from .. import env
+from ..web import FailureClass
 
 
 def _gen_property(key: str):
@@ -47,9 +50,52 @@ class StatCounter(Counter[str, int]):
 
 StatCounterT_co = TypeVar('StatCounterT_co', bound=StatCounter, covariant=True)
 
+# Upper bounds (in seconds) of latency histogram buckets. An extra bucket holds anything longer.
+LATENCY_BUCKETS: Final[tuple[float, ...]] = (
+    0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 60, 120, 300,
+)
+DAILY_REPORT_PERIOD: Final[int] = 24 * 60 * 60  # seconds
+
+
+class LatencyHistogram:
+    """
+    A latency histogram with fixed buckets (see `LATENCY_BUCKETS`).
+    """
+    __slots__ = ('counts',)
+
+    def __init__(self, counts: Optional[list[int]] = None):
+        self.counts: list[int] = counts if counts is not None else [0] * (len(LATENCY_BUCKETS) + 1)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, p: float) -> float:
+        """
+        :param p: percentile (0-100)
+        :return: the upper bound of the bucket where the percentile falls, `inf` if beyond all buckets, `nan` if empty
+        """
+        total = self.count
+        if not total:
+            return nan
+        rank = max(ceil(total * p / 100), 1)
+        cumulative = 0
+        for upper_bound, count in zip(LATENCY_BUCKETS + (inf,), self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return upper_bound
+        return inf
+
+    @staticmethod
+    def describe_bound(seconds: float) -> str:
+        if seconds == inf:
+            return f'>{LATENCY_BUCKETS[-1]}s'
+        return f'{seconds * 1000:.0f}ms' if seconds < 1 else f'{seconds:g}s'
+
 
 class Stat(ABC, Generic[StatCounterT_co]):
     _do_gc_after_summarizing_tier2: ClassVar[bool] = False
+    _latency_phases: ClassVar[tuple[str, ...]] = ()  # phases described in summaries, in order
 
     def __init__(self, _bound_counter_cls: type[StatCounterT_co] = StatCounter):
         self._bound_counter_cls = _bound_counter_cls
@@ -62,6 +108,10 @@ class Stat(ABC, Generic[StatCounterT_co]):
         # No need to set _tier2_summary_period since _counter_tier2 is unconditionally summarized in print_summary.
         self._in_progress_count: int = 0
 
+    @property
+    def in_progress_count(self) -> int:
+        return self._in_progress_count
+
     def start(self):
         self._in_progress_count += 1
 
@@ -81,6 +131,35 @@ class Stat(ABC, Generic[StatCounterT_co]):
     def timeout_unknown_error(self):
         self._counter_tier2['timeout_unknown_error'] += 1
 
+    def observe_latency(self, phase: str, seconds: float):
+        # Stored in the counter so that it is merged into tier 1 and cleared along with other counts.
+        self._counter_tier2[f'latency_{phase}_{bisect_left(LATENCY_BUCKETS, seconds)}'] += 1
+
+    @staticmethod
+    def _latency_histogram(counter: StatCounterT_co, phase: str) -> LatencyHistogram:
+        return LatencyHistogram([counter[f'latency_{phase}_{i}'] for i in range(len(LATENCY_BUCKETS) + 1)])
+
+    def latency_histograms(self) -> dict[str, LatencyHistogram]:
+        """
+        Get latency histograms of all phases since the last periodical summary.
+
+        :return: a `dict` whose keys are phases and values are `LatencyHistogram` objects
+        """
+        counter = self._counter_tier1 + self._counter_tier2
+        return {phase: self._latency_histogram(counter, phase) for phase in self._latency_phases}
+
+    def _describe_latency(self, counter: StatCounterT_co) -> str:
+        described = []
+        describe_bound = LatencyHistogram.describe_bound
+        for phase in self._latency_phases:
+            histogram = self._latency_histogram(counter, phase)
+            if not (count := histogram.count):
+                continue
+            described.append(
+                f'{phase} {"/".join(describe_bound(histogram.percentile(p)) for p in (50, 95, 99))} of {count}'
+            )
+        return f'latency p50/p95/p99({", ".join(described)})' if described else ''
+
     def _describe_in_progress(self) -> str:
         return f'in progress({self._in_progress_count})' if self._in_progress_count else ''
 
@@ -142,6 +221,25 @@ class MonitorCounter(StatCounter):
     skipped: int = _gen_property('skipped')
     deferred: int = _gen_property('deferred')
     resubmitted: int = _gen_property('resubmitted')
+    media_prevalidated: int = _gen_property('media_prevalidated')
+    adaptively_deferred: int = _gen_property('adaptively_deferred')
+    window_deferred: int = _gen_property('window_deferred')
+    shed: int = _gen_property('shed')
+    polls_saved: int = _gen_property('polls_saved')
+    host_deferred: int = _gen_property('host_deferred')
+    throttled_updates: int = _gen_property('throttled_updates')
+    mass_updates: int = _gen_property('mass_updates')
+    summarized_entries: int = _gen_property('summarized_entries')
+    dropped_entries: int = _gen_property('dropped_entries')
+    dequeued: int = _gen_property('dequeued')
+    queue_wait_ms: int = _gen_property('queue_wait_ms')
+    db_queries: int = _gen_property('db_queries')
+    db_flushes: int = _gen_property('db_flushes')
+    db_flushed_feeds: int = _gen_property('db_flushed_feeds')
+    db_flush_ms: int = _gen_property('db_flush_ms')
+    loop_lag_samples: int = _gen_property('loop_lag_samples')
+    loop_lag_ms: int = _gen_property('loop_lag_ms')
+    loop_lag_spikes: int = _gen_property('loop_lag_spikes')
 
 
 MonitorCounterT_co = TypeVar('MonitorCounterT_co', bound=MonitorCounter, covariant=True)
@@ -149,9 +247,25 @@ MonitorCounterT_co = TypeVar('MonitorCounterT_co', bound=MonitorCounter, covaria
 
 class MonitorStat(Stat[MonitorCounterT_co]):
     _do_gc_after_summarizing_tier2 = True
+    _latency_phases = ('queue_wait', 'fetch', 'parse', 'diff', 'db_save')
 
     def __init__(self, _bound_counter_cls: type[MonitorCounterT_co] = MonitorCounter):
         super().__init__(_bound_counter_cls=_bound_counter_cls)
+        self._queued_count: int = 0
+        self._failing_feeds: Counter[FailureClass] = Counter()
+        self._failing_hosts: int = 0
+        self._map_sizes: dict[str, int] = {}
+        self._daily_report_start_time: Optional[float] = None
+        self._polls_saved_in_day: int = 0
+
+    def enqueued(self):
+        self._queued_count += 1
+
+    def dequeued(self, wait: float):
+        self._queued_count -= 1
+        self._counter_tier2['dequeued'] += 1
+        self._counter_tier2['queue_wait_ms'] += round(wait * 1000)
+        self.observe_latency('queue_wait', wait)
 
     def not_updated(self):
         self._counter_tier2['not_updated'] += 1
@@ -164,12 +278,55 @@ class MonitorStat(Stat[MonitorCounterT_co]):
         self._counter_tier2['empty'] += 1
         self.not_updated()
 
-    def failed(self):
+    def failed(self, failure_class: FailureClass):
         self._counter_tier2['failed'] += 1
+        self._counter_tier2[f'failed_{failure_class.value}'] += 1
+
+    def host_deferred(self):
+        self._counter_tier2['host_deferred'] += 1
+
+    def failing(self, feeds: Counter[FailureClass], hosts: int):
+        self._failing_feeds = feeds
+        self._failing_hosts = hosts
+
+    def map_sized(self, sizes: dict[str, int]):
+        self._map_sizes = sizes
+
+    def _describe_map_sizes(self) -> str:
+        if not self._map_sizes:
+            return ''
+        return f'map sizes({", ".join(f"{name} {size}" for name, size in self._map_sizes.items())})'
+
+    @staticmethod
+    def _describe_failed(counter: MonitorCounterT_co) -> str:
+        if not counter.failed:
+            return ''
+        return f'fetch failed({counter.failed}: ' + ', '.join(
+            f'{failure_class.value} {count}'
+            for failure_class in FailureClass
+            if (count := counter[f'failed_{failure_class.value}'])
+        ) + ')'
+
+    def _describe_failing(self) -> str:
+        return ', '.join(filter(None, (
+            'failing feeds(' + ', '.join(
+                f'{failure_class.value} {count}'
+                for failure_class in FailureClass
+                if (count := self._failing_feeds[failure_class])
+            ) + ')'
+            if self._failing_feeds
+            else '',
+            f'failing hosts({self._failing_hosts})' if self._failing_hosts else '',
+        )))
 
     def updated(self):
         self._counter_tier2['updated'] += 1
 
+    def fetched(self, fetch_time: Optional[float], parse_time: Optional[float], diff_time: Optional[float]):
+        for phase, duration in (('fetch', fetch_time), ('parse', parse_time), ('diff', diff_time)):
+            if duration is not None:
+                self.observe_latency(phase, duration)
+
     def skipped(self):
         self._counter_tier2['skipped'] += 1
 
@@ -179,11 +336,100 @@ class MonitorStat(Stat[MonitorCounterT_co]):
     def resubmitted(self):
         self._counter_tier2['resubmitted'] += 1
 
+    def adaptively_deferred(self):
+        self._counter_tier2['adaptively_deferred'] += 1
+
+    def shed(self):
+        self._counter_tier2['shed'] += 1
+
+    def window_deferred(self, polls_saved: int):
+        self._counter_tier2['window_deferred'] += 1
+        self._counter_tier2['polls_saved'] += polls_saved
+        self._polls_saved_in_day += polls_saved
+
+    def print_summary(self):
+        super().print_summary()
+        now = env.loop.time()
+        if self._daily_report_start_time is None:
+            self._daily_report_start_time = now
+            return
+        if now - self._daily_report_start_time < DAILY_REPORT_PERIOD:
+            return
+        logger.info(f'Polls saved by time-of-day windows in the past day: {self._polls_saved_in_day}')
+        self._daily_report_start_time = now
+        self._polls_saved_in_day = 0
+
+    def throttled(self, overflow_count: int, mass_update: bool, summarized: bool):
+        self._counter_tier2['throttled_updates'] += 1
+        if mass_update:
+            self._counter_tier2['mass_updates'] += 1
+        self._counter_tier2['summarized_entries' if summarized else 'dropped_entries'] += overflow_count
+
+    @staticmethod
+    def _describe_throttled(counter: MonitorCounterT_co) -> str:
+        if not counter.throttled_updates:
+            return ''
+        return (f'throttled({counter.throttled_updates}, including {counter.mass_updates} mass updates;'
+                f' {counter.summarized_entries} entries summarized, {counter.dropped_entries} dropped)')
+
+    def loop_lagged(self, lag: float):
+        self._counter_tier2['loop_lag_samples'] += 1
+        self._counter_tier2['loop_lag_ms'] += round(lag * 1000)
+        if lag >= LOOP_LAG_SPIKE_THRESHOLD:
+            self._counter_tier2['loop_lag_spikes'] += 1
+
+    @staticmethod
+    def _describe_loop_lag(counter: MonitorCounterT_co) -> str:
+        if not counter.loop_lag_samples:
+            return ''
+        return (f'loop lag(avg {counter.loop_lag_ms / counter.loop_lag_samples:.0f}ms,'
+                f' {counter.loop_lag_spikes} of {counter.loop_lag_samples} samples'
+                f' >= {LOOP_LAG_SPIKE_THRESHOLD * 1000:.0f}ms)')
+
+    def db_queried(self, count: int = 1):
+        self._counter_tier2['db_queries'] += count
+
+    def db_flushed(self, feed_count: int, duration: float):
+        self._counter_tier2['db_flushes'] += 1
+        self._counter_tier2['db_flushed_feeds'] += feed_count
+        self._counter_tier2['db_flush_ms'] += round(duration * 1000)
+        self.observe_latency('db_save', duration)
+
+    @staticmethod
+    def _describe_db_flushes(counter: MonitorCounterT_co) -> str:
+        if not counter.db_flushes:
+            return ''
+        return (f'db flushes({counter.db_flushes}, avg {counter.db_flushed_feeds / counter.db_flushes:.1f} feeds'
+                f' in {counter.db_flush_ms / counter.db_flushes / 1000:.3f}s)')
+
+    def media_prevalidated(self, count: int):
+        self._counter_tier2['media_prevalidated'] += count
+
+    def _describe_queue(self, counter: MonitorCounterT_co) -> str:
+        return ', '.join(filter(None, (
+            f'queued({self._queued_count})' if self._queued_count else '',
+            f'queue wait(avg {counter.queue_wait_ms / counter.dequeued / 1000:.2f}s of {counter.dequeued} dequeued)'
+            if counter.dequeued
+            else '',
+        )))
+
     def _stat(self, counter: MonitorCounterT_co) -> str:
         scheduling_stat = ', '.join(filter(None, (
             self._describe_in_progress(),
+            self._describe_queue(counter),
             f'deferred({counter.deferred})' if counter.deferred else '',
             f'resubmitted({counter.resubmitted})' if counter.resubmitted else '',
+            f'adaptively deferred({counter.adaptively_deferred})' if counter.adaptively_deferred else '',
+            f'deferred to active windows({counter.window_deferred}, saving {counter.polls_saved} polls)'
+            if counter.window_deferred
+            else '',
+            f'shed({counter.shed} low-priority polls)' if counter.shed else '',
+            self._describe_failing(),
+            self._describe_map_sizes(),
+            f'db queries({counter.db_queries})' if counter.db_queries else '',
+            self._describe_db_flushes(counter),
+            self._describe_loop_lag(counter),
+            self._describe_latency(counter),
         )))
         if not counter.FINISHED:
             return scheduling_stat
@@ -192,8 +438,12 @@ class MonitorStat(Stat[MonitorCounterT_co]):
             f'not updated({counter.not_updated}, including {counter.cached} cached and {counter.empty} empty)'
             if counter.not_updated
             else '',
-            f'fetch failed({counter.failed})' if counter.failed else '',
-            f'skipped({counter.skipped})' if counter.skipped else '',
+            self._describe_failed(counter),
+            f'skipped({counter.skipped}, including {counter.host_deferred} held back by failing hosts)'
+            if counter.host_deferred
+            else f'skipped({counter.skipped})' if counter.skipped else '',
+            self._describe_throttled(counter),
+            f'media pre-validated({counter.media_prevalidated})' if counter.media_prevalidated else '',
             self._describe_abnormal(counter),
         )))
         return ', '.join(filter(None, (scheduling_stat, finished_stat)))
@@ -202,14 +452,26 @@ class MonitorStat(Stat[MonitorCounterT_co]):
 class NotifierCounter(StatCounter):
     notified: int = _gen_property('notified')
     deactivated: int = _gen_property('deactivated')
+    first_message_count: int = _gen_property('first_message_count')
+    first_message_delay_ms: int = _gen_property('first_message_delay_ms')
+    first_message_prevalidated_count: int = _gen_property('first_message_prevalidated_count')
+    first_message_prevalidated_delay_ms: int = _gen_property('first_message_prevalidated_delay_ms')
+    rate_limited: int = _gen_property('rate_limited')
+    rate_limit_delay_ms: int = _gen_property('rate_limit_delay_ms')
+    flood_waits: int = _gen_property('flood_waits')
+    digests: int = _gen_property('digests')
+    digested: int = _gen_property('digested')
 
 
 NotifierCounterT_co = TypeVar('NotifierCounterT_co', bound=NotifierCounter, covariant=True)
 
 
 class NotifierStat(Stat[NotifierCounterT_co]):
+    _latency_phases = ('post_parse', 'send')
+
     def __init__(self, _bound_counter_cls: type[NotifierCounterT_co] = NotifierCounter):
         super().__init__(_bound_counter_cls=_bound_counter_cls)
+        self._outbound_queues: tuple[int, int, float] = (0, 0, 0.0)
 
     def notified(self):
         self._counter_tier2['notified'] += 1
@@ -217,10 +479,67 @@ class NotifierStat(Stat[NotifierCounterT_co]):
     def deactivated(self):
         self._counter_tier2['deactivated'] += 1
 
+    def first_message_sent(self, delay: float, media_prevalidated: bool = False):
+        # time elapsed from the poll finding an update to its first message being sent,
+        # updates with media pre-validated are counted separately so that the effect of pre-validation can be told
+        if media_prevalidated:
+            self._counter_tier2['first_message_prevalidated_count'] += 1
+            self._counter_tier2['first_message_prevalidated_delay_ms'] += round(delay * 1000)
+        else:
+            self._counter_tier2['first_message_count'] += 1
+            self._counter_tier2['first_message_delay_ms'] += round(delay * 1000)
+
+    def rate_limited(self, waited: int, delay: float, flood_waits: int):
+        self._counter_tier2['rate_limited'] += waited
+        self._counter_tier2['rate_limit_delay_ms'] += round(delay * 1000)
+        self._counter_tier2['flood_waits'] += flood_waits
+
+    def digest_sent(self, posts: int):
+        self._counter_tier2['digests'] += 1
+        self._counter_tier2['digested'] += posts
+
+    def outbound_queued(self, chats: int, max_depth: int, oldest_age: float):
+        self._outbound_queues = chats, max_depth, oldest_age
+
+    def _describe_outbound_queues(self) -> str:
+        chats, max_depth, oldest_age = self._outbound_queues
+        if not chats:
+            return ''
+        return f'outbound queues({chats} chats, max depth {max_depth}, oldest {oldest_age:.1f}s)'
+
+    @staticmethod
+    def _describe_rate_limit(counter: NotifierCounterT_co) -> str:
+        return ', '.join(filter(None, (
+            f'rate limited({counter.rate_limited} sends, i.e., flood waits avoided,'
+            f' avg queueing delay {counter.rate_limit_delay_ms / counter.rate_limited / 1000:.2f}s)'
+            if counter.rate_limited
+            else '',
+            f'flood waits({counter.flood_waits})' if counter.flood_waits else '',
+        )))
+
+    @staticmethod
+    def _describe_first_message_delay(counter: NotifierCounterT_co) -> str:
+        details = ', '.join(filter(None, (
+            f'avg {counter.first_message_prevalidated_delay_ms / counter.first_message_prevalidated_count / 1000:.2f}s'
+            f' of {counter.first_message_prevalidated_count} updates with media pre-validated'
+            if counter.first_message_prevalidated_count
+            else '',
+            f'avg {counter.first_message_delay_ms / counter.first_message_count / 1000:.2f}s'
+            f' of {counter.first_message_count} updates without'
+            if counter.first_message_count
+            else '',
+        )))
+        return f'time to first message({details})' if details else ''
+
     def _stat(self, counter: NotifierCounterT_co) -> str:
         return ', '.join(filter(None, (
             self._describe_in_progress(),
+            self._describe_outbound_queues(),
             f'notified({counter.notified})' if counter.notified else '',
             f'deactivated({counter.deactivated})' if counter.deactivated else '',
+            f'digests({counter.digests}, coalescing {counter.digested} posts)' if counter.digests else '',
+            self._describe_first_message_delay(counter),
+            self._describe_rate_limit(counter),
+            self._describe_latency(counter),
             self._describe_abnormal(counter),
         )))
@@ -0,0 +1,68 @@
+#  RSS to Telegram Bot
+#  Copyright (C) 2025  Rongrong <i@rong.moe>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import Final, NamedTuple
+from collections.abc import MutableMapping, Sequence
+
+from .. import db
+
+# A mass update is only detected in feeds with at least this many entries, where a high ratio of new entries is unusual.
+MASS_UPDATE_MIN_ENTRIES: Final[int] = 10
+# Entries listed in an overflow summary at most.
+OVERFLOW_SUMMARY_LIMIT: Final[int] = 10
+
+OVERFLOW_ACTION_SUMMARY: Final[str] = 'summary'
+OVERFLOW_ACTION_DROP: Final[str] = 'drop'
+
+
+class ThrottledUpdate(NamedTuple):
+    entries: list[MutableMapping]  # to be sent
+    overflow: list[MutableMapping]  # not to be sent
+    mass_update: bool
+    summarize: bool  # collapse the overflow into a summary, or drop it?
+
+
+def throttle_update(updated_entries: Sequence[MutableMapping], entry_count: int) -> ThrottledUpdate:
+    """
+    Apply the catch-up throttling policy to an update, so that a feed coming back after an outage or changing its GUID
+    scheme does not flood its subscribers.
+
+    :param updated_entries: updated entries, in the order of the feed (the newest first)
+    :param entry_count: number of all entries in the feed
+    :return: a ThrottledUpdate object
+    """
+    updated_entries = list(updated_entries)
+    summarize = db.EffectiveOptions.update_overflow_action != OVERFLOW_ACTION_DROP
+
+    ratio = db.EffectiveOptions.mass_update_ratio
+    if (
+            ratio > 0
+            and entry_count >= MASS_UPDATE_MIN_ENTRIES
+            and len(updated_entries) * 100 >= entry_count * ratio
+    ):
+        return ThrottledUpdate(entries=[], overflow=updated_entries, mass_update=True, summarize=summarize)
+
+    limit = db.EffectiveOptions.update_entry_limit
+    if 0 < limit < len(updated_entries):
+        return ThrottledUpdate(
+            entries=updated_entries[:limit],
+            overflow=updated_entries[limit:],
+            mass_update=False,
+            summarize=summarize,
+        )
+
+    return ThrottledUpdate(entries=updated_entries, overflow=[], mass_update=False, summarize=summarize)
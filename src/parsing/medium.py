@@ -212,6 +212,7 @@ class AbstractMedium(ABC):
                             try:
                                 async with flood_lock:
                                     pass  # wait for flood wait
+                                await locks.user_media_upload_rate_limit(chat_id)
 
                                 uploaded_media = await env.bot(
                                     UploadMediaRequest(peer, medium_to_upload.telegramize())
@@ -23,7 +23,6 @@ from telethon.tl import types, functions
 from telethon.errors.rpcbaseerrors import TimedOutError
 from telethon.errors.rpcerrorlist import SlowModeWaitError, FloodWaitError, ServerError
 from telethon.utils import get_message_id
-from collections import defaultdict
 
 from .. import log, env, locks
 from ..errors_collection import MediaSendFailErrors
@@ -34,8 +33,6 @@ logger = log.getLogger('RSStT.message')
 
 
 class MessageDispatcher:
-    user_sending_lock = defaultdict(asyncio.Lock)
-
     def __init__(self,
                  user_id: int,
                  html: Optional[str] = None,
@@ -96,7 +93,8 @@ class MessageDispatcher:
             await self.generate_messages()
         sent_msgs: list[types.Message] = []
         try:
-            async with self.user_sending_lock[self.user_id]:
+            # Posts to a chat are sent in order, while chats take turns to send.
+            async with locks.user_outbound_queue(self.user_id):
                 for message in self.messages:
                     msg = await message.send(reply_to=sent_msgs[-1] if sent_msgs else None)
                     if msg:
@@ -153,6 +151,10 @@ class Message:
                     pass  # wait for flood wait
 
                 async with msg_lock:  # acquire a msg lock
+                    # an album counts as many messages as its media
+                    await locks.user_msg_rate_limit(
+                        self.user_id, len(self.media) if self.media_type == MEDIA_GROUP else 1
+                    )
                     # only acquire overall semaphore when sending
                     async with self.__overall_semaphore:
                         if self.media_type == MEDIA_GROUP:
@@ -16,6 +16,7 @@
 
 from __future__ import annotations
 from typing import Optional
+from collections.abc import Sequence
 
 from .. import db
 from ..errors_collection import MediaSendFailErrors
@@ -78,7 +79,7 @@ class Post:
         )
 
     async def send_formatted_post_according_to_sub(self, sub: db.Sub):
-        if not isinstance(sub.feed, db.User):
+        if not isinstance(sub.user, db.User):  # not prefetched
             await sub.fetch_related('user')
         user: db.User = sub.user
         await self.send_formatted_post(
@@ -206,3 +207,36 @@ class Post:
                 display_entry_tags=user.display_entry_tags,
             )
         return await self.send_formatted_post_according_to_sub(sub=sub)
+
+
+class Digest:
+    """
+    A digest of posts (see `PostFormatter.get_formatted_digest()`), sent in place of the posts themselves when too many
+    posts are waiting to be sent to a chat.
+    """
+
+    def __init__(self, posts: Sequence[Post], header: str, feed_title: str, feed_link: str):
+        self.posts = posts
+        self.header = header
+        self.feed_title = feed_title
+        self.feed_link = feed_link
+        # so that it can be described as a post
+        self.title = header
+        self.link = feed_link
+        self.author = None
+
+    async def send_formatted_post_according_to_sub(self, sub: db.Sub):
+        if not isinstance(sub.user, db.User):  # not prefetched
+            await sub.fetch_related('user')
+        user: db.User = sub.user
+        message_dispatcher = MessageDispatcher(
+            user_id=sub.user_id,
+            html=PostFormatter.get_formatted_digest(
+                [post.post_formatter for post in self.posts],
+                feed_title=sub.title or self.feed_title,
+                feed_link=self.feed_link,
+                header=self.header,
+            ),
+            silent=not (sub.notify if sub.notify != -100 else user.notify),
+        )
+        return await message_dispatcher.send_messages()
@@ -514,6 +514,33 @@ class PostFormatter:
             return header, footer
         raise ValueError(f'Unknown message style: {message_style}')
 
+    def get_digest_item(self) -> str:
+        """
+        Get a compact line of the post (title with link) for digests.
+        """
+        title = self.title or self.link or 'Untitled'
+        return Text([Text('- '), Link(title, param=self.link) if self.link else Text(title)]).get_html()
+
+    @staticmethod
+    def get_formatted_digest(post_formatters: list[PostFormatter],
+                             feed_title: str,
+                             feed_link: str,
+                             header: str) -> str:
+        """
+        Get a digest of posts, i.e., a compact list of them, which is sent in place of the posts themselves.
+
+        :param post_formatters: `PostFormatter` objects of the posts
+        :param feed_title: feed title (or sub title)
+        :param feed_link: feed link
+        :param header: a line describing the digest
+        :return: formatted digest
+        """
+        return '\n'.join((
+            Bold(Link(feed_title, param=feed_link)).get_html(),
+            Text(header).get_html(),
+            *(post_formatter.get_digest_item() for post_formatter in post_formatters),
+        ))
+
     def generate_formatted_post(self,
                                 sub_title: Optional[str],
                                 tags: list[str],
@@ -169,6 +169,9 @@ escapeHashtag = partial(
 )
 isAbsoluteHttpLink = re.compile(r'^https?://').match
 isSmallIcon = re.compile(r'(width|height): ?(([012]?\d|30)(\.\d)?px|([01](\.\d)?|2)r?em)').search
+mediaSrcFinder = re.compile(
+    r'<(?P<tag>img|video)\b[^>]*?\ssrc\s*=\s*(?P<quote>["\']?)(?P<url>[^"\'\s>]+)(?P=quote)', re.I
+).finditer
 
 
 class Enclosure:
@@ -248,15 +251,7 @@ async def ensure_plain(s: str, enable_emojify: bool = False) -> str:
     return emojify(s) if enable_emojify else s
 
 
-async def parse_entry(entry, feed_link: Optional[str] = None):
-    class EntryParsed:
-        content: str = ''
-        link: Optional[str] = None
-        author: Optional[str] = None
-        tags: Optional[list[str]] = None
-        title: Optional[str] = None
-        enclosures: list[Enclosure] = None
-
+def get_entry_content(entry) -> str:
     content = (
             entry.get('content')  # Atom: <content>; JSON Feed: .content_html, .content_text
             or entry.get('summary', '')  # Atom: <summary>; RSS: <description>
@@ -275,7 +270,54 @@ async def parse_entry(entry, feed_link: Optional[str] = None):
         # TODO: currently feedparser always prefer content_text rather than content_html, we'd like to change that
         content = content.get('value', '')
 
-    EntryParsed.content = await html_validator(content)
+    return content if isinstance(content, str) else ''
+
+
+def extract_media_urls(entry, feed_link: Optional[str] = None) -> Iterator[tuple[str, str]]:
+    """
+    Cheaply extract the URLs of images and videos from an entry without building a DOM.
+
+    It is a best-effort guess of what `parse_entry()` and the HTML parser would find, used to warm up media probes.
+
+    :return: an iterator of (type, url), where type is either 'image' or 'video'
+    """
+    for match in mediaSrcFinder(get_entry_content(entry)):
+        url = resolve_relative_link(feed_link, unescape(match['url']).strip())
+        if isAbsoluteHttpLink(url):
+            yield ('video' if match['tag'].lower() == 'video' else 'image'), url
+
+    if (links := entry.get('links')) and isinstance(links, list):
+        for link in links:
+            if (
+                    link.get('rel') == 'enclosure'
+                    and (link_type := link.get('type'))
+                    and link_type.startswith(('image', 'video'))
+                    and (url := resolve_relative_link(feed_link, link.get('href')))
+                    and isAbsoluteHttpLink(url)
+            ):
+                yield link_type.partition('/')[0], url
+
+    if (media_content := entry.get('media_content')) and isinstance(media_content, list):
+        for media in media_content:
+            if (
+                    (media_type := media.get('type') or media.get('medium'))
+                    and media_type.startswith(('image', 'video'))
+                    and (url := resolve_relative_link(feed_link, media.get('url')))
+                    and isAbsoluteHttpLink(url)
+            ):
+                yield media_type.partition('/')[0], url
+
+
+async def parse_entry(entry, feed_link: Optional[str] = None):
+    class EntryParsed:
+        content: str = ''
+        link: Optional[str] = None
+        author: Optional[str] = None
+        tags: Optional[list[str]] = None
+        title: Optional[str] = None
+        enclosures: list[Enclosure] = None
+
+    EntryParsed.content = await html_validator(get_entry_content(entry))
     EntryParsed.link = entry.get('link') or entry.get('guid')
 
     if (author := entry.get('author')) and isinstance(author, str):
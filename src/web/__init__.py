@@ -17,4 +17,4 @@
 from .req import get, get_page_title
 from .feed import feed_get
 from .media import get_medium_info, get_medium_info_via_weserv
-from .utils import WebResponse, WebFeed, WebError
+from .utils import WebResponse, WebFeed, WebError, FailureClass
@@ -24,6 +24,7 @@ import feedparser
 from io import BytesIO
 from ssl import SSLError
 from functools import partial
+from time import perf_counter
 
 from .. import log
 from ..aio_helper import run_async
@@ -70,6 +71,7 @@ async def feed_get(url: str, timeout: Optional[float] = sentinel, web_semaphore:
             ret.error = WebError(error_name='status code error', status=status_caption, url=url, log_level=log_level)
             return ret
 
+        parse_start = perf_counter()
         with BytesIO(rss_content) as rss_content_io:
             rss_d = await run_async(
                 partial(bozo_exception_removal_wrapper,
@@ -77,6 +79,7 @@ async def feed_get(url: str, timeout: Optional[float] = sentinel, web_semaphore:
                         response_headers={k.lower(): v for k, v in resp.headers.items()}),
                 prefer_pool='thread' if len(rss_content) < 64 * 1024 else None
             )
+        ret.parse_time = perf_counter() - parse_start
 
         if not rss_d.feed.get('title'):  # why there is no feed hospital?
             # feed.description cannot be used to determine if this is likely to be a feed since HTML tag <body> may be
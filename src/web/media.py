@@ -28,6 +28,7 @@ from asyncstdlib import lru_cache
 
 from .. import env
 from ..compat import INT64_T_MAX
+from ..helpers.singleflight import single_flight
 from .req import get, _get
 from .utils import logger
 
@@ -136,6 +137,9 @@ async def __medium_info_callback(response: aiohttp.ClientResponse) -> tuple[int,
     return -1, -1
 
 
+# Medium probes are fired by both the eager pre-validation (monitor) and the lazy validation (parsing), which may
+# overlap. Since the LRU cache does not coalesce concurrent calls, single-flight them to avoid duplicated probes.
+@single_flight
 @lru_cache(maxsize=1024)
 async def get_medium_info(url: str) -> Optional[tuple[int, int, int, Optional[str]]]:
     if url.startswith('data:'):
@@ -248,6 +252,7 @@ async def _get_medium_info_via_weserv(url: str) -> Optional[tuple[int, int, int,
     return size, width, height, content_type
 
 
+@single_flight
 @lru_cache(maxsize=LRU_CACHE_MAXSIZE)
 async def get_medium_info_via_weserv(url: str) -> Optional[tuple[int, int, int, Optional[str]]]:
     url = construct_weserv_url(url, output_format='json')
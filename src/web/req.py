@@ -32,12 +32,13 @@ from dns.exception import DNSException
 from urllib.parse import urlparse
 from socket import AF_INET, AF_INET6
 from functools import partial
-from asyncstdlib.functools import lru_cache
+from html import unescape
 
 from .. import env, locks
 from ..compat import nullcontext, ssl_create_default_context, AiohttpUvloopTransportHotfix
-from ..aio_helper import run_async
 from ..errors_collection import RetryInIpv4
+from ..helpers.persistence import persistence, PersistentTTLCache
+from ..helpers.singleflight import single_flight
 from .utils import YummyCookieJar, WebResponse, proxy_filter, logger, sentinel
 
 # Reuse SSLContext as aiohttp does:
@@ -79,6 +80,19 @@ STATUSES_PERMANENT_REDIRECT: Final = {
 MAX_TRIES: Final = 2
 
 contentDispositionFilenameParser = partial(re.compile(r'(?<=filename=")[^"]+(?=")').search, flags=re.I)
+titleFinder = re.compile(rb'<title\b[^>]*>(?P<title>.*?)</title\s*>', re.I | re.S).search
+metaCharsetFinder = re.compile(rb'<meta\b[^>]*?charset\s*=\s*["\']?(?P<charset>[\w\-]+)', re.I).search
+
+PAGE_TITLE_MAX_FETCH_SIZE: Final = 8 * 1024
+PAGE_TITLE_READ_BUFFER_SIZE: Final = 2 * 1024
+PAGE_TITLE_CACHE_TTL: Final = 7 * 24 * 60 * 60  # 7 days
+PAGE_TITLE_CACHE_FAILURE_TTL: Final = 60 * 60  # 1 hour
+# url -> (title, filename in Content-Disposition)
+page_title_cache: Final[PersistentTTLCache[str, tuple[Optional[str], Optional[str]]]] = PersistentTTLCache(
+    maxsize=4096,
+    ttl=PAGE_TITLE_CACHE_TTL,
+)
+persistence.register('page_title', page_title_cache.dump, page_title_cache.load)
 
 
 async def __norm_callback(response: aiohttp.ClientResponse, decode: bool = False, max_size: Optional[int] = None,
@@ -253,28 +267,65 @@ _get = partial(_request, aiohttp.hdrs.METH_GET)
 get = partial(request, aiohttp.hdrs.METH_GET)
 
 
-@lru_cache(maxsize=256)
+async def __page_title_callback(response: aiohttp.ClientResponse) -> Optional[str]:
+    content_type = response.headers.get('Content-Type')
+    if content_type and not content_type.startswith('text/html'):
+        return None
+    # Stream the body until </title> is seen, so that neither the whole page nor a DOM is needed.
+    content = response.content
+    buffer = bytearray()
+    title_match = None
+    while len(buffer) < PAGE_TITLE_MAX_FETCH_SIZE:
+        chunk = await content.read(PAGE_TITLE_MAX_FETCH_SIZE - len(buffer))
+        if not chunk:
+            break
+        buffer += chunk
+        if title_match := titleFinder(buffer):
+            break
+    if not title_match:
+        return None
+    title = title_match['title']
+    encoding = response.charset
+    if not encoding:
+        charset_match = metaCharsetFinder(buffer, 0, title_match.start())
+        encoding = charset_match['charset'].decode('ascii') if charset_match else 'utf-8'
+    try:
+        title = title.decode(encoding, errors='replace')
+    except LookupError:
+        title = title.decode('utf-8', errors='replace')
+    return ' '.join(unescape(title).split()) or None
+
+
+@single_flight
+async def _get_page_title_and_filename(url: str) -> tuple[Optional[str], Optional[str]]:
+    if cached := page_title_cache.get(url):
+        return cached
+    try:
+        r = await _get(url, resp_callback=__page_title_callback,
+                       read_bufsize=PAGE_TITLE_READ_BUFFER_SIZE, read_until_eof=False)
+    except Exception as e:
+        logger.debug(f'Page title fetch failed: {url}', exc_info=e)
+        page_title_cache.set(url, (None, None), ttl=PAGE_TITLE_CACHE_FAILURE_TTL)
+        return None, None
+    content_disposition = r.headers.get('Content-Disposition')
+    filename_match = contentDispositionFilenameParser(content_disposition) if content_disposition else None
+    title = r.content if r.status == 200 else None
+    res = title, (filename_match.group() if filename_match else None)
+    # No title, either due to an error or a page not (yet) having one, is not worth remembering for long.
+    page_title_cache.set(url, res, ttl=None if title is not None else PAGE_TITLE_CACHE_FAILURE_TTL)
+    return res
+
+
 async def get_page_title(url: str, allow_hostname=True, allow_path: bool = False, allow_filename: bool = True) \
         -> Optional[str]:
-    r = None
-    # noinspection PyBroadException
-    try:
-        r = await get(url=url, decode=False, intended_content_type='text/html', max_size=2 * 1024)
-        if r.status != 200 or not r.content:
-            raise ValueError('not an HTML page')
-        # if len(r.content) <= 27:  # len of `<html><head><title></title>`
-        #     raise ValueError('invalid HTML')
-        soup = await run_async(BeautifulSoup, r.content, 'lxml', prefer_pool='thread')
-        title = soup.title.text
-        return title.strip()
-    except Exception:
-        content_disposition = r.headers.get('Content-Disposition') if r else None
-        filename_match = contentDispositionFilenameParser(content_disposition) if content_disposition else None
-        if filename_match and allow_filename:
-            return filename_match.group()
-        url_parsed = urlparse(url)
-        if allow_path:
-            path = url_parsed.path
-            return path.rsplit('/', 1)[-1] if path else None
-        if allow_hostname:
-            return url_parsed.hostname
+    title, filename = await _get_page_title_and_filename(url)
+    if title:
+        return title
+    if filename and allow_filename:
+        return filename
+    url_parsed = urlparse(url)
+    if allow_path:
+        path = url_parsed.path
+        return path.rsplit('/', 1)[-1] if path else None
+    if allow_hostname:
+        return url_parsed.hostname
@@ -21,7 +21,10 @@ from typing_extensions import Final
 import aiohttp
 import aiohttp.abc
 import email.utils
+import enum
 import feedparser
+import socket
+import ssl
 from contextlib import suppress
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
@@ -91,15 +94,56 @@ class YummyCookieJar(aiohttp.abc.AbstractCookieJar):
         return self.__real_cookie_jar.quote_cookie
 
 
+class FailureClass(enum.Enum):
+    PERMANENT = 'permanent'  # the feed is gone or never was a feed, retrying is unlikely to help
+    TRANSIENT = 'transient'  # the server is temporarily unhappy, retry soon
+    HOST = 'host'  # the host is unreachable (DNS, TLS, connection refused), affecting all feeds on it
+
+
+PERMANENT_STATUSES: Final = frozenset({
+    401,  # Unauthorized
+    404,  # Not Found
+    410,  # Gone
+    451,  # Unavailable For Legal Reasons
+})
+HOST_ERRORS: Final = (
+    socket.gaierror,  # DNS resolution failure, including NXDOMAIN
+    ssl.SSLError,
+    ssl.CertificateError,
+    aiohttp.ClientSSLError,
+    ConnectionRefusedError,
+)
+
+
+def classify_failure(error_name: str, status: Union[int, str] = None, base_error: Exception = None) -> FailureClass:
+    if error_name in {'URL invalid', 'feed invalid'}:
+        return FailureClass.PERMANENT
+    if status is not None:
+        # status may be a caption like "404 Not Found"
+        status_code = status if isinstance(status, int) else str(status).partition(' ')[0]
+        with suppress(ValueError):
+            if int(status_code) in PERMANENT_STATUSES:
+                return FailureClass.PERMANENT
+        return FailureClass.TRANSIENT
+    if base_error is not None:
+        # aiohttp wraps the underlying error of a failed connection
+        os_error = getattr(base_error, 'os_error', None)
+        if isinstance(base_error, HOST_ERRORS) or isinstance(os_error, HOST_ERRORS):
+            return FailureClass.HOST
+    return FailureClass.TRANSIENT
+
+
 class WebError(Exception):
     def __init__(self, error_name: str, status: Union[int, str] = None, url: str = None,
-                 base_error: Exception = None, hide_base_error: bool = False, log_level: int = log.DEBUG):
+                 base_error: Exception = None, hide_base_error: bool = False, log_level: int = log.DEBUG,
+                 failure_class: Optional[FailureClass] = None):
         super().__init__(error_name)
         self.error_name = error_name
         self.status = status
         self.url = url
         self.base_error = base_error
         self.hide_base_error = hide_base_error
+        self.failure_class = failure_class or classify_failure(error_name, status, base_error)
         log_msg = f'Fetch failed ({error_name}'
         log_msg += (f', {type(base_error).__name__}'
                     if not hide_base_error and base_error and log_level < log.ERROR
@@ -222,6 +266,7 @@ class WebFeed:
     reason: Optional[str] = None
     rss_d: Optional[feedparser.FeedParserDict] = None
     error: Optional[WebError] = None
+    parse_time: Optional[float] = None  # in seconds, None if not parsed
 
     web_response: Optional[WebResponse] = None
 